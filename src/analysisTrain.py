@@ -0,0 +1,207 @@
+from eventFlow import SampleProcessing
+from graphOptimizer import rename_in_algorithm
+from histoBooking import rename_histo
+from snapshotOutput import rename_snapshot
+import hashlib
+import copy
+
+
+#######################################################################################
+#
+# AnalysisTrain: several flows (SampleProcessing, already built) merged in a single flow, i.e.
+# one processor fills the histograms of all the analyses in a single read of the input
+#
+#  - the views are merged in ranked order; each view gets a structural id_code
+#        id_code = MD5(algorithm, origins, requirements)   (origins/requirements: merged names)
+#    i.e. independent of the view name: identical upstream views (e.g. the same object
+#    definitions) are computed once, whatever their name in the flows
+#  - a view keeps its name if free, otherwise it is namespaced as <view>__<flow name>
+#    (regionWeight names are evaluated again from the merged event weights) - the namespaced
+#    names are not added to the dictionary (see SampleProcessing.suffixed_views)
+#  - input variables keep their names (the dictionaries of the flows are merged)
+#  - targets: union of the targets of the flows - split_result() returns the histograms
+#    per flow with the original target names
+#
+#   train     = AnalysisTrain("train", [flow_A, flow_B])
+#   processor = Processor_NumPy("train", train.flow, ...)
+#   histos    = train.split_result(processor.RunProcessor())     # { flow name : { target : histo } }
+#
+#######################################################################################
+
+
+class AnalysisTrain:
+
+    def __init__(self, name, flows):
+        print("[AT] __init__ : name = ", name, "   flows = ", [f.name for f in flows])
+
+        self.name     = name
+        self.flows    = flows
+        self.flow     = SampleProcessing(name)
+
+        self.renames  = {}   # { flow name : { view : merged view } }
+        self.id_codes = {}   # { id_code : merged view }
+
+        self.merge_dictionaries()
+
+        for f in flows:
+            self.merge_flow(f)
+
+        self.evaluate_regions()
+
+        self.flow.targetList = []
+        for f in flows:
+            for t in f.targetList:
+                if not self.renames[f.name][t] in self.flow.targetList:
+                    self.flow.targetList.append(self.renames[f.name][t])
+
+        self.flow.is_built = True
+        self.flow.pending_views.clear()
+
+        n_views = sum(len(f.AG.views) for f in flows)
+        print(f"{'[AT] merged : '}{len(flows)}{' flows   views : '}{n_views}{' -> '}{len(self.flow.AG.views)}{'   targets : '}{len(self.flow.targetList)}")
+
+
+    #############
+    # Dictionaries: the first one plus the variables/features missing in it
+    def merge_dictionaries(self):
+
+        self.flow.ID.configure_from_info_dictionary(copy.deepcopy(self.flows[0].ID.get_info_dictionary(verbose=False)))
+
+        merged_vars = self.flow.ID.DB["vars"]
+
+        for f in self.flows[1:]:
+            for var, features in f.ID.DB["vars"].items():
+
+                _features = merged_vars.setdefault(var, {})
+
+                for feat, target in features.items():
+                    if _features.setdefault(feat, target) != target:
+                        print(f"{'[AT] ERROR : dictionary entry  '}{var}{' / '}{feat}{'  differs in flow  '}{f.name}{' : '}{target}{' (kept : '}{_features[feat]}{')'}")
+        return
+
+
+    #############
+    def view_id_code(self, f, iv, renames):
+
+        md = hashlib.md5()
+
+        if iv.is_input_variable():
+            md.update(("input:"+f.ID.translate_string(iv.view)).encode())
+            return md.hexdigest()
+
+        md.update(rename_in_algorithm(iv.algorithm, renames).encode())
+        for o in iv.origins:         md.update(("o:"+renames[o]).encode())
+        for r in iv.requirements:    md.update(("r:"+renames[r]).encode())
+        return md.hexdigest()
+
+
+
+    def merge_flow(self, f):
+
+        renames = self.renames.setdefault(f.name, {})
+
+        # Varied views of the flow (<view>__<variation>)
+        for v, (view, suffix) in f.suffixed_views.items():
+            self.flow.suffixed_views.setdefault(v, (view, suffix))
+
+        # regionWeight view name -> event weights of the region
+        region_weights = {f.get_regionWeight_name(r) : rd['event_weights'] for r, rd in f.regions_dictionary.items()}
+
+        n_shared = 0
+
+        for v in f.AG.list_of_ranked_views():
+
+            iv      = f.AG.views[v]
+            id_code = self.view_id_code(f, iv, renames)
+
+            if id_code in self.id_codes:
+                renames[v] = self.id_codes[id_code]
+                n_shared  += 1
+                continue
+
+            if v in region_weights:
+                name = "regionWeight_"+self.flow.regionWeight_id([renames[w] for w in region_weights[v]])
+            else:
+                name = v
+
+            if self.flow.AG.isNodeDefined(name):
+                if iv.is_input_variable():
+                    print(f"{'[AT] ERROR : input  '}{v}{'  of flow  '}{f.name}{'  differs from the one already merged'}")
+                    renames[v] = name
+                    continue
+                self.flow.suffixed_views[name+"__"+f.name] = (name, "__"+f.name)
+                name = name+"__"+f.name
+
+            self.flow.AG.addNode(name, [renames[o] for o in iv.origins], rename_in_algorithm(iv.algorithm, renames), [renames[r] for r in iv.requirements], id_code)
+
+            if iv.is_histo():
+                self.flow.AG.views[name].histo = rename_histo(iv.histo, renames)
+
+            if iv.is_snapshot():
+                self.flow.AG.views[name].snapshot = rename_snapshot(iv.snapshot, renames)
+
+            if not ((name in self.flow.suffixed_views) or self.flow.ID.is_defined(name)):
+                self.flow.ID.add_variable(name)
+
+            renames[v]             = name
+            self.id_codes[id_code] = name
+
+        for ew in f.event_weights:
+            if not renames[ew] in self.flow.event_weights:
+                self.flow.event_weights.append(renames[ew])
+
+        print(f"{'[AT] flow : '}{f.name :<30}{' views : '}{len(f.AG.views)}{'   shared : '}{n_shared}")
+
+        return
+
+
+
+    #############
+    # Regions of the merged AG (ranked requirements of each view), with the event weights of the region in the flow of the view
+    def evaluate_regions(self):
+
+        sources = {}
+        for f in self.flows:
+            for v, _v in self.renames[f.name].items():
+                sources.setdefault(_v, (f, v))
+
+        for _v in self.flow.AG.views:
+
+            req_list = self.flow.AG.ranked_requirements_for_node(_v)
+            mask     = self.flow.selections_mask(req_list)
+
+            if mask in self.flow.get_regions_by_mask():
+                continue
+
+            f, v = sources[_v]
+            ew_l = [self.renames[f.name][w] for w in f.regions_dictionary[f.get_region_id_for_requirements(f.AG.list_of_requirements(v))]['event_weights']]
+
+            region_id = self.flow.region_id(req_list)
+            self.flow.regions_dictionary[region_id] = {'selections' : req_list, 'event_weights' : ew_l, 'regionWeight_id' : self.flow.regionWeight_id(ew_l)}
+            self.flow.regions_by_mask[mask]         = region_id
+
+        return
+
+
+
+    #############
+    # Targets of each flow: { flow name : { target : merged target } }
+    def target_names(self):
+        return {f.name : {t : self.renames[f.name][t] for t in f.targetList} for f in self.flows}
+
+
+    # Result of the merged processor split per flow: { flow name : { target : histo } }
+    # result: { name : histo } (NumPy/Numba), list of (name, histo) (Loop) or of named histos (RDF)
+    def split_result(self, result):
+
+        if not isinstance(result, dict):
+            _result = {}
+            for _item in result:
+                if hasattr(_item, "GetName"):
+                    _result[_item.GetName()] = _item
+                else:
+                    _n, _h = _item
+                    _result[str(_n)] = _h
+            result = _result
+
+        return {f : {t : result[_t] for t, _t in targets.items() if _t in result} for f, targets in self.target_names().items()}
@@ -0,0 +1,265 @@
+from schemaCache import SchemaCache
+import numpy as np
+import json
+import os
+
+
+#######################################################################################
+#
+# ColumnarStore: uncompressed, memory-mapped columnar cache of the input branches of a flow
+#
+#  directory/
+#    store.json                 metadata: n_events, source key, branches { name : dtype, counter }, counters
+#    values/<branch>.bin        flat array of the branch values (all the events)
+#    offsets/<counter>.bin      int64 offsets (n_events+1) - one per jagged counter (e.g. nMuon), shared
+#                               by all the branches of the collection (Muon_pt, Muon_eta, ...)
+#
+#  - build_store_for_flow() writes the branches needed by the targets of a flow (input nodes of GetGraphForTargets)
+#    reading them once from the original source (e.g. ROOT files through uproot)
+#  - read() returns zero-copy views of the memory-mapped files (same interface of the input sources of the
+#    NumPy/Numba processors: { branch : ndarray or Jagged }), i.e. the following runs read at memory bandwidth
+#  - the source key (file path, size and modification time - see SchemaCache) is stored: a changed source
+#    file or a missing branch triggers the re-conversion
+#
+#######################################################################################
+
+
+class ColumnarStore:
+
+    METADATA_FILE = "store.json"
+
+    def __init__(self, directory):
+
+        self.directory = directory
+        self.metadata  = {"n_events" : 0, "source_key" : "", "branches" : {}, "counters" : []}
+
+        self._values   = {}
+        self._offsets  = {}
+        self._writer   = None     # state of the incremental write (open_writer)
+
+        if os.path.exists(os.path.join(directory, self.METADATA_FILE)):
+            with open(os.path.join(directory, self.METADATA_FILE)) as file:
+                self.metadata = json.load(file)
+
+
+    @property
+    def n_events(self):     return self.metadata["n_events"]
+
+    @property
+    def branches(self):     return self.metadata["branches"]
+
+
+    def is_valid_for(self, branch_names, source_key):
+        return (self.metadata["source_key"] == source_key) and all(b in self.branches for b in branch_names)
+
+
+    def values_file(self, branch):      return os.path.join(self.directory, "values",  branch+".bin")
+    def offsets_file(self, counter):    return os.path.join(self.directory, "offsets", counter+".bin")
+
+
+
+    ##################################
+    # Write (conversion)
+    #
+    # branches : { branch : counter branch ("" for one value per event) }
+    # source   : object with n_events and read(branch_names, start, stop)
+    #
+    def write(self, source, branches, batch_size=1000000, source_key=""):
+
+        print(f"{'[ColumnarStore] writing : ' : <30}{self.directory}{'   ('}{len(branches)}{' branches, '}{source.n_events}{' events)'}")
+
+        self.open_writer(branches)
+
+        for start in range(0, source.n_events, batch_size):
+            stop = min(start+batch_size, source.n_events)
+            self.write_batch(source.read(sorted(branches), start, stop), stop-start)
+
+        self.close_writer(source_key)
+
+        return
+
+
+
+    ##################################
+    # Incremental write: the batches are appended (e.g. the events selected by a snapshot - see processorNumPy.py)
+    #
+    #   store.open_writer(branches) ; store.write_batch(batch, n_events) ... ; store.close_writer()
+    #
+    def open_writer(self, branches):
+
+        os.makedirs(os.path.join(self.directory, "values"),  exist_ok=True)
+        os.makedirs(os.path.join(self.directory, "offsets"), exist_ok=True)
+
+        self._values.clear()
+        self._offsets.clear()
+
+        counters = sorted(set(c for c in branches.values() if c != ""))
+
+        self._writer = {"branches"      : dict(branches),
+                        "counters"      : counters,
+                        "dtypes"        : {},
+                        "n_events"      : 0,
+                        "values_files"  : {b : open(self.values_file(b),  "wb") for b in branches},
+                        "offsets_files" : {c : open(self.offsets_file(c), "wb") for c in counters},
+                        "last_offset"   : {c : 0 for c in counters}}
+
+        for c in counters:
+            np.zeros(1, dtype=np.int64).tofile(self._writer["offsets_files"][c])
+
+        return
+
+
+    def write_batch(self, batch, n_events):
+
+        w = self._writer
+
+        offsets_written = set()
+
+        for b, c in w["branches"].items():
+
+            a = batch[b]
+
+            if c == "":
+                _values = np.ascontiguousarray(a)
+            else:
+                _values = np.ascontiguousarray(a.values)
+
+                # Offsets written once per counter and batch (the same for all the branches of the collection)
+                if not c in offsets_written:
+                    (a.offsets[1:] + w["last_offset"][c]).astype(np.int64).tofile(w["offsets_files"][c])
+                    w["last_offset"][c] += int(a.offsets[-1])
+                    offsets_written.add(c)
+
+            # Type of the first non-empty batch (e.g. a sum over no element can have another type)
+            if len(_values) > 0:
+                if not b in w["dtypes"]:
+                    w["dtypes"][b] = str(_values.dtype)
+                elif w["dtypes"][b] != str(_values.dtype):
+                    _values = _values.astype(w["dtypes"][b])
+
+            _values.tofile(w["values_files"][b])
+
+        w["n_events"] += n_events
+
+        return
+
+
+    def close_writer(self, source_key=""):
+
+        w = self._writer
+
+        for f in list(w["values_files"].values()) + list(w["offsets_files"].values()):
+            f.close()
+
+        self.metadata = {"n_events"   : w["n_events"],
+                         "source_key" : source_key,
+                         "branches"   : {b : {"dtype" : w["dtypes"].get(b, "float32"), "counter" : c} for b, c in w["branches"].items()},
+                         "counters"   : w["counters"]}
+
+        with open(os.path.join(self.directory, self.METADATA_FILE), "w") as file:
+            json.dump(self.metadata, file, indent=1)
+
+        self._writer = None
+
+        return
+
+
+
+    ##################################
+    # Read (zero-copy)
+
+    def get_values(self, branch):
+        if not branch in self._values:
+            _dtype = self.branches[branch]["dtype"]
+            if os.path.getsize(self.values_file(branch)) > 0:
+                self._values[branch] = np.memmap(self.values_file(branch), dtype=_dtype, mode="r")
+            else:
+                self._values[branch] = np.zeros(0, dtype=_dtype)     # empty files cannot be mapped
+        return self._values[branch]
+
+
+    def get_offsets(self, counter):
+        if not counter in self._offsets:
+            self._offsets[counter] = np.memmap(self.offsets_file(counter), dtype=np.int64, mode="r")
+        return self._offsets[counter]
+
+
+    def read(self, branch_names, start, stop):
+
+        from processorNumPy import Jagged
+
+        batch = {}
+
+        for b in branch_names:
+
+            counter = self.branches[b]["counter"]
+            values  = self.get_values(b)
+
+            if counter == "":
+                batch[b] = values[start:stop]
+            else:
+                offsets  = self.get_offsets(counter)[start:stop+1]
+                batch[b] = Jagged(values[offsets[0]:offsets[-1]], offsets - offsets[0])
+
+        return batch
+
+
+
+
+#######################################################################################
+# Branches needed by the targets of a flow : { branch : counter branch }
+#
+def branches_for_flow(flow):
+
+    branches = {}
+
+    dag = flow.GetGraphForTargets()
+
+    for v in dag.views:
+
+        _v = dag.views[v]
+
+        if not _v.is_input_variable():
+            continue
+
+        _prefix, _feature = flow.ID.split_name_feat_base(v)
+
+        if _prefix == flow.ID.CONSTANT_label:
+            continue
+
+        counter = ""
+        if flow.has_index(v):
+            counter = flow.ID.translate_string(flow.ID.get_counter_name_for(_prefix))
+
+        branches[flow.ID.translate_string(v)] = counter
+
+    return branches
+
+
+
+#######################################################################################
+# Conversion stage: the store is (re-)written only if it is missing, out of date or without some branches
+#
+def build_store_for_flow(flow, directory, file_name="", tree_name="", input_arrays=None, batch_size=1000000):
+
+    from processorNumPy import ArraysInput, UprootInput
+
+    store      = ColumnarStore(directory)
+    branches   = branches_for_flow(flow)
+    source_key = SchemaCache("").key_for(file_name, tree_name) if input_arrays is None else "arrays"
+
+    # Arrays in memory have no key: the store is always re-written
+    if (input_arrays is None) and store.is_valid_for(branches, source_key):
+        print(f"{'[ColumnarStore] up to date : ' : <30}{directory}")
+        return store
+
+    # Branches already in the store (same source) are kept
+    if store.metadata["source_key"] == source_key:
+        for b, info in store.branches.items():
+            branches.setdefault(b, info["counter"])
+
+    source = ArraysInput(input_arrays) if input_arrays is not None else UprootInput(file_name, tree_name)
+
+    store.write(source, branches, batch_size, source_key)
+
+    return store
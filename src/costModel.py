@@ -0,0 +1,131 @@
+import json
+
+
+#######################################################################################
+#
+# Cost model of the selections and reordering of the selection chains of the regions
+#
+#  cost_model = { selection : { 'pass_fraction' : p, 'cost' : c } }
+#
+#   - p: measured fraction of the evaluated events passing the selection (cut-flow table of a
+#        sample run, see cutflow.py)
+#   - c: measured cost per evaluation [ns] - inclusive cost of the selection (its upstream views
+#        included, see nodeProfile.py) if a profile report is available, 1 otherwise (i.e. the
+#        order depends on the pass fractions only)
+#
+#  The selections of a region chain are evaluated in the order of flow.region_selection_chain():
+#  independent selections are sorted by c / (1 - p) (the selections rejecting more events for
+#  the same cost first), a selection depending on another one of the chain (requirement or
+#  upstream view) is always evaluated after it.
+#
+#   - RDF:   the Filter chains (the columns of a selection are computed only for the events
+#            passing the filters before it)
+#   - Loop:  nested ifs in the order of the chain (a later selection and its upstream views computed
+#            inside the if of the ones before it, see ProcessorLoop.nested_chain_levels - not with the
+#            cut-flow counters: each selection evaluated for all the events of its region)
+#   - NumPy: the order of the masks applied to the events of the region
+#
+#  The model is saved to a json file: the production runs load it (no sample run needed)
+#
+#######################################################################################
+
+
+def build_cost_model(cutflow_table, profile_report={}):
+
+    cost_model = {}
+
+    for row in cutflow_table:
+
+        s    = row['selection']
+        cost = 1.0
+
+        if (s in profile_report) and profile_report[s]['calls']:
+            _r   = profile_report[s]
+            cost = 1e9 * _r.get('inclusive_seconds', _r['seconds']) / _r['calls']
+
+        cost_model[s] = {'pass_fraction' : row['efficiency'], 'cost' : cost}
+
+    return cost_model
+
+
+
+def save_cost_model(cost_model, fileName="cost_model.json"):
+    with open(fileName, "w") as file:
+        json.dump(cost_model, file, indent=1)
+    return
+
+
+def load_cost_model(fileName="cost_model.json"):
+    with open(fileName) as file:
+        return json.load(file)
+
+
+
+def selection_score(cost_model, s):
+    if not s in cost_model:
+        return float("inf")                 # not measured: after the measured ones (rank order kept)
+    p = cost_model[s]['pass_fraction']
+    return cost_model[s]['cost'] / (1.0 - p) if p < 1.0 else float("inf")
+
+
+
+# Expected cost per event of a chain: each selection evaluated for the events passing the previous ones
+def expected_cost(chain, cost_model):
+
+    cost     = 0.0
+    fraction = 1.0
+
+    for s in chain:
+        if not s in cost_model:
+            continue
+        cost     += fraction * cost_model[s]['cost']
+        fraction *= cost_model[s]['pass_fraction']
+
+    return cost
+
+
+
+#######################################################################################
+# Reordering of the selection chains of all the regions (flow.selection_order)
+#
+def reorder_selections(flow, cost_model, verbose=True):
+
+    upstream = {}
+
+    def upstream_of(v):
+        if not v in upstream:
+            upstream[v] = set()
+            for s in flow.AG.views[v].get_sources():
+                upstream[v].add(s)
+                upstream[v].update(upstream_of(s))
+        return upstream[v]
+
+    flow.selection_order.clear()
+
+    for region_id, rd in flow.regions_dictionary.items():
+
+        ranked = rd['selections']
+        if len(ranked) < 2:
+            continue
+
+        chain  = []
+        placed = set()
+
+        while len(chain) < len(ranked):
+            ready = [s for s in ranked if (not s in placed) and all((u in placed) or (not u in ranked) for u in upstream_of(s))]
+            best  = min(ready, key=lambda s: (selection_score(cost_model, s), ranked.index(s)))
+            chain.append(best)
+            placed.add(best)
+
+        if chain != ranked:
+            flow.selection_order[region_id] = chain
+
+            if verbose:
+                print(f"{'[REORDER] region '}{region_id :<34}{' expected cost : '}{expected_cost(ranked, cost_model) :>10.2f}{' -> '}{expected_cost(chain, cost_model) :>10.2f}")
+                print(f"{'[REORDER]    '}{' -> '.join(ranked)}")
+                print(f"{'[REORDER]    '}{' -> '.join(chain)}")
+
+    if verbose:
+        print(f"{'[REORDER] regions reordered : '}{len(flow.selection_order)}{' / '}{len(flow.regions_dictionary)}")
+
+    return flow.selection_order
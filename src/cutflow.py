@@ -0,0 +1,87 @@
+#######################################################################################
+#
+# Cut-flow: events evaluating / passing each selection of the target graph, counted in the
+# same event loop of the histograms (processorNumPy, processorLoop, processorRDF - cutflow=True)
+#
+#  - a selection is evaluated for the events of its region (the selections it requires):
+#    evaluated = events reaching the selection, passed = events passing it
+#  - the weighted yields of a selection use the regionWeight of its region (the event weights that
+#    apply to the events reaching the selection, e.g. an efficiency weight requiring a previous
+#    selection): the regionWeights are added to the targets of the processor only, the targets
+#    of the flow are not modified (see cutflow_targets)
+#  - the table is ordered by rank (longest path of the selection in the dag)
+#
+#   table = [ { 'selection', 'rank', 'evaluated', 'passed', 'efficiency', 'sumw_evaluated', 'sumw_passed' } ]
+#
+#  selectivities(table) = { selection : passed / evaluated } - measured input for the selection reordering
+#
+#######################################################################################
+
+
+# Weight of the region where the selection is evaluated
+def cutflow_weight(flow, selection):
+    return flow.get_regionWeight_name(flow.region_id_for_node(selection))
+
+
+
+# Targets of the flow + the regionWeights of the selections (the selections of a regionWeight are
+# the requirements of the selection, already in the graph of the targets)
+def cutflow_targets(flow):
+
+    weights = [cutflow_weight(flow, s) for s in cutflow_selections(flow.AG.subGraphTo(flow.targetList))]
+
+    return flow.targetList + [w for w in dict.fromkeys(weights) if not w in flow.targetList]
+
+
+
+# Selections of the dag ranked (requirement nodes)
+def cutflow_selections(dag):
+    return dag.rank_nodes(dag.list_of_requirement_nodes())
+
+
+
+# Counters (lists or per-slot rows) -> table
+def cutflow_table(dag, selections, evaluated, passed, sumw_evaluated, sumw_passed):
+
+    def _total(rows, i, kind):
+        if len(rows) and hasattr(rows[0], "__len__"):
+            return kind(sum(row[i] for row in rows))
+        return kind(rows[i])
+
+    table = []
+
+    for i, s in enumerate(selections):
+
+        _evaluated = _total(evaluated, i, int)
+        _passed    = _total(passed,    i, int)
+
+        table.append({'selection'      : s,
+                      'rank'           : dag.longest_path_to_node(s) if s in dag.views else 0,
+                      'evaluated'      : _evaluated,
+                      'passed'         : _passed,
+                      'efficiency'     : _passed/_evaluated if _evaluated else 0.0,
+                      'sumw_evaluated' : _total(sumw_evaluated, i, float),
+                      'sumw_passed'    : _total(sumw_passed,    i, float)})
+
+    table.sort(key=lambda row: row['rank'])
+
+    return table
+
+
+
+def selectivities(table):
+    return {row['selection'] : row['efficiency'] for row in table if row['evaluated'] > 0}
+
+
+
+def print_cutflow(table):
+
+    print("\n ================================== CUT-FLOW == \n")
+    print(f"{' selection' :<46}{'rank' :>6}{'evaluated' :>14}{'passed' :>14}{'eff.' :>9}{'sumw passed' :>16}")
+
+    for row in table:
+        print(f"{' '+row['selection'] :<46}{row['rank'] :>6}{row['evaluated'] :>14}{row['passed'] :>14}{row['efficiency'] :>9.4f}{row['sumw_passed'] :>16.2f}")
+
+    print("\n ============================================ \n")
+
+    return
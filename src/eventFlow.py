@@ -1,14 +1,22 @@
-from infoGraph import InfoView, InfoGraph
+from infoGraph import InfoView, InfoGraph, load_binary_file
 from interfaceDictionary import interfaceDictionary
+from graphOptimizer import rename_in_algorithm
+from histoBooking import variable_bins, make_histo, histo_name, histo_code, rename_histo, histo_title
+from snapshotOutput import make_snapshot, snapshot_name, snapshot_code, rename_snapshot
 import json
 import copy
 import os
 import hashlib
+import re
+
+
+# Names in a code (the numbers, e.g. 0.25f, are skipped)
+_name_re = re.compile(r'(?<![\w.])\d[\w.]*|([A-Za-z_]\w*)')
 
 
 #######################################################################################
 # Open points:
-#   - some functions are RDF specific (i.e. Combinations, Take): evaluate if these needs to be generalized
+#   - some functions are RDF specific (i.e. Distinct, Take): evaluate if these needs to be generalized
 #   - protection for boolean vectors for RDF not yet implemented
 #       - this should be moved to the RDF's interface
 #   - (OK - wrapped!)a few methods of the dictionary used by the translator are accessed directly tX.ID.***
@@ -19,12 +27,12 @@ import hashlib
 #       - NOT implemented yet for weights - TBC if this step is better fitted in the backend processor ... 
 #
 #   - Snapshots:
-#       - NOT imlemented yet
+#       - (OK) DefineSnapshot: events of a region + a set of views (see snapshotOutput.py)
 #
 #   - TakePair
-#       - implemented for pairs only (not triplets yet)
+#       - implemented for pairs only (not triplets yet) - see TakeCombination for Combinations with k > 2
 #   - Distinct
-#       - function implemented for n=2 only, so far
+#       - function implemented for n=2 only, so far - see Combinations (k = 2..4, predicate evaluated in the kernel)
 #       - should probably be renamed Pairs (or PairsFrom)
 #       - TBC: it might be extended to pairs of different objects changing the "collection" input to a list of collections
 #              On second thoughts this might be not practical: the definition of the variables of the combined pair is not automatic
@@ -51,13 +59,26 @@ class SampleProcessing:
 
         self.event_weights      = []   # list of event weight nodes
 
-        self.histos1D           = {}   # dictionary structure { h_name : { 'region'   : region_name ,
-                                       #                                   'variable' : var ,
-                                       #                                   'binning'  : [nBins, minB, maxB] } }
+        self.variations         = {}   # systematic variations { variation : { view : alternative code } } - see Variation
+        self.suffixed_views     = {}   # { name : (view, suffix) } - copies of a view named <view><suffix> (e.g. <view>__<variation>),
+                                       # NOT in the dictionary (the view would look like an object with a feature): translated
+                                       # as the view plus the suffix - see translate_string
+        self.combinations       = {}   # { combination name : list of the collections of the legs } - see Combinations, TakeCombination
+
+        self.lazy_views         = {}   # features of the derived collections (SubCollection, SubCollectionFromIndices) not used yet
+                                       # { view name : (code, requires) } - the view is added to the AG the first time it is used
+
+        self.histos             = {}   # dictionary structure { h_name : { 'region'    : region_name ,
+                                       #                                   'variables' : [x, ...] ,
+                                       #                                   'histo'     : histogram definition (see histoBooking.py) } }
                                        #
                                        # * h_name      = <histo name>__<region_name>  (UNIQUE identifier for this histo)
                                        # * region_name = SINGLE region (i.e. selection) name - e.g. an eta range - for this histo
 
+        self.snapshots          = {}   # dictionary structure { s_name : { 'region'   : requirements ,
+                                       #                                   'snapshot' : snapshot definition (see snapshotOutput.py) } }
+                                       #
+                                       # * s_name = SNAPSHOT_<name>  (the columns and the requirements define its region)
 
 
         self.regions_dictionary = {}   # dictionary structure {region ID : {'selections'      : ranked LIST of selections ,
@@ -67,6 +88,16 @@ class SampleProcessing:
                                        # * region id        = message digest (md5) of the (ranked) list of the selections
                                        # * region weight id = message digest (md5) of the (ranked) list of the event weights
 
+        self.is_built           = False   # BuildFlow already run: the following builds are incremental
+        self.pending_views      = []      # views added to the AG since the last BuildFlow
+        self.pending_histos     = []      # histograms defined since the last BuildFlow
+        self.pending_snapshots  = []      # snapshots defined since the last BuildFlow
+
+        self.selection_bits     = {}   # { selection name : bit position } - regions as bitsets (see region_mask)
+        self.regions_by_mask    = {}   # hash index { region mask : region ID } - derived from regions_dictionary
+        self.weight_masks       = {}   # { event weight : mask of its requirements } - evaluated by evaluate_regions_dictionary
+        self.selection_order    = {}   # { region ID : selections in evaluation order } - only the regions reordered (see costModel.py)
+
         self.init_interfaceDictionary(dictionaryFile)
 
 
@@ -79,7 +110,8 @@ class SampleProcessing:
     # Info dictionary 
     #####################################################
 
-    def get_info_dictionary(self, alternate_AG=""):
+    # The AG is not included for include_AG = False (used by the binary format - the AG is stored in the binary tables)
+    def get_info_dictionary(self, alternate_AG="", include_AG=True):
 
         info_dictionary                       = {}
 
@@ -87,13 +119,16 @@ class SampleProcessing:
         info_dictionary['type']               = str(type(self))
         info_dictionary['targetList']         = self.targetList
         info_dictionary['regions_dictionary'] = self.regions_dictionary
+        info_dictionary['lazy_views']         = {v : [code, list(requires)] for v, (code, requires) in self.lazy_views.items()}
+        info_dictionary['suffixed_views']     = {v : [view, suffix] for v, (view, suffix) in self.suffixed_views.items()}
 
-        if alternate_AG == "":
-            info_dictionary['AG'] = self.AG.get_info_dictionary()
-        else:
-            info_dictionary['AG'] = alternate_AG.get_info_dictionary()
+        if include_AG:
+            if alternate_AG == "":
+                info_dictionary['AG'] = self.AG.get_info_dictionary()
+            else:
+                info_dictionary['AG'] = alternate_AG.get_info_dictionary()
 
-        info_dictionary['ID']     = self.ID.get_info_dictionary()
+        info_dictionary['ID']     = self.ID.get_info_dictionary(verbose=False)
 
         return info_dictionary
 
@@ -103,12 +138,24 @@ class SampleProcessing:
         self.name                            = info_dictionary['name']
         self.targetList                      = info_dictionary['targetList']
         self.regions_dictionary              = info_dictionary['regions_dictionary']
-        self.AG.configure_from_info_dictionary(info_dictionary['AG'])
+        self.lazy_views                      = {v : (code, list(requires)) for v, (code, requires) in info_dictionary.get('lazy_views', {}).items()}
+        self.suffixed_views                  = {v : (view, suffix) for v, (view, suffix) in info_dictionary.get('suffixed_views', {}).items()}
+        if 'AG' in info_dictionary:
+            self.AG.configure_from_info_dictionary(info_dictionary['AG'])
         self.ID.configure_from_info_dictionary(info_dictionary['ID'])
         return
 
 
 
+    # Binary format: the AG is stored in the binary tables, the rest of the flow as extra info
+    def configure_from_binary(self, buffer):
+        info_dictionary = self.AG.configure_from_binary(buffer)
+        if info_dictionary:
+            self.configure_from_info_dictionary(info_dictionary['flow'])
+        return
+
+
+
 
 
 
@@ -140,6 +187,31 @@ class SampleProcessing:
 
 
 
+    #############
+    # Binary format (see InfoGraph.get_binary): faster and more compact than json for large flows
+
+    def saveFlowToBinaryFile(self, fileName = "flow.nflow", alternate_AG=""):
+
+        _graph = self.AG if alternate_AG == "" else alternate_AG
+
+        info_dictionary = {'flow' : self.get_info_dictionary(include_AG=False)}
+
+        with open(fileName, "wb") as file:
+            file.write(_graph.get_binary(info_dictionary))
+        return
+
+
+
+    def loadFlowFromBinaryFile(self, fileName, use_mmap=False):
+
+        print("Loading flow from binary file  ", fileName)
+
+        load_binary_file(fileName, self.configure_from_binary, use_mmap)
+
+        return
+
+
+
 
 
     #####################################################
@@ -165,15 +237,30 @@ class SampleProcessing:
     # Flow definition
     #####################################################
 
+    #############
+    # All the views are added to the AG here (tracked for the incremental BuildFlow)
+    def add_node(self, name, origins_list=[], code='NONE', requires=[]):
+        self.AG.addNode(name, origins_list, code, requirements_list=requires)
+        self.pending_views.append(name)
+        return
+
+
     #############
     # Base definition for analysis variables (views)
     def Define(self, name, code='', requires=[]):
+        if self.define_view(name, code, requires):
+            self.ID.add_variable(name)
+        return
+
+
+    # The view only (the name is not added to the dictionary) - returns True if the view is added
+    def define_view(self, name, code='', requires=[]):
         definition = code if code != '' else 'input'
         print(f"{'[SP] Define        : '}{name : <37}{' as   ' : <20}{definition}")
 
-        if self.AG.isNodeDefined(name):
+        if self.AG.isNodeDefined(name) or (name in self.lazy_views):
             print(f"{'[SP] Define        : '}{name : <37}{' node ALREADY DEFINED -> SKIP !'}")
-            return
+            return False
 
         inputList=[]
         if code != '':
@@ -183,28 +270,189 @@ class SampleProcessing:
                 # Check if a object or collection variable is accessed properly (through its components - not addressing the whole "object")
                 if self.is_object_like_call(var):
                     print(f"{'[SP] ERROR: variable with feature NOT accessed properly - it must be adressed through its components, and not as a whole object!  '}{var : <37}{'  -> SKIP DEFINITION !'}")
-                    return
+                    return False
 
                 # Check if the node for the input variable is already defined
                 if not self.AG.isNodeDefined(var):
+                    # Feature of a derived collection not used so far -> the view is added now
+                    if var in self.lazy_views:
+                        self.materialize_view(var)
                     # If variable is in the data dictionary it is an available input -> can be defined
-                    if self.ID.is_defined(var):
+                    elif self.ID.is_defined(var):
                         print(f"{'[SP] Define        : '}{name : <37}{' input node added ' : <20}{var}")
-                        self.AG.addNode(var)
+                        self.add_node(var)
                     else:
                         # Variable name is not in the data dictionary AND not defined yet -> it CANNOT be defined automatically because it will have no configuration of its inputs! -> Rise ERROR
                         print(f"{'[SP] Define        : '}{name : <37}{' ERROR: MISSING input ' : <20}{var}")
-                        return
+                        return False
                         
-        self.AG.addNode(name, inputList, code, requirements_list=requires)
+        self.add_node(name, inputList, code, requires)
         print(f"{'[SP] Define        : '}{name : <37}{' inputs '}{inputList}")
 
+        return True
+
 
+    #############
+    # Lazy views: the features of the derived collections are registered in the dictionary (so they can be used as
+    # any other variable) but their views are added to the AG only when a Define/Selection/H1D/target uses them
+    def DefineLazy(self, name, code, requires=[]):
+
+        if self.AG.isNodeDefined(name) or (name in self.lazy_views):
+            print(f"{'[SP] Define        : '}{name : <37}{' node ALREADY DEFINED -> SKIP !'}")
+            return
+
+        self.lazy_views[name] = (code, requires)
         self.ID.add_variable(name)
 
         return
 
 
+    def materialize_view(self, name, verbose=True):
+
+        code, requires = self.lazy_views.pop(name)
+
+        inputList = self.ID.get_var_list(code)
+        for var in inputList:
+            if not self.AG.isNodeDefined(var):
+                if var in self.lazy_views:
+                    self.materialize_view(var, verbose)
+                else:
+                    self.add_node(var)
+
+        self.add_node(name, inputList, code, requires)
+        if verbose:
+            print(f"{'[SP] Define (lazy) : '}{name : <37}{' as   ' : <20}{code}")
+
+        return
+
+
+    #############
+    # Bulk definition (e.g. flows generated by scripts with many thousands of definitions)
+    #
+    #  definitions : rows (name, code), (name, code, requires) or dictionaries {'name', 'code', 'requires', 'type'}
+    #                type : 'define' (default), 'selection' or 'weight' (event weight)
+    #  histos      : rows (var, requirements, nBins, xMin, xMax) - as DefineHisto1D
+    #
+    #  - all the codes are tokenized in one pass, the inputs are the tokens defined in the flow, in the dictionary
+    #    or in the same table: the definitions can be in any order (they are added in dependency order)
+    #  - validation in batch : definitions already in the flow, duplicated in the table, with missing inputs
+    #    (or depending on invalid definitions) or in a dependency cycle are skipped and reported in a summary
+    #  - no logging per definition
+    #
+    #  Returns the list of the views added
+    #
+    def DefineMany(self, definitions, histos=[]):
+
+        table = {}
+        kinds = {}
+        errors = []
+
+        for row in definitions:
+            if isinstance(row, dict):
+                name, code, requires, kind = row['name'], row.get('code', ''), row.get('requires', []), row.get('type', 'define')
+            else:
+                name, code, requires, kind = row[0], row[1], (row[2] if len(row) > 2 else []), 'define'
+
+            if self.AG.isNodeDefined(name) or (name in self.lazy_views) or (name in table):
+                errors.append((name, "already defined"))
+                continue
+
+            table[name] = (code, list(requires))
+            kinds[name] = kind
+
+
+        # Dictionary lookups once per name: "input", "object" (accessed as a whole), "missing" (unknown feature) or "" (not a variable)
+        dictionary_names = {}
+
+        def dictionary_name(t):
+            if not t in dictionary_names:
+                if self.ID.is_defined(t):
+                    dictionary_names[t] = "object" if self.is_object_like_call(t) else "input"
+                elif self.ID.is_defined(self.ID.split_name_feat_base(t)[0]):
+                    dictionary_names[t] = "missing"
+                else:
+                    dictionary_names[t] = ""
+            return dictionary_names[t]
+
+
+        # Inputs of each definition (one tokenization pass): requirements are dependencies as well
+        inputs = {}
+        for name, (code, requires) in table.items():
+
+            _inputs = []
+            _error  = ""
+
+            for t in _name_re.findall(code):
+                if (t == '') or (t in _inputs) or (t == name):
+                    continue
+                if (t in table) or self.AG.isNodeDefined(t) or (t in self.lazy_views):
+                    _inputs.append(t)
+                elif dictionary_name(t) == "input":
+                    _inputs.append(t)
+                elif dictionary_name(t) == "object":
+                    _error = "object accessed as a whole : "+t
+                    break
+                elif dictionary_name(t) == "missing":
+                    _error = "missing input : "+t
+                    break
+
+            for r in requires:
+                if not ((r in table) or self.AG.isNodeDefined(r)):
+                    _error = "missing requirement : "+r
+
+            if _error:
+                errors.append((name, _error))
+            else:
+                inputs[name] = _inputs
+
+
+        # Dependency order (Kahn) - definitions depending on invalid ones are not added
+        dependents = {name : [] for name in inputs}
+        n_missing  = {}
+        for name in inputs:
+            _deps = [t for t in inputs[name]+table[name][1] if t in table]
+            n_missing[name] = len(_deps)
+            for t in _deps:
+                if t in dependents:     dependents[t].append(name)
+
+        ready = [name for name in inputs if n_missing[name] == 0]
+        added = []
+
+        while ready:
+            name = ready.pop()
+            code, requires = table[name]
+
+            for t in inputs[name]:
+                if not self.AG.isNodeDefined(t):
+                    if t in self.lazy_views:    self.materialize_view(t, verbose=False)
+                    else:                       self.add_node(t)
+
+            self.add_node(name, inputs[name], code if code != '' else 'NONE', requires)
+            self.ID.add_variable(name)
+            if kinds[name] == 'weight':
+                self.event_weights.append(name)
+            added.append(name)
+
+            for d in dependents[name]:
+                n_missing[d] -= 1
+                if n_missing[d] == 0:    ready.append(d)
+
+        for name in inputs:
+            if not self.AG.isNodeDefined(name):
+                errors.append((name, "missing input or dependency cycle"))
+
+
+        for row in histos:
+            self.DefineHisto1D(*row, verbose=False)
+
+
+        print(f"{'[SP] DefineMany    : '}{len(added)}{' views added  '}{len(histos)}{' H1Ds   '}{len(errors)}{' errors'}")
+        for name, _error in errors:
+            print(f"{'[SP] DefineMany    : ERROR  '}{name : <37}{_error}")
+
+        return added
+
+
     #############
     # Define multiplicative event weight - nodes to be generated once the variable definition is completed
     def DefineEventWeight(self, name, code='', requires=[]):
@@ -225,11 +473,21 @@ class SampleProcessing:
         mask = "mask_%s_%s"%(existing, name)
         self.Define(mask, sel, requires)
 
+        # Collections: the indices of the selected elements are evaluated once (Nonzero) and all the features
+        # are gathered by index (Take) - the mask is not applied again for each feature
+        # Singletons (ObjectAt): the "mask" is already the index of the object
+        if not singleton:
+            indices = "indices_%s_%s"%(existing, name)
+            self.Define(indices, "Nonzero(%s)" % (mask))
+
         # Features SOURCE name
         for feature in self.ID.list_of_features_for(existing):
             var_target = "%s_%s"%(name, feature)
             var_source = "%s_%s"%(existing, feature)
-            self.Define(var_target, "At(%s,%s)" % (var_source, mask))   # TBC : possible issue of RDF with bool types - hack with nail 1.0 -> To be implemented in backend interface
+            if singleton:
+                self.DefineLazy(var_target, "At(%s,%s)" % (var_source, mask))   # TBC : possible issue of RDF with bool types - hack with nail 1.0 -> To be implemented in backend interface
+            else:
+                self.DefineLazy(var_target, "Take(%s,%s)" % (var_source, indices))
 
         if not singleton:
             #            self.Define("n%s" % name, "Sum(%s)" % (mask))
@@ -246,7 +504,7 @@ class SampleProcessing:
         for feature in self.ID.list_of_features_for(existing):
             var_target = "%s_%s"%(name, feature)
             var_source = "%s_%s"%(existing, feature)
-            self.Define(var_target, "Take(%s,%s)" % (var_source, indices))
+            self.DefineLazy(var_target, "Take(%s,%s)" % (var_source, indices))
             # TBC : Take() is RDF specific - a general sysntax should be pssible here, leaving the RDF specific implementation to the C++ code building
 
         #        self.Define("n%s" % name, "int(%s.size())" % (indices))
@@ -281,6 +539,56 @@ class SampleProcessing:
 
         self.SubCollectionFromIndices("%s0" % name, collection, indices= "indices_%s0" % name)
         self.SubCollectionFromIndices("%s1" % name, collection, indices= "indices_%s1" % name)
+
+        self.combinations[name] = [collection, collection]
+        return
+
+
+    #############
+    # Define k-combinations (k = 2..4) of one or more collections, e.g. Combinations("MuMuJet", ["SelectedMuon", "SelectedMuon", "Jet"])
+    #  - legs from the same collection : no repetitions, no permutations (increasing indices)
+    #  - predicate : condition on a candidate, written with the features of the legs <name><leg>_<feature>
+    #                (e.g. "MuMu0_charge != MuMu1_charge") - it is evaluated inside the combinatorics kernel
+    #                (CombinationsIf in helpers.h, processorNumPy.py and processorNumba.py), i.e. only the
+    #                candidates passing it are built
+    #  - the legs are the collections <name>0, <name>1, ... (SubCollectionFromIndices) aligned by candidate
+    def Combinations(self, name, collections, predicate="", requires=[]):
+        print(f"{'[SP] Combinations  : '}{name : <37}{' from  ' : <20}{collections}{'   with  '}{predicate}")
+
+        if not (2 <= len(collections) <= 4):
+            print("[SP] Combinations - ERROR : number of legs not supported (2 to 4)  ", len(collections))
+            return
+
+        for c in collections:
+            if not self.ID.is_counter_defined_for(c):
+                print("[SP] Combinations - ERROR : cannot find collection  ", c)
+                return
+
+        # Legs features -> element of the leg's collection at the candidate index (_i[leg])
+        def leg_feature(m):
+            _collection = collections[int(m.group(1))]
+            if not m.group(2) in self.ID.list_of_features_for(_collection):
+                print("[SP] Combinations - WARNING : feature not found for collection  ", _collection, m.group(2))
+            return "At(%s_%s,_i[%s])" % (_collection, m.group(2), m.group(1))
+
+        leg_re = re.compile(r'\b%s([0-%d])_(\w+)\b' % (re.escape(name), len(collections)-1))
+
+        # No C++-only syntax in the algorithm (it is evaluated by all the backends): the sizes, the groups and the
+        # predicate (a lambda on the candidate indices _i) are written as calls
+        sizes  = ", ".join(self.ID.get_counter_name_for(c) for c in collections)
+        groups = ", ".join(str(collections.index(c)) for c in collections)
+        code   = "CombinationsIf(CombinationSizes(%s), CombinationGroups(%s)" % (sizes, groups)
+        if predicate != "":
+            code += ", CombinationPredicate(%s)" % leg_re.sub(leg_feature, predicate)
+        code  += ")"
+
+        self.Define("indices_"+name, code, requires)
+
+        for leg, c in enumerate(collections):
+            self.Define("indices_%s%d" % (name, leg), "At(indices_%s,%d)" % (name, leg))
+            self.SubCollectionFromIndices("%s%d" % (name, leg), c, indices= "indices_%s%d" % (name, leg))
+
+        self.combinations[name] = list(collections)
         return
     
 
@@ -304,6 +612,132 @@ class SampleProcessing:
         return
 
 
+    #############
+    # Define a specific candidate from a Combinations/Distinct definition (one object per leg: <name>0, <name>1, ...)
+    def TakeCombination(self, name, combination, index, requires=[]):
+        print(f"{'[SP] TakeCombination : '}{name : <35}{' from  ' : <20}{combination}")
+
+        if not combination in self.combinations:
+            print("[SP] TakeCombination - ERROR : cannot find combination  ", combination)
+            return
+
+        self.Define("indices_%s" % (name), index, requires)
+
+        for leg, c in enumerate(self.combinations[combination]):
+            self.ObjectAt("%s%d" % (name, leg), c, "int(At(indices_%s%d,indices_%s))" % (combination, leg, name))
+        return
+
+
+    #############
+    # Systematic variation: alternative definition of a view (input variable, event weight, ...) for the variation
+    # (several views per variation allowed). At BuildFlow the forward sub-graph of the varied views (origins and
+    # requirements: selections, weights, regionWeights, histograms) is duplicated with the names <view>__<variation>,
+    # i.e. all the variations are computed by any backend in the same event loop, the upstream views are shared
+    # and each histogram is booked once per variation (HISTO_...__<variation>, added to the targets by SetTargets)
+    def Variation(self, variation, view, code):
+        print(f"{'[SP] Variation     : '}{variation : <37}{' for  ' : <20}{view}{'   as   '}{code}")
+
+        if not self.AG.isNodeDefined(view):
+            print("[SP] Variation - ERROR : view not defined  ", view)
+            return
+
+        self.variations.setdefault(variation, {})[view] = code
+        return
+
+
+    def varied_name(self, view, variation):    return view+"__"+variation
+
+
+    # Region of varied selections (defined by GenerateVariations)
+    def is_varied_region(self, region_id):
+        return any(s in self.suffixed_views for s in self.regions_dictionary[region_id]['selections'])
+
+
+    # The copies of a view (<view>__<variation>) removed from the AG
+    def remove_suffixed_views(self, view):
+        for v, (_view, _) in self.suffixed_views.items():
+            if (_view == view) and self.AG.isNodeDefined(v):
+                self.AG.removeView(v)
+                self.remove_suffixed_views(v)
+        return
+
+
+    def GenerateVariations(self):
+
+        if not self.variations:
+            return
+
+        consumers = {}
+        for v, iv in self.AG.views.items():
+            for s in iv.get_sources():
+                consumers.setdefault(s, []).append(v)
+
+        rank = {v : i for i, v in enumerate(self.AG.list_of_ranked_views())}
+
+        for variation, overrides in self.variations.items():
+
+            # Forward sub-graph of the varied views
+            forward = set()
+            stack   = list(overrides)
+            while stack:
+                for c in consumers.get(stack.pop(), []):
+                    if not ((c in forward) or (c in overrides)):
+                        forward.add(c)
+                        stack.append(c)
+
+            renames = {v : self.varied_name(v, variation) for v in list(overrides) + list(forward)}
+
+            # The varied names are not added to the dictionary (see suffixed_views)
+            for v, _v in renames.items():
+                self.suffixed_views[_v] = (v, _v[len(v):])
+
+            for v, code in overrides.items():
+                if not self.AG.isNodeDefined(renames[v]):
+                    self.define_view(renames[v], code, list(self.AG.views[v].requirements))
+
+            for v in sorted(forward, key=rank.get):
+
+                if self.AG.isNodeDefined(renames[v]):
+                    continue
+
+                iv = self.AG.views[v]
+
+                # Snapshots: varied columns written to <file>__<variation> (same branches)
+                if iv.is_snapshot():
+                    snapshot = rename_snapshot(iv.snapshot, renames, variation)
+                    self.add_node(renames[v], snapshot['columns'], snapshot_code(snapshot), [renames.get(r, r) for r in iv.requirements])
+                    self.AG.views[renames[v]].snapshot = snapshot
+                else:
+                    self.add_node(renames[v], [renames.get(o, o) for o in iv.origins], rename_in_algorithm(iv.algorithm, renames), [renames.get(r, r) for r in iv.requirements])
+
+                if iv.is_histo():
+                    self.AG.views[renames[v]].histo = rename_histo(iv.histo, renames)
+
+            # Regions with varied selections: same event weights of the nominal region (varied if in the forward sub-graph)
+            # and the regionWeight is the varied copy of the nominal one (regionWeight_<nominal id>__<variation>) - the
+            # varied regions already defined are updated (the nominal weights may change in an incremental build)
+            for v in sorted(forward, key=rank.get):
+
+                req_list = self.AG.ranked_requirements_for_node(renames[v])
+                mask     = self.selections_mask(req_list)
+
+                if (mask in self.get_regions_by_mask()) and not self.is_varied_region(self.get_regions_by_mask()[mask]):
+                    continue
+
+                nominal_id = self.get_region_id_for_requirements(self.AG.ranked_requirements_for_node(v))
+                nominal    = self.regions_dictionary[nominal_id]
+                ew_l       = [renames.get(w, w) for w in nominal['event_weights']]
+                rw_id      = renames.get(self.get_regionWeight_name(nominal_id), self.get_regionWeight_name(nominal_id))[len("regionWeight_"):]
+
+                region_id = self.region_id(req_list)
+                self.regions_dictionary[region_id] = {'selections' : req_list, 'event_weights' : ew_l, 'regionWeight_id' : rw_id}
+                self.regions_by_mask[mask]         = region_id
+
+            print(f"{'[SP] Variation     : '}{variation : <37}{' views varied : '}{len(renames)}")
+
+        return
+
+
     #############
     # Define an object from a collection (index specified)
     def ObjectAt(self, name, existing, index=""):
@@ -313,40 +747,101 @@ class SampleProcessing:
 
 
     #############
-    # Define a 1D histogram 
-    def DefineHisto1D(self, var, requirements=[], nBins=100, xMin=0, xMax=100):
+    # Histograms: 1D, 2D, 3D and profiles, fixed ([nBins, xMin, xMax]) or variable (variable_bins(edges)) binning per axis
+    # The histogram is booked in the region of its variables and requirements (see histoBooking.py)
+    def DefineHisto(self, kind, variables, requirements=[], binnings=[], title="", verbose=True):
 
-        full_hname = "HISTO_"+var
-        #        if region != "":     full_hname = hname+"__"+region
+        full_hname = histo_name(kind, variables, requirements)
 
-        for r in requirements:    full_hname += "__"+r
+        for var in variables:
+            if var in self.lazy_views:
+                self.materialize_view(var)
 
-        
-        #        selections_list = self.AG.ranked_requirements_for_node(var)
-        #        if region != "":     seletions_list.append(region)
-        #
-        #        _region_id = self.region_id(selections_list)
-        #
-        #        full_hname = hname+"__"+_region_id
+        # Histogram full_hname already defined
+        if full_hname in self.histos:
 
+            print(f"{'[SP] Define '+kind :<19}{': SKIP  '}{full_hname : <37}{' already defined for '}{requirements}")
+            return
+
+        try:
+            histo = make_histo(kind, variables, binnings, title)
+        except ValueError as e:
+            print(f"{'[SP] Define '+kind :<19}{': ERROR  '}{full_hname : <37}{' '}{e}")
+            return
+
+        # Histogram full_hname never defined yet (for any region) -> ADD full_hname for this region
+        self.histos[full_hname]              = {}
+        self.histos[full_hname]['region']    = requirements
+        self.histos[full_hname]['variables'] = list(variables)
+        self.histos[full_hname]['histo']     = histo
+
+        if verbose:
+            print(f"{'[SP] Define '+kind :<19}{': '}{full_hname : <37}{' variables  ' : <20}{variables}{'   for region: '}{requirements}")
+
+        self.pending_histos.append(full_hname)
+
+        return
+
+
+    def DefineHisto1D(self, var, requirements=[], nBins=100, xMin=0, xMax=100, verbose=True, edges=None):
+        self.DefineHisto('H1D', [var], requirements, [[nBins, xMin, xMax] if edges is None else variable_bins(edges)], verbose=verbose)
+        return
+
+    def DefineHisto2D(self, xvar, yvar, requirements=[], xbinning=[100, 0, 100], ybinning=[100, 0, 100], title="", verbose=True):
+        self.DefineHisto('H2D', [xvar, yvar], requirements, [xbinning, ybinning], title, verbose)
+        return
+
+    def DefineHisto3D(self, xvar, yvar, zvar, requirements=[], xbinning=[100, 0, 100], ybinning=[100, 0, 100], zbinning=[100, 0, 100], title="", verbose=True):
+        self.DefineHisto('H3D', [xvar, yvar, zvar], requirements, [xbinning, ybinning, zbinning], title, verbose)
+        return
+
+    # Profiles: mean of the last variable in the bins of the others
+    def DefineProfile1D(self, xvar, yvar, requirements=[], xbinning=[100, 0, 100], title="", verbose=True):
+        self.DefineHisto('Profile1D', [xvar, yvar], requirements, [xbinning], title, verbose)
+        return
+
+    def DefineProfile2D(self, xvar, yvar, zvar, requirements=[], xbinning=[100, 0, 100], ybinning=[100, 0, 100], title="", verbose=True):
+        self.DefineHisto('Profile2D', [xvar, yvar, zvar], requirements, [xbinning, ybinning], title, verbose)
+        return
 
-        # H1D full_hname already defined
-        if full_hname in self.histos1D:
 
-            print(f"{'[SP] Define H1D    : SKIP  '}{full_hname : <37}{' already defined for '}{region}")
+
+    #############
+    # Snapshot (skim): the events of the region of the requirements (and of the columns) written with the columns
+    # to file_name (default: <name>.root) - compression, cluster size (auto_flush) and basket size of the output tree
+    def DefineSnapshot(self, name, columns, requirements=[], file_name="", tree_name="Events", compression="ZSTD", compression_level=5, auto_flush=-30000000, basket_size=32000, verbose=True):
+
+        full_sname = snapshot_name(name)
+
+        # Columns used for the first time: the views are added now (e.g. input branches written as they are)
+        for c in columns:
+            if c in self.lazy_views:
+                self.materialize_view(c)
+            elif (not self.AG.isNodeDefined(c)) and self.ID.is_defined(c):
+                self.add_node(c)
+
+        if full_sname in self.snapshots:
+            print(f"{'[SP] DefineSnapshot: SKIP  '}{full_sname : <37}{' already defined'}")
             return
 
-        # H1D full_hname never defined yet (for any region) -> ADD full_hname for this region
-        self.histos1D[full_hname]             = {}
-        self.histos1D[full_hname]['region']   = requirements
-        self.histos1D[full_hname]['variable'] = var
-        self.histos1D[full_hname]['binning']  = [nBins, xMin, xMax]
+        try:
+            snapshot = make_snapshot(columns, file_name if file_name != "" else name+".root", tree_name, compression, compression_level, auto_flush, basket_size)
+        except ValueError as e:
+            print(f"{'[SP] DefineSnapshot: ERROR  '}{full_sname : <37}{' '}{e}")
+            return
+
+        self.snapshots[full_sname]             = {}
+        self.snapshots[full_sname]['region']   = list(requirements)
+        self.snapshots[full_sname]['snapshot'] = snapshot
+
+        if verbose:
+            print(f"{'[SP] DefineSnapshot: '}{full_sname : <37}{' columns    ' : <20}{columns}{'   for region: '}{requirements}{'   -> '}{snapshot['file']}")
 
-        print(f"{'[SP] Define H1D    : '}{full_hname : <37}{' variable   ' : <20}{var}{'   for region: '}{requirements}")
+        self.pending_snapshots.append(full_sname)
 
         return
 
-    
+
 
 
 
@@ -354,8 +849,21 @@ class SampleProcessing:
     # DAG TRANSLATION
     #####################################################
 
+    # The names in suffixed_views are translated as their view plus the suffix (e.g. <view>__<variation>)
     def translate_string(self, string_to_translate):
-        return self.ID.translate_string(string_to_translate)
+
+        if not self.suffixed_views:
+            return self.ID.translate_string(string_to_translate)
+
+        translated = ""
+        pos        = 0
+        for m in _name_re.finditer(string_to_translate):
+            if m.group(1) in self.suffixed_views:
+                view, suffix = self.suffixed_views[m.group(1)]
+                translated  += self.ID.translate_string(string_to_translate[pos:m.start()]) + self.translate_string(view) + suffix
+                pos          = m.end()
+
+        return translated + self.ID.translate_string(string_to_translate[pos:])
 
 
 
@@ -371,10 +879,10 @@ class SampleProcessing:
         
         for o_view in o_Graph.views.values():
 
-            t_view_name              = self.ID.translate_string(o_view.view)
-            t_view_algorithm         = self.ID.translate_string(o_view.algorithm)
-            t_view_origins           = [self.ID.translate_string(_o) for _o in o_view.origins]
-            t_view_requirements      = [self.ID.translate_string(_r) for _r in o_view.requirements]
+            t_view_name              = self.translate_string(o_view.view)
+            t_view_algorithm         = self.translate_string(o_view.algorithm)
+            t_view_origins           = [self.translate_string(_o) for _o in o_view.origins]
+            t_view_requirements      = [self.translate_string(_r) for _r in o_view.requirements]
             t_view_id_code           = copy.deepcopy(o_view.id_code)
             t_view_status            = copy.deepcopy(o_view.status)
             
@@ -382,6 +890,13 @@ class SampleProcessing:
             
             t_Graph.addNode(t_view_name, t_view_origins, t_view_algorithm, t_view_requirements, t_view_id_code, t_view_status)
 
+            if o_view.is_histo():
+                _h = o_view.histo
+                t_Graph.views[t_view_name].histo = rename_histo(_h, {v : self.translate_string(v) for v in _h['variables']+[_h['weight']]})
+
+            if o_view.is_snapshot():
+                t_Graph.views[t_view_name].snapshot = rename_snapshot(o_view.snapshot, {c : self.translate_string(c) for c in o_view.snapshot['columns']})
+
 
         return t_Graph
 
@@ -392,7 +907,8 @@ class SampleProcessing:
     #####################################################
 
     def SetTargets(self, tList):
-        self.targetList = tList
+        # The variations of the targets (see Variation) are targets as well
+        self.targetList = list(tList) + [self.varied_name(t, var) for var in self.variations for t in tList if self.AG.isNodeDefined(self.varied_name(t, var))]
         return
 
 
@@ -419,70 +935,63 @@ class SampleProcessing:
 
 
 
-    def GetH1DsDictionary(self):
+    # Histograms of the AG (ranked): definition of the view + region info for the backends
+    def GetHistosDictionary(self):
 
-        h1dsDictionary = {}
+        histosDictionary = {}
 
-        listOfRankedViews = self.AG.list_of_ranked_views()
-
-
-        for v in listOfRankedViews:
+        for v in self.AG.list_of_ranked_views():
 
             _view = self.AG.views[v]
 
-            if not self.is_view_H1D(_view):
+            if not self.is_view_histo(_view):
                 continue
 
-            h_name = _view.view
-            h_def  = _view.algorithm
-
-            h_pars = h_def.replace('H1D::(','').replace(')','').replace(', ',',').split(',')
-
-            h_var       = h_pars[0]
-            h_weight    = h_pars[1]
-            h_nBins     = h_pars[2]
-            h_xMin      = h_pars[3]
-            h_xMax      = h_pars[4]
-
             v_region    = self.region_id_for_node(v)
 
             h_selection = ""
             if v_region != "base":
                 h_selection = 'selection_'+v_region
 
-            
             h_region = "__".join(_view.requirements)
 
-            h_title  = h_var+' {'+h_region+'}'
-            
-            print("\n == H1D :: ", v)
-            print(" h_name      = ", h_name  )
-            print(" h_var       = ", h_var   )
-            print(" h_weight    = ", h_weight)
-            print(" h_nBins     = ", h_nBins )
-            print(" h_xMin      = ", h_xMin  )
-            print(" h_xMax      = ", h_xMax  )
-            print(" h_region    = ", h_region)
-            print(" v_region    = ", v_region)
-            print(" h_selection = ", h_selection)
-            print(" h_title     = ", h_title)
-            print("\n")
-
-
-            hd = {}
-            hd["var"]             =  h_var
-            hd["weight"]          =  h_weight
-            hd["nBins"]           =  h_nBins
-            hd["xMin"]            =  h_xMin
-            hd["xMax"]            =  h_xMax
+            hd = dict(_view.histo)
             hd["histo_region"]    =  h_region
             hd["var_region"]      =  v_region
             hd["histo_selection"] =  h_selection
-            hd["title"]           =  h_title
+            hd["title"]           =  histo_title(_view.histo, h_region)
+
+            print(f"{'== '+hd['kind']+' :: ' :<16}{v :<45}{' variables : '}{hd['variables']}{'   weight : '}{hd['weight']}{'   region : '}{v_region}")
+
+            histosDictionary[v] = hd
 
-            h1dsDictionary[h_name] = hd
+        return histosDictionary
 
-        return h1dsDictionary
+
+
+    # Snapshots of the AG (ranked): definition of the view + region info for the backends
+    def GetSnapshotsDictionary(self):
+
+        snapshotsDictionary = {}
+
+        for v in self.AG.list_of_ranked_views():
+
+            _view = self.AG.views[v]
+
+            if not self.is_view_snapshot(_view):
+                continue
+
+            v_region = self.region_id_for_node(v)
+
+            sd = dict(_view.snapshot)
+            sd["snapshot_region"]    = v_region
+            sd["snapshot_selection"] = 'selection_'+v_region if v_region != "base" else ""
+
+            print(f"{'== Snapshot :: ' :<16}{v :<45}{' columns : '}{sd['columns']}{'   region : '}{v_region}{'   -> '}{sd['file']}")
+
+            snapshotsDictionary[v] = sd
+
+        return snapshotsDictionary
 
 
 
@@ -508,15 +1017,99 @@ class SampleProcessing:
 
     def get_region_id_for_requirements(self, req=[]):
 
-        # NOTE: SAME RANKING inside the lists to be compared !!  --- The ranking might change after sub-graph extraction ?!?!?!?! -> TBC !!
-        # Ranking should not be altered by sub-graph extraction by construction of the requirements chain
+        # The region is found by its set of selections (mask): the ranking of the list is not relevant
 
-        for region in self.regions_dictionary:
-            if req == self.regions_dictionary[region]['selections']:
-                return region
+        region = self.get_regions_by_mask().get(self.selections_mask(req), "")
+
+        if region == "":
+            print("***************** ERROR : selection chain NOT FOUND for requirements: ", req)
+
+        return region
+
+
+
+    #############
+    # Region algebra on bitsets
+    #
+    #  - each selection is interned to a bit position, a region (i.e. its set of selections) is an int mask
+    #  - subset / parent / child queries are bit operations: a is contained in b  <->  (a & ~b) == 0
+    #  - the region ids (md5 of the ranked selections) are unchanged: regions_by_mask is the hash index
+    #    { mask : region id } (rebuilt when the regions_dictionary is evaluated or loaded)
+
+    def selection_bit(self, selection):
+        if not selection in self.selection_bits:
+            self.selection_bits[selection] = len(self.selection_bits)
+        return self.selection_bits[selection]
+
+
+    def selections_mask(self, selections_list=[]):
+        mask = 0
+        for s in selections_list:    mask |= (1 << self.selection_bit(s))
+        return mask
+
+
+    def region_mask(self, region_id):
+        if region_id == "base":    return 0
+        return self.selections_mask(self.regions_dictionary[region_id]['selections'])
+
+
+    def get_regions_by_mask(self):
+        if len(self.regions_by_mask) != len(self.regions_dictionary):
+            self.regions_by_mask = {self.region_mask(r) : r for r in self.regions_dictionary}
+        return self.regions_by_mask
+
+
+    def region_selections(self, region_id):
+        if region_id == "base":    return []
+        return self.regions_dictionary[region_id]['selections']
+
+
+    # Selections of the region in evaluation order (the ranked ones if not reordered - see costModel.reorder_selections)
+    def region_selection_chain(self, region_id):
+        return self.selection_order.get(region_id, self.region_selections(region_id))
 
-        print("***************** ERROR : selection chain NOT FOUND for requirements: ", req)
-        return ""
+
+    # Events of region a are a subset of the events of region b (the selections of b are a subset of those of a)
+    def is_subregion(self, region_a, region_b):
+        mask_a = self.region_mask(region_a)
+        mask_b = self.region_mask(region_b)
+        return (mask_b & ~mask_a) == 0
+
+
+    # Parent: the region with the most selections among the ones strictly containing region_id ("base" if none)
+    # candidates: regions to be considered (e.g. the regions already evaluated by a processor), all by default
+    def region_parent(self, region_id, candidates=None):
+
+        mask   = self.region_mask(region_id)
+        parent = "base"
+        n_sels = 0
+
+        for _m, _r in self.get_regions_by_mask().items():
+
+            if (_m == mask) or (_m & ~mask) or ((candidates is not None) and not (_r in candidates)):
+                continue
+
+            if bin(_m).count("1") > n_sels:
+                parent = _r
+                n_sels = bin(_m).count("1")
+
+        return parent
+
+
+    # Lattice of the regions: { region id : list of the direct children } (regions with one selection more)
+    def get_region_lattice(self):
+
+        masks   = self.get_regions_by_mask()
+        lattice = {r : [] for r in masks.values()}
+        lattice.setdefault("base", [])
+
+        for _m, _r in masks.items():
+            for bit in range(len(self.selection_bits)):
+                child = _m | (1 << bit)
+                if (child != _m) and (child in masks):
+                    lattice[_r].append(masks[child])
+
+        return lattice
 
 
 
@@ -550,21 +1143,17 @@ class SampleProcessing:
     def list_of_weights_for_selections(self, req_list):
         lw =[]
 
+        region_mask = self.selections_mask(req_list)
+
         for ew in self.event_weights:
 
-            ew_req = self.AG.list_of_requirements(ew)
+            if not ew in self.weight_masks:
+                self.weight_masks[ew] = self.selections_mask(self.AG.list_of_requirements(ew))
 
             # If ALL the requirements for event_weight are in the requirements list for the region, then add the weight to the list
-            # All "base" event_weights are added - because ew_req = [] (is empty)
+            # All "base" event_weights are added - because the mask of their requirements is 0
 
-            to_be_added = True
-
-            for r in ew_req:
-                if not r in req_list:
-                    to_be_added = False
-                    break
-
-            if to_be_added:    lw.append(ew)
+            if (self.weight_masks[ew] & ~region_mask) == 0:    lw.append(ew)
 
         return self.AG.rank_nodes(lw)
 
@@ -589,9 +1178,11 @@ class SampleProcessing:
 
     def add_region(self, req_list=[]):
 
-        region_id = self.region_id(req_list)
+        region_mask = self.selections_mask(req_list)
+
+        if not region_mask in self.get_regions_by_mask():
 
-        if not region_id in self.regions_dictionary:
+            region_id = self.region_id(req_list)
 
             ew_l = self.list_of_weights_for_selections(req_list)
             
@@ -601,17 +1192,19 @@ class SampleProcessing:
             _d['regionWeight_id'] = self.regionWeight_id(ew_l)
 
             self.regions_dictionary[region_id] = _d
+            self.regions_by_mask[region_mask]  = region_id
 
         return
 
 
 
-    def get_H1D_ranked_requirements_list(self, hvar="", hreqs=[]):
+    def get_histo_ranked_requirements_list(self, hvars=[], hreqs=[]):
 
-        if not hreqs:
-            rl = self.AG.list_of_requirements(hvar)
-        else:
-            rl = self.AG.list_of_requirements(hvar)
+        rl = []
+        for _v in hvars:
+            rl = self._merge_without_duplicates(rl, self.AG.list_of_requirements(_v))
+
+        if hreqs:
             for _r in hreqs:
                 rl = self._merge_without_duplicates(rl, self.AG.list_of_requirements(_r)+[_r])
 
@@ -623,6 +1216,8 @@ class SampleProcessing:
     def evaluate_regions_dictionary(self):
 
         self.regions_dictionary.clear()
+        self.regions_by_mask.clear()
+        self.weight_masks.clear()
         
         print("\n========== evaluate_regions_dictionary ======================\n")
 
@@ -641,17 +1236,29 @@ class SampleProcessing:
 
 
         #############
-        # H1Ds (views NOT YET defined)
+        # Histograms (views NOT YET defined)
+
+        for hname in self.histos:
+
+            hvars    = self.histos[hname]['variables']
+            hreqs    = self.histos[hname]['region']
+            req_list = self.get_histo_ranked_requirements_list(hvars, hreqs)
+
+            self.add_region(req_list)
+
+            print(f"{'HISTO : '}{', '.join(hvars) :<24}{'  -->  '}{req_list}")
+
+
+        #############
+        # Snapshots (views NOT YET defined)
 
-        for hname in self.histos1D:
+        for sname in self.snapshots:
 
-            hvar     = self.histos1D[hname]['variable']
-            hreqs    = self.histos1D[hname]['region']
-            req_list = self.get_H1D_ranked_requirements_list(hvar, hreqs)
+            req_list = self.get_histo_ranked_requirements_list(self.snapshots[sname]['snapshot']['columns'], self.snapshots[sname]['region'])
 
             self.add_region(req_list)
 
-            print(f"{'H1D : '}{hvar :<26}{'  -->  '}{req_list}")
+            print(f"{'SNAPSHOT : '}{sname :<21}{'  -->  '}{req_list}")
 
 
         print("\n+++++++++++++++++++++++++++++++++++++")
@@ -687,51 +1294,97 @@ class SampleProcessing:
         self.evaluate_regions_dictionary()
 
         for region in self.regions_dictionary:
+            self.generate_region_weight(region)
+
+        return
+
 
-            regionWeight_name = self.get_regionWeight_name(region)
 
-            if not self.AG.isNodeDefined(regionWeight_name):
+    def generate_region_weight(self, region):
+
+        regionWeight_name = self.get_regionWeight_name(region)
 
-                req_list          = self.regions_dictionary[region]['selections']
-                weights_list      = self.regions_dictionary[region]['event_weights']
+        if not self.AG.isNodeDefined(regionWeight_name):
 
-                if not weights_list:
-                    weights_list = ["1.0f"]
-                
-                regionWeight_code = ' * '.join(weights_list)
+            req_list          = self.regions_dictionary[region]['selections']
+            weights_list      = self.regions_dictionary[region]['event_weights']
 
-                # It is important to propagate the requirements list to the node definition in order to catch the selections applied to the H1D directly (e.g. eta range)
-                self.Define(regionWeight_name, regionWeight_code, requires=req_list)
+            if not weights_list:
+                weights_list = ["1.0f"]
+
+            regionWeight_code = ' * '.join(weights_list)
+
+            # It is important to propagate the requirements list to the node definition in order to catch the selections applied to the H1D directly (e.g. eta range)
+            self.Define(regionWeight_name, regionWeight_code, requires=req_list)
 
         return
 
 
 
 
-    def GenerateHistos1D(self):
+    def GenerateHistos(self):
 
-        for hname in self.histos1D:
+        for hname in self.histos:
+            self.generate_histo(hname)
+
+        return
 
-            hvar     = self.histos1D[hname]['variable']
-            hreqs    = self.histos1D[hname]['region']
-            hbinning = self.histos1D[hname]['binning']
 
-            # NOTE:  The ranking might change after sub-graph extraction ?!?!?!?! -> It should not (by construction - at least the relative ranking of nodes should not change!)
-            #        Can the ranking change for sub-graph ??? (assuming no activation)
-            #        In this case the ranking is evaluated on the complete Analysis Graph (not only the sub-graph defined by targets) -> OK! 
 
-            req_list          = self.get_H1D_ranked_requirements_list(hvar, hreqs)
-            regionWeight_name = self.get_regionWeight_name_for_requirements(req_list)
+    def generate_histo(self, hname):
 
-            hcode = 'H1D::('+hvar+', '+regionWeight_name+', '+str(hbinning[0])+', '+str(hbinning[1])+', '+str(hbinning[2])+')'
+        hvars    = self.histos[hname]['variables']
+        hreqs    = self.histos[hname]['region']
 
-            #            if hregion != "":
-            #                self.Define(hname, hcode, [hregion])
-            #            else:
-            #                self.Define(hname, hcode, [])
+        # NOTE:  The ranking might change after sub-graph extraction ?!?!?!?! -> It should not (by construction - at least the relative ranking of nodes should not change!)
+        #        Can the ranking change for sub-graph ??? (assuming no activation)
+        #        In this case the ranking is evaluated on the complete Analysis Graph (not only the sub-graph defined by targets) -> OK! 
+
+        req_list          = self.get_histo_ranked_requirements_list(hvars, hreqs)
+        regionWeight_name = self.get_regionWeight_name_for_requirements(req_list)
+
+        histo             = dict(self.histos[hname]['histo'])
+        histo['weight']   = regionWeight_name
+
+        self.Define(hname, histo_code(histo), hreqs)
+
+        if self.AG.isNodeDefined(hname):
+            self.AG.views[hname].histo = histo
+
+        return
+
+
+
+
+    def GenerateSnapshots(self):
+
+        for sname in self.snapshots:
+            self.generate_snapshot(sname)
+
+        return
+
+
+
+    # Origins of the view: the columns (the input columns not used by other views are added here)
+    def generate_snapshot(self, sname):
+
+        snapshot = self.snapshots[sname]['snapshot']
+
+        for c in snapshot['columns']:
+            if self.AG.isNodeDefined(c):
+                continue
+            if c in self.lazy_views:
+                self.materialize_view(c)
+            elif self.ID.is_defined(c):
+                self.add_node(c)
+            else:
+                print(f"{'[SP] DefineSnapshot: ERROR  '}{sname : <37}{' MISSING column '}{c}")
+                return
+
+        self.add_node(sname, snapshot['columns'], snapshot_code(snapshot), self.snapshots[sname]['region'])
+        self.AG.views[sname].snapshot = snapshot
+        self.ID.add_variable(sname)
 
-            self.Define(hname, hcode, hreqs)
-                
         return
 
 
@@ -744,9 +1397,15 @@ class SampleProcessing:
 
 
 
-    def is_view_H1D(self, _view):
-        if (_view.algorithm.startswith('H1D::')):    return True
-        return False
+    def is_view_histo(self, _view):
+        return _view.is_histo()
+
+    def is_view_snapshot(self, _view):
+        return _view.is_snapshot()
+
+    # Histograms and snapshots: filled/written by the backends (no column computed)
+    def is_view_output(self, _view):
+        return _view.is_output()
         
     
 
@@ -786,14 +1445,23 @@ class SampleProcessing:
 
     def BuildFlow(self):
 
+        if self.is_built:
+            self.UpdateFlow()
+            return
+
         print("\n[BuildFlow] -> GenerateSelectionWeights --------------------------------------------------- \n")
 
         self.GenerateSelectionWeights()
 
 
-        print("\n[BuildFlow] -> GenerateHistos1D --------------------------------------------------- \n")
+        print("\n[BuildFlow] -> GenerateHistos --------------------------------------------------- \n")
+
+        self.GenerateHistos()
+
 
-        self.GenerateHistos1D()
+        print("\n[BuildFlow] -> GenerateSnapshots --------------------------------------------------- \n")
+
+        self.GenerateSnapshots()
 
 
 
@@ -835,8 +1503,86 @@ class SampleProcessing:
         print("\n+++++++++++++++++++++++++++++++++++++\n")
 
 
+        self.GenerateVariations()
+
+        self.is_built = True
+        self.pending_views.clear()
+        self.pending_histos.clear()
+        self.pending_snapshots.clear()
+
+        return
+
+
+
+    #############
+    # Incremental build (BuildFlow after the first one): only what was added since the last build is processed
+    #  - new views, histos and snapshots -> their regions (if new) and the regionWeight nodes of the new regions
+    #  - new event weights     -> the existing regions they apply to get the new list of weights (new regionWeight
+    #                             node) and their histograms are re-defined with the new region weight
+    #  - variations            -> the varied copies of the histograms re-defined are removed, and generated again
+    #                             (with the varied copies of the new regionWeights) by GenerateVariations, which
+    #                             updates the varied regions as well
+    def UpdateFlow(self):
+
+        new_views   = list(self.pending_views)
+        new_histos  = list(self.pending_histos)
+        new_snaps   = list(self.pending_snapshots)
+        new_weights = [v for v in new_views if v in self.event_weights]
+
+        print(f"{'[BuildFlow] incremental : new views '}{len(new_views)}{'   new histos '}{len(new_histos)}{'   new snapshots '}{len(new_snaps)}{'   new event weights '}{new_weights}")
+
+        n_regions = len(self.regions_dictionary)
+
+        # Existing regions with new event weights
+        changed = []
+        if new_weights:
+            for region, _d in self.regions_dictionary.items():
+                if self.is_varied_region(region):
+                    continue
+                ew_l = self.list_of_weights_for_selections(_d['selections'])
+                if ew_l != _d['event_weights']:
+                    _d['event_weights']   = ew_l
+                    _d['regionWeight_id'] = self.regionWeight_id(ew_l)
+                    changed.append(region)
+
+        for v in new_views:
+            self.add_region(self.AG.ranked_requirements_for_node(v))
+
+        for hname in new_histos:
+            self.add_region(self.get_histo_ranked_requirements_list(self.histos[hname]['variables'], self.histos[hname]['region']))
+
+        for sname in new_snaps:
+            self.add_region(self.get_histo_ranked_requirements_list(self.snapshots[sname]['snapshot']['columns'], self.snapshots[sname]['region']))
+
+        for region in list(self.regions_dictionary)[n_regions:] + changed:
+            self.generate_region_weight(region)
+
+        # Histograms already built in the regions with new weights
+        if changed:
+            for hname in self.histos:
+                if self.AG.isNodeDefined(hname) and (not hname in new_histos):
+                    req_list = self.get_histo_ranked_requirements_list(self.histos[hname]['variables'], self.histos[hname]['region'])
+                    if self.get_region_id_for_requirements(req_list) in changed:
+                        self.AG.removeView(hname)
+                        self.remove_suffixed_views(hname)
+                        new_histos.append(hname)
+
+        for hname in new_histos:
+            self.generate_histo(hname)
+
+        # Snapshots: no region weight - not re-defined for the regions with new weights
+        for sname in new_snaps:
+            self.generate_snapshot(sname)
+
+        print(f"{'[BuildFlow] incremental : new regions '}{len(self.regions_dictionary)-n_regions}{'   regions with new weights '}{len(changed)}{'   histos (re)defined '}{len(new_histos)}")
+
+        self.GenerateVariations()
+
+        # regionWeight, histogram, snapshot and variation nodes just defined included
+        self.pending_views.clear()
+        self.pending_histos.clear()
+        self.pending_snapshots.clear()
 
-        
         return
 
 
@@ -917,10 +1663,10 @@ class SampleProcessing:
         self.GenerateSelectionWeights()
 
         print("")
-        print("[GenerateHistos1D] --------------------------------------------------- ")
+        print("[GenerateHistos] --------------------------------------------------- ")
         print("")
 
-        self.GenerateHistos1D()
+        self.GenerateHistos()
         
         print("\n --------------------------------------------------- \n")
 
@@ -0,0 +1,458 @@
+from histoBooking import rename_histo
+from snapshotOutput import rename_snapshot
+import re
+
+
+#######################################################################################
+#
+# Graph optimization passes - applied by the processors to the target graph (dag) before
+# the code generation. The views of the dag are shared with the flow graph (AG): they are
+# modified through own_view() only, i.e. the flow is never changed by a pass.
+#
+#  Protected views (never removed/renamed): they are referenced outside the dag views by the
+#  flow dictionaries (regions, histograms, snapshots) or they are the targets
+#   - requirement nodes (selections: the region ids depend on their names)
+#   - targets, histogram and snapshot views (targets: the targets of the flow, or the targets of the
+#     processor when passed - e.g. the regionWeights of the cut-flow, see cutflow.py)
+#   - variables and weights filled in the histograms, columns written by the snapshots
+#
+#######################################################################################
+
+
+# Tokens of an algorithm string: string/char literals, numbers (e.g. 0.25f), names, anything else (one char)
+_token_re = re.compile(r'"(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\'|\.?\d[\w.]*|[A-Za-z_]\w*|\S')
+
+
+def canonical_algorithm(algorithm, renames={}):
+    # Tokens joined by one blank: independent of the original spacing
+    return " ".join(renames.get(t, t) for t in _token_re.findall(algorithm))
+
+
+
+def rename_in_algorithm(algorithm, renames):
+    return _token_re.sub(lambda m: renames.get(m.group(0), m.group(0)), algorithm)
+
+
+
+def protected_views(flow, dag, targets=None):
+
+    protected = set(dag.list_of_requirement_nodes()) | set(flow.targetList if targets is None else targets)
+
+    for v, iv in dag.views.items():
+        if flow.is_view_output(iv):
+            protected.add(v)
+            protected.update(iv.origins)
+
+    return protected
+
+
+
+#######################################################################################
+# Replaces the origin "old" with "new" in all the views of the dag (origins and algorithms)
+#
+def replace_origin(dag, renames):
+
+    for v in list(dag.views):
+
+        iv = dag.views[v]
+
+        if not any(o in renames for o in iv.origins):
+            continue
+
+        iv = dag.own_view(v)
+
+        _origins = []
+        for o in iv.origins:
+            _o = renames.get(o, o)
+            if not _o in _origins:
+                _origins.append(_o)
+
+        iv.origins   = tuple(_origins)
+        iv.algorithm = rename_in_algorithm(iv.algorithm, renames)
+
+        if iv.is_histo():
+            iv.histo = rename_histo(iv.histo, renames)
+
+        if iv.is_snapshot():
+            iv.snapshot = rename_snapshot(iv.snapshot, renames)
+
+    return
+
+
+
+#######################################################################################
+# Common-subexpression elimination
+#
+#  Two transformations are identical if they have the same requirements and the same canonical
+#  algorithm (blanks removed, origins replaced by their representative - i.e. duplicates of
+#  duplicates are found in a single pass over the ranked views).
+#  The duplicate is removed and its consumers use the representative; if both are protected
+#  the duplicate becomes an alias (algorithm = the representative).
+#
+#  Returns the aliases dictionary { duplicate : representative }
+#
+def eliminate_common_subexpressions(flow, dag, verbose=True, targets=None):
+
+    protected = protected_views(flow, dag, targets)
+    aliases   = {}
+    renames   = {}
+    seen      = {}
+
+    for v in dag.list_of_ranked_views():
+
+        iv = dag.views[v]
+
+        if (not iv.is_transformation()) or flow.is_view_output(iv):
+            continue
+
+        _key = (canonical_algorithm(iv.algorithm, renames), tuple(sorted(iv.requirements)))
+
+        if not _key in seen:
+            seen[_key] = v
+            continue
+
+        rep = seen[_key]
+
+        if (v in protected) and (not rep in protected):
+            # The protected view becomes the representative (the consumers of rep are ranked after rep: re-ranked later)
+            renames[rep]  = v
+            seen[_key]    = v
+            aliases[rep]  = v
+            for d in (renames, aliases):
+                for a, r in d.items():
+                    if r == rep:    d[a] = v
+
+        elif v in protected:
+            _iv           = dag.own_view(v)
+            _iv.algorithm = rep
+            _iv.origins   = (rep,)
+            aliases[v]    = rep
+            continue
+
+        else:
+            renames[v] = rep
+            aliases[v] = rep
+
+    removed = [v for v in renames]
+    replace_origin(dag, renames)
+
+    for v in removed:
+        dag.removeView(v)
+
+    if verbose:
+        print(f"{'[CSE] views : '}{len(dag.views)}{'   merged : '}{len(aliases)}")
+        for a, r in aliases.items():
+            print(f"{'[CSE]    '}{a :<45}{' -> '}{r}")
+
+    return aliases
+
+
+
+#######################################################################################
+# Constant folding and trivial-weight elimination
+#
+#  - constants (algorithm without origins, e.g. "1.0f") are evaluated at generation time
+#  - a transformation of constants only (numbers, + - * / and parentheses) becomes a constant
+#  - products (e.g. region weights "Weight_normalisation * Weight_base_1 * w_btag") lose the
+#    factors equal to 1 and the constant factors are merged in one literal
+#  - the type of the views is not known at generation time: a float or double identity is dropped
+#    only from the region weights (used as weights of the fills), the other views keep it as the
+#    literal of the type of the result (e.g. "nMuon * 1.0f" is a float, "nMuon" would be an int)
+#  - histograms filled with a weight equal to 1 lose the weight origin: the processors emit unweighted fills
+#  - views no longer used (e.g. "1.0f" weights) are removed
+#
+#  Literals keep the C++ type: each operation is evaluated with the C promotion rules (float if
+#  any operand is float, double if any is double, int otherwise - int / int is the integer division).
+#
+#  Returns the dictionary of the constant values { view : value }
+#
+
+_number_re = re.compile(r'^(\d+\.?\d*|\.\d+)([eE][+-]?\d+)?([fF]?)$')
+
+
+def _literal_value(token):
+    m = _number_re.match(token)
+    if m is None:
+        return None
+    _text = m.group(1)+(m.group(2) or "")
+    if m.group(3):                                   return (float(_text), "f")
+    if ("." in _text) or ("e" in _text.lower()):    return (float(_text), "d")
+    return (int(_text), "i")
+
+
+def _literal_text(value, kind):
+    if kind == "f":     return repr(float(value))+"f"
+    if kind == "d":     return repr(float(value))
+    return str(int(value))
+
+
+def _combined_kind(kinds):
+    if "d" in kinds:    return "d"
+    if "f" in kinds:    return "f"
+    return "i"
+
+
+def _binary_operation(op, a, b):
+
+    kind = _combined_kind([a[1], b[1]])
+
+    if op == "+":    return (a[0] + b[0], kind)
+    if op == "-":    return (a[0] - b[0], kind)
+    if op == "*":    return (a[0] * b[0], kind)
+
+    if kind == "i":
+        # C integer division: truncated toward zero
+        q = abs(a[0]) // abs(b[0])
+        return (q if (a[0] < 0) == (b[0] < 0) else -q, kind)
+
+    return (a[0] / b[0], kind)
+
+
+# Recursive descent on the tokens (+ - * / unary signs and parentheses): each operation takes the type of its
+# operands (C promotion rules), e.g. 1/2*1.0f is evaluated as (1/2)*1.0f = 0.0f
+def _fold_expression(tokens, values):
+
+    items = []
+    for t in tokens:
+        if t in values:                         items.append(values[t])
+        elif _literal_value(t) is not None:     items.append(_literal_value(t))
+        elif t in ("+", "-", "*", "/", "(", ")"):    items.append(t)
+        else:                                   return None
+
+    pos = 0
+
+    def _next():
+        nonlocal pos
+        if pos >= len(items):
+            raise ValueError("unexpected end")
+        pos += 1
+        return items[pos-1]
+
+    def _peek():
+        return items[pos] if pos < len(items) else None
+
+    def _factor():
+        t = _next()
+        if t in ("+", "-"):
+            v = _factor()
+            return (-v[0], v[1]) if t == "-" else v
+        if t == "(":
+            v = _sum()
+            if _next() != ")":
+                raise ValueError("missing )")
+            return v
+        if isinstance(t, tuple):
+            return t
+        raise ValueError("unexpected "+t)
+
+    def _product():
+        v = _factor()
+        while _peek() in ("*", "/"):
+            v = _binary_operation(_next(), v, _factor())
+        return v
+
+    def _sum():
+        v = _product()
+        while _peek() in ("+", "-"):
+            v = _binary_operation(_next(), v, _product())
+        return v
+
+    try:
+        value = _sum()
+    except (ValueError, ZeroDivisionError):
+        return None
+
+    if pos != len(items):
+        return None
+
+    return value
+
+
+def _fold_product(tokens, values, drop_identity=False):
+
+    # name * name * 1.0f ... only
+    factors = tokens[0::2]
+    if (len(tokens) % 2 == 0) or any(t != "*" for t in tokens[1::2]):
+        return None
+
+    kept      = []
+    constants = []
+    for f in factors:
+        if f in values:                          constants.append(values[f])
+        elif _literal_value(f) is not None:      constants.append(_literal_value(f))
+        elif re.match(r'^[A-Za-z_]\w*$', f):     kept.append(f)
+        else:                                    return None
+
+    value = 1
+    for c in constants:
+        value *= c[0]
+    kind  = _combined_kind([c[1] for c in constants])
+
+    if (value != 1) or ((kind != "i") and not drop_identity):
+        kept.append(_literal_text(value, kind))
+
+    return kept
+
+
+def fold_constants(flow, dag, verbose=True, targets=None):
+
+    values = {}
+    folded = []
+
+    for v in dag.list_of_ranked_views():
+
+        iv = dag.views[v]
+
+        if flow.is_view_output(iv) or not iv.has_transformation():
+            continue
+
+        tokens = _token_re.findall(iv.algorithm)
+
+        result = _fold_expression(tokens, values)
+
+        if result is not None:
+            values[v] = result
+            if iv.is_transformation():
+                _iv           = dag.own_view(v)
+                _iv.algorithm = _literal_text(*result)
+                _iv.origins   = ()
+                folded.append(v)
+            continue
+
+        kept = _fold_product(tokens, values, drop_identity=v.startswith("regionWeight_"))
+
+        if (kept is not None) and (kept != tokens[0::2]):
+            _iv           = dag.own_view(v)
+            _iv.algorithm = " * ".join(kept)
+            _iv.origins   = tuple(o for o in iv.origins if o in kept)
+            folded.append(v)
+
+    # Unweighted histograms
+    unweighted = []
+
+    for v in list(dag.views):
+
+        iv = dag.views[v]
+
+        if not flow.is_view_histo(iv):
+            continue
+
+        h_weight = iv.histo['weight']
+
+        if (h_weight in values) and (values[h_weight][0] == 1) and (h_weight in iv.origins):
+            _iv         = dag.own_view(v)
+            _iv.origins = tuple(o for o in iv.origins if o != h_weight)
+            unweighted.append(v)
+
+    removed = remove_unused_views(flow, dag, targets)
+
+    if verbose:
+        print(f"{'[FOLD] constants : '}{len(values)}{'   folded : '}{len(folded)}{'   unweighted histos : '}{len(unweighted)}{'   removed : '}{len(removed)}")
+        for v in folded:
+            print(f"{'[FOLD]    '}{v :<45}{' = '}{dag.views[v].algorithm if v in dag.views else '(removed)'}")
+        for v in unweighted:
+            print(f"{'[FOLD]    '}{v :<45}{' unweighted'}")
+
+    return {v : c[0] for v, c in values.items() if v in dag.views}
+
+
+
+
+#######################################################################################
+# Removes the views which are neither targets nor used by other views (origin or requirement)
+#
+def remove_unused_views(flow, dag, targets=None):
+
+    removed = []
+
+    while True:
+
+        used = set(flow.targetList if targets is None else targets)
+        for iv in dag.views.values():
+            used.update(iv.origins)
+            used.update(iv.requirements)
+
+        unused = [v for v in dag.views if not v in used]
+
+        if not unused:
+            break
+
+        for v in unused:
+            dag.removeView(v)
+            removed.append(v)
+
+    return removed
+
+
+
+#######################################################################################
+# Fusion of linear chains
+#
+#  A transformation used by exactly one other view (and only once in its algorithm) is inlined in
+#  its consumer, i.e. "(algorithm)" replaces the name - chains (e.g. Muon_m -> Muon_p4 -> Dimuon_p4
+#  -> Dimuon_m) collapse into a single function/column. The consumer inherits the origins and the
+#  requirements of the inlined view. Protected views (targets, requirements, histogram and snapshot inputs) are kept.
+#
+#  Returns the dictionary { inlined view : view where it is computed }
+#
+
+def number_of_columns(flow, dag):
+    return len([v for v, iv in dag.views.items() if iv.has_transformation() and not flow.is_view_output(iv)])
+
+
+def fuse_linear_chains(flow, dag, verbose=True, targets=None):
+
+    protected = protected_views(flow, dag, targets)
+    n_columns = number_of_columns(flow, dag)
+
+    consumers = {v : [] for v in dag.views}
+    for v, iv in dag.views.items():
+        for o in iv.origins:
+            consumers[o].append(v)
+
+    fused = {}
+
+    for v in dag.list_of_ranked_views():
+
+        iv = dag.views[v]
+
+        if (v in protected) or (not iv.is_transformation()) or flow.is_view_output(iv) or (len(consumers[v]) != 1):
+            continue
+
+        c  = consumers[v][0]
+        ic = dag.views[c]
+
+        # Not inlined in lambdas (e.g. Combinations predicates): the lambda is evaluated many times per event
+        if flow.is_view_output(ic) or (_token_re.findall(ic.algorithm).count(v) != 1) or ("CombinationPredicate(" in ic.algorithm):
+            continue
+
+        _origins = []
+        for o in ic.origins:
+            for _o in (iv.origins if o == v else (o,)):
+                if not _o in _origins:
+                    _origins.append(_o)
+
+        _ic              = dag.own_view(c)
+        _ic.algorithm    = rename_in_algorithm(ic.algorithm, {v : "("+iv.algorithm+")"})
+        _ic.origins      = tuple(_origins)
+        _ic.requirements = ic.requirements + tuple(r for r in iv.requirements if not r in ic.requirements)
+
+        for o in iv.origins:
+            consumers[o] = [x for x in consumers[o] if x != v]
+            if not c in consumers[o]:
+                consumers[o].append(c)
+
+        dag.removeView(v)
+        fused[v] = c
+
+    # Chains: the final view where each inlined view is computed
+    for v in fused:
+        while fused[v] in fused:
+            fused[v] = fused[fused[v]]
+
+    if verbose:
+        print(f"{'[FUSE] columns : '}{n_columns}{' -> '}{number_of_columns(flow, dag)}{'   inlined : '}{len(fused)}")
+        for v, c in fused.items():
+            print(f"{'[FUSE]    '}{v :<45}{' -> '}{c}")
+
+    return fused
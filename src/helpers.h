@@ -6,6 +6,14 @@
 #include "Math/Vector4D.h"
 #include <ROOT/RDataFrame.hxx>
 #include <TH1F.h>
+#include <TTree.h>
+#include <TDirectory.h>
+#include <chrono>
+#include <tuple>
+#include <utility>
+#if defined(__x86_64__) || defined(__i386__)
+#include <x86intrin.h>
+#endif
 static int verbosecount = 100;
 
 template <typename type>
@@ -169,6 +177,235 @@ ROOT::VecOps::RVec<ROOT::VecOps::RVec<size_type>> Combinations(size_type size1,
  }
 
 
+// k-combinations (k = sizes.size(), 2..4) of the elements of k collections of the given sizes, with an optional
+// predicate evaluated on the candidate indices - only the candidates passing the predicate are returned
+// Legs with the same group (same collection) take strictly increasing indices: no repetitions, no permutations
+// Result: same layout of ROOT::VecOps::Combinations - r[leg][candidate] = index of the element in the leg's collection
+template <typename Pred>
+void CombinationsIfFill(std::size_t leg,
+			const ROOT::VecOps::RVec<std::size_t> &sizes,
+			const ROOT::VecOps::RVec<int> &groups,
+			ROOT::VecOps::RVec<std::size_t> &idx,
+			ROOT::VecOps::RVec<ROOT::VecOps::RVec<std::size_t>> &r,
+			Pred &pred){
+ if(leg == sizes.size()) {
+   if(pred(idx)) for(std::size_t l=0; l<idx.size(); l++) r[l].push_back(idx[l]);
+   return;
+ }
+ std::size_t first = 0;
+ for(std::size_t l=0; l<leg; l++) if(groups[l] == groups[leg]) first = idx[l]+1;
+ for(idx[leg]=first; idx[leg]<sizes[leg]; idx[leg]++) CombinationsIfFill(leg+1, sizes, groups, idx, r, pred);
+}
+
+template <typename Pred>
+ROOT::VecOps::RVec<ROOT::VecOps::RVec<std::size_t>> CombinationsIf(const ROOT::VecOps::RVec<std::size_t> &sizes,
+								   const ROOT::VecOps::RVec<int> &groups,
+								   Pred pred){
+ ROOT::VecOps::RVec<ROOT::VecOps::RVec<std::size_t>> r(sizes.size());
+ ROOT::VecOps::RVec<std::size_t> idx(sizes.size());
+ CombinationsIfFill(0, sizes, groups, idx, r, pred);
+ return r;
+}
+
+inline ROOT::VecOps::RVec<ROOT::VecOps::RVec<std::size_t>> CombinationsIf(const ROOT::VecOps::RVec<std::size_t> &sizes,
+									  const ROOT::VecOps::RVec<int> &groups){
+ return CombinationsIf(sizes, groups, [](const ROOT::VecOps::RVec<std::size_t> &){ return true; });
+}
+
+// Arguments of CombinationsIf written as calls: the same algorithm is evaluated by the NumPy and Numba backends
+// (see SampleProcessing.Combinations) - the predicate is a lambda on the candidate indices _i
+template <typename... T>
+ROOT::VecOps::RVec<std::size_t> CombinationSizes(T... n){ return ROOT::VecOps::RVec<std::size_t>{std::size_t(n)...}; }
+
+template <typename... T>
+ROOT::VecOps::RVec<int> CombinationGroups(T... g){ return ROOT::VecOps::RVec<int>{int(g)...}; }
+
+#define CombinationPredicate(...) [&](const ROOT::VecOps::RVec<std::size_t> &_i){ return bool(__VA_ARGS__); }
+
+
+// Per-node profiling (instrumented build of the generated code): cycles and calls per node and per slot (thread)
+// - NailClock: time stamp counter where available (steady clock ns otherwise)
+// - each slot updates its own row: no locks in the event loop
+// - CyclesPerSecond: rate of NailClock measured since Init (cycles -> seconds in the report)
+inline unsigned long long NailClock(){
+#if defined(__x86_64__) || defined(__i386__)
+ return __rdtsc();
+#else
+ return std::chrono::duration_cast<std::chrono::nanoseconds>(std::chrono::steady_clock::now().time_since_epoch()).count();
+#endif
+}
+
+struct NodeProfiler {
+  std::vector<std::string>                     nodes;
+  std::vector<std::vector<unsigned long long>> cycles;    // [slot][node]
+  std::vector<std::vector<unsigned long long>> calls;     // [slot][node]
+  unsigned long long                           clock_start = 0;
+  long long                                    time_start  = 0;    // steady clock ns
+
+  void Init(const std::vector<std::string> &node_names, unsigned int n_slots){
+    nodes  = node_names;
+    cycles.assign(n_slots, std::vector<unsigned long long>(nodes.size(), 0));
+    calls.assign( n_slots, std::vector<unsigned long long>(nodes.size(), 0));
+    clock_start = NailClock();
+    time_start  = SteadyNs();
+  }
+
+  inline void Add(unsigned int slot, std::size_t node, unsigned long long t0){
+    cycles[slot][node] += NailClock() - t0;
+    calls[slot][node]++;
+  }
+
+  double CyclesPerSecond() const {
+    double seconds = (SteadyNs() - time_start)*1e-9;
+    return (seconds > 0) ? (NailClock() - clock_start)/seconds : 0;
+  }
+
+  static long long SteadyNs(){
+    return std::chrono::duration_cast<std::chrono::nanoseconds>(std::chrono::steady_clock::now().time_since_epoch()).count();
+  }
+};
+
+
+// Buffered filling of a TH1D: values and weights of the event loop collected and filled with FillN
+// (one bin lookup loop per flush instead of one Fill call per value) - RVec values filled element-wise
+struct FillBuffer {
+  TH1D*               h = nullptr;
+  std::vector<double> x;
+  std::vector<double> w;
+
+  FillBuffer(TH1D* h_, std::size_t reserve = 4096) : h(h_) { x.reserve(reserve); w.reserve(reserve); }
+
+  inline void Add(double v, double wt = 1.0) { x.push_back(v); w.push_back(wt); }
+
+  template <typename T>
+  inline void Add(const ROOT::VecOps::RVec<T> &v, double wt = 1.0) {
+    for(std::size_t i=0; i<v.size(); i++) Add(v[i], wt);
+  }
+
+  template <typename T, typename W>
+  inline void Add(const ROOT::VecOps::RVec<T> &v, const ROOT::VecOps::RVec<W> &wt) {
+    for(std::size_t i=0; i<v.size(); i++) Add(v[i], wt[i]);
+  }
+
+  void Flush() {
+    if(x.empty()) return;
+    h->FillN(x.size(), x.data(), w.data());
+    x.clear();
+    w.clear();
+  }
+};
+
+
+// Fill of any histogram (TH1D, TH2D, TH3D, TProfile, TProfile2D): FillHisto(h, w, x, y, ...) calls h->Fill(x, y, ..., w)
+// RVec-valued variables (and weight) filled element-wise - the per-event values are repeated for each element
+template <typename T> inline double NailAt(const T &x, std::size_t)                            { return x; }
+template <typename T> inline double NailAt(const ROOT::VecOps::RVec<T> &x, std::size_t i)      { return x[i]; }
+template <typename T> inline long   NailSize(const T &)                                        { return -1; }
+template <typename T> inline long   NailSize(const ROOT::VecOps::RVec<T> &x)                   { return x.size(); }
+
+template <typename H, typename W, typename... X>
+inline void FillHisto(H* h, const W &w, const X &... x) {
+  long n = -1;
+  for(long s : {NailSize(w), NailSize(x)...}) if(s >= 0) n = (n < 0) ? s : std::min(n, s);
+  if(n < 0) { h->Fill(NailAt(x, 0)..., NailAt(w, 0)); return; }
+  for(long i=0; i<n; i++) h->Fill(NailAt(x, i)..., NailAt(w, i));
+}
+
+
+// Snapshot (skim) of the plain loop: the columns of the selected events are buffered (one std::vector per column)
+// and written to the TTree in batches of buffer_size events - the tree is filled outside of the region blocks
+// - compression : ROOT settings (100 * algorithm + level, -1 default), auto_flush : cluster size (TTree::SetAutoFlush)
+template <typename... T>
+class SnapshotWriter {
+ public:
+  SnapshotWriter(const std::string &file_name, const std::string &tree_name, const std::vector<std::string> &branches,
+                 int compression = -1, Long64_t auto_flush = -30000000, Int_t basket_size = 32000, std::size_t buffer_size = 10000)
+    : buffer_size_(buffer_size > 0 ? buffer_size : 1) {
+    TDirectory::TContext _context;     // current directory restored (the histograms are not attached to the output file)
+    file_ = (compression < 0) ? TFile::Open(file_name.c_str(), "RECREATE") : TFile::Open(file_name.c_str(), "RECREATE", "", compression);
+    tree_ = new TTree(tree_name.c_str(), tree_name.c_str());
+    tree_->SetAutoFlush(auto_flush);
+    Branches(branches, basket_size, std::index_sequence_for<T...>{});
+  }
+
+  inline void Add(const T &... x) {
+    Push(std::index_sequence_for<T...>{}, x...);
+    if(++n_ >= buffer_size_) Flush();
+  }
+
+  void Flush() {
+    for(std::size_t i=0; i<n_; i++) {
+      Load(i, std::index_sequence_for<T...>{});
+      tree_->Fill();
+    }
+    Clear(std::index_sequence_for<T...>{});
+    n_ = 0;
+  }
+
+  // Last flush, tree written and file closed: returns the number of events written
+  long long Close() {
+    Flush();
+    long long entries = tree_->GetEntries();
+    TDirectory::TContext _context;
+    file_->cd();
+    tree_->Write();
+    file_->Close();
+    delete file_;
+    file_ = nullptr;
+    return entries;
+  }
+
+ private:
+  template <std::size_t... I>
+  void Branches(const std::vector<std::string> &branches, Int_t basket_size, std::index_sequence<I...>) {
+    (tree_->Branch(branches[I].c_str(), &std::get<I>(values_), basket_size), ...);
+  }
+
+  template <std::size_t... I>
+  inline void Push(std::index_sequence<I...>, const T &... x) { (std::get<I>(buffers_).push_back(x), ...); }
+
+  template <std::size_t... I>
+  inline void Load(std::size_t i, std::index_sequence<I...>) { ((std::get<I>(values_) = std::move(std::get<I>(buffers_)[i])), ...); }
+
+  template <std::size_t... I>
+  inline void Clear(std::index_sequence<I...>) { (std::get<I>(buffers_).clear(), ...); }
+
+  TFile*                         file_ = nullptr;
+  TTree*                         tree_ = nullptr;     // owned by file_
+  std::tuple<T...>               values_;             // branch addresses
+  std::tuple<std::vector<T>...>  buffers_;
+  std::size_t                    buffer_size_;
+  std::size_t                    n_ = 0;
+};
+
+
+// Cut-flow counters: events evaluating / passing each selection, plain and weighted, per slot (thread)
+struct CutflowCounters {
+  std::vector<std::string>                     selections;
+  std::vector<std::vector<unsigned long long>> evaluated;         // [slot][selection]
+  std::vector<std::vector<unsigned long long>> passed;
+  std::vector<std::vector<double>>             sumw_evaluated;
+  std::vector<std::vector<double>>             sumw_passed;
+
+  void Init(const std::vector<std::string> &selection_names, unsigned int n_slots){
+    selections = selection_names;
+    evaluated.assign(     n_slots, std::vector<unsigned long long>(selections.size(), 0));
+    passed.assign(        n_slots, std::vector<unsigned long long>(selections.size(), 0));
+    sumw_evaluated.assign(n_slots, std::vector<double>(selections.size(), 0));
+    sumw_passed.assign(   n_slots, std::vector<double>(selections.size(), 0));
+  }
+
+  inline void Count(unsigned int slot, std::size_t selection, bool pass, double w){
+    evaluated[slot][selection]++;
+    sumw_evaluated[slot][selection] += w;
+    if(pass) {
+      passed[slot][selection]++;
+      sumw_passed[slot][selection] += w;
+    }
+  }
+};
+
+
 ROOT::VecOps::RVec<size_t> Range(size_t n){
   ROOT::VecOps::RVec<size_t>  res;
   for(size_t i=0;i<n;i++) res.push_back(i);
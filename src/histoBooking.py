@@ -0,0 +1,130 @@
+#######################################################################################
+#
+# Histogram booking: structured definition of the histograms of a flow
+#
+#  DefineHisto1D/2D/3D and DefineProfile1D/2D (eventFlow.py) register the histogram; at BuildFlow its view
+#  is added to the AG and the definition is stored on the view (InfoView.histo):
+#
+#   histo = { 'kind'      : 'H1D' | 'H2D' | 'H3D' | 'Profile1D' | 'Profile2D',
+#             'variables' : [x], [x, y] or [x, y, z]  (profiles: the last one is the averaged variable)
+#             'weight'    : regionWeight view of the region of the histogram
+#             'axes'      : one axis per binned variable
+#             'title'     : title of the histogram ("" -> variables and region) }
+#
+#   axis  = { 'nBins', 'xMin', 'xMax' }    fixed binning    - defined as [nBins, xMin, xMax]
+#           { 'nBins', 'edges' }           variable binning - defined as variable_bins([e0, e1, ...])
+#
+#  The backends book and fill the histograms from the metadata of the views (no parsing of the algorithm):
+#  all the histograms of a region are filled in the same region block / pass, from the columns computed there.
+#  The algorithm of the view (histo_code) is a canonical text of the definition - used for the id_codes,
+#  the common-subexpression elimination and the printouts only.
+#
+#  The histo dictionary of a view is never modified: renames (variations, CSE, analysis train, translation)
+#  replace it with a new one (rename_histo) - i.e. it can be shared by the copies of the view.
+#
+#######################################################################################
+
+
+# kind : number of variables, number of axes, name prefix, C++ class, RDF booking method, member of the Result (C++ backends)
+HISTO_KINDS = {
+    'H1D'       : {'variables' : 1, 'axes' : 1, 'prefix' : 'HISTO_',     'cpp_class' : 'TH1D',       'rdf_method' : 'Histo1D',   'result' : 'histos'    },
+    'H2D'       : {'variables' : 2, 'axes' : 2, 'prefix' : 'HISTO2D_',   'cpp_class' : 'TH2D',       'rdf_method' : 'Histo2D',   'result' : 'histos2D'  },
+    'H3D'       : {'variables' : 3, 'axes' : 3, 'prefix' : 'HISTO3D_',   'cpp_class' : 'TH3D',       'rdf_method' : 'Histo3D',   'result' : 'histos3D'  },
+    'Profile1D' : {'variables' : 2, 'axes' : 1, 'prefix' : 'PROFILE_',   'cpp_class' : 'TProfile',   'rdf_method' : 'Profile1D', 'result' : 'profiles1D'},
+    'Profile2D' : {'variables' : 3, 'axes' : 2, 'prefix' : 'PROFILE2D_', 'cpp_class' : 'TProfile2D', 'rdf_method' : 'Profile2D', 'result' : 'profiles2D'},
+}
+
+
+
+def variable_bins(edges):
+    return {'edges' : list(edges)}
+
+
+
+def make_axis(binning):
+
+    if isinstance(binning, dict):
+        edges = [float(e) for e in binning['edges']]
+        if (len(edges) < 2) or any(e1 <= e0 for e0, e1 in zip(edges, edges[1:])):
+            raise ValueError("bin edges must be at least two and increasing : "+str(binning['edges']))
+        return {'nBins' : len(edges)-1, 'edges' : edges}
+
+    nBins, xMin, xMax = binning
+    return {'nBins' : nBins, 'xMin' : xMin, 'xMax' : xMax}
+
+
+
+def is_variable_axis(axis):    return 'edges' in axis
+def is_profile(histo):         return histo['kind'].startswith('Profile')
+
+
+def axis_edges(axis):
+    if is_variable_axis(axis):
+        return list(axis['edges'])
+    n = int(axis['nBins'])
+    return [float(axis['xMin']) + i*(float(axis['xMax']) - float(axis['xMin']))/n for i in range(n+1)]
+
+
+
+def make_histo(kind, variables, binnings, title=""):
+
+    if not kind in HISTO_KINDS:
+        raise ValueError("unknown histogram kind : "+kind)
+
+    _k = HISTO_KINDS[kind]
+
+    if (len(variables) != _k['variables']) or (len(binnings) != _k['axes']):
+        raise ValueError(f"{kind} : {_k['variables']} variables and {_k['axes']} binnings expected - got {variables} and {binnings}")
+
+    return {'kind' : kind, 'variables' : list(variables), 'weight' : "", 'axes' : [make_axis(b) for b in binnings], 'title' : title}
+
+
+
+# HISTO_x__sel1, HISTO2D_x_vs_y__sel1, PROFILE_y_vs_x__sel1 (profiles: averaged variable first)
+def histo_name(kind, variables, requirements=[]):
+
+    _variables = variables if not kind.startswith('Profile') else [variables[-1]] + list(variables[:-1])
+
+    return HISTO_KINDS[kind]['prefix'] + "_vs_".join(_variables) + "".join("__"+r for r in requirements)
+
+
+
+# Canonical algorithm of the view - H1D with fixed binning as "H1D::(x, weight, nBins, xMin, xMax)"
+def histo_code(histo):
+
+    axes = []
+    for a in histo['axes']:
+        if is_variable_axis(a):
+            axes.append("{"+", ".join(str(e) for e in a['edges'])+"}")
+        else:
+            axes.append(str(a['nBins'])+", "+str(a['xMin'])+", "+str(a['xMax']))
+
+    return histo['kind']+"::("+", ".join(histo['variables'] + [histo['weight']] + axes)+")"
+
+
+
+def rename_histo(histo, renames):
+
+    _histo              = dict(histo)
+    _histo['variables'] = [renames.get(v, v) for v in histo['variables']]
+    _histo['weight']    = renames.get(histo['weight'], histo['weight'])
+
+    return _histo
+
+
+
+def histo_title(histo, region=""):
+    if histo['title'] != "":
+        return histo['title']
+    return " vs ".join(histo['variables'] if not is_profile(histo) else [histo['variables'][-1]] + histo['variables'][:-1]) + " {"+region+"}"
+
+
+
+# Binning arguments of the C++ constructors (TH1D, TH2D, TH3D, TProfile, TProfile2D and the RDF models):
+# all fixed -> nBins, xMin, xMax per axis, otherwise all the axes as bin edges (no mixed constructor for TH3D)
+def cpp_binning(histo):
+
+    if not any(is_variable_axis(a) for a in histo['axes']):
+        return ", ".join(f"{a['nBins']}, {a['xMin']}, {a['xMax']}" for a in histo['axes'])
+
+    return ", ".join(f"{a['nBins']}, std::vector<double>({{{', '.join(repr(float(e)) for e in axis_edges(a))}}}).data()" for a in histo['axes'])
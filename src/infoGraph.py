@@ -1,8 +1,31 @@
 import json
 import os
-import graphviz
 import hashlib
 import copy
+import sys
+import struct
+import array
+import mmap
+from lazyImport import LazyModule
+
+
+graphviz = LazyModule("graphviz")     # Needed by the dot file generation only
+
+
+###   Binary files   ##########################################################
+#
+# The whole file is read with a single read (or memory-mapped) and passed to the configure function
+
+def load_binary_file(fileName, configure_function, use_mmap = False):
+
+    with open(fileName, "rb") as file:
+        if not use_mmap:
+            return configure_function(file.read())
+
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return configure_function(mm)
+
+
 
 
 ###   InfoView   ##############################################################
@@ -34,18 +57,45 @@ import copy
 #  Input           |    Y/N    |    N    |     -           | (A Constant is - of course - an Input as well) - = Constant OR Input Variable
 # --------------------------------------------------------------------------------------------------------------
 #
+#
+#  Compact layout: the same view names are repeated in the origins/requirements of many views, so
+#           - the view is a __slots__ object (no per-object __dict__)
+#           - view names (view, origins, requirements) are interned (one string object per name)
+#           - origins and requirements are tuples (immutable: use the add_* methods to extend them)
+#           - the fetching_info dictionary is created only when it is accessed
+#           - histo: definition of the histogram of the histogram views (None for the others - see histoBooking.py)
+#           - snapshot: definition of the output of the snapshot views (None for the others - see snapshotOutput.py)
+#           - n_graphs: number of graphs holding the view object (copy-on-write - see InfoGraph.own_view)
+#
 ###############################################################################
 
 class InfoView:
+
+    __slots__ = ('view', 'algorithm', 'origins', 'requirements', 'id_code', 'status', '_fetching_info', 'histo', 'snapshot', 'n_graphs')
+
     def __init__(self, infoName = "NONE"):
 
-        self.view              = infoName
+        self.view              = sys.intern(infoName)
         self.algorithm         = 'NONE'
-        self.origins           = []
-        self.requirements      = []
+        self.origins           = ()
+        self.requirements      = ()
         self.id_code           = 0
         self.status            = 'undefined'
-        self.fetching_info     = {}
+        self._fetching_info    = None
+        self.histo             = None
+        self.snapshot          = None
+        self.n_graphs          = 0
+
+
+    @property
+    def fetching_info(self):
+        if self._fetching_info is None:
+            self._fetching_info = {}
+        return self._fetching_info
+
+    @fetching_info.setter
+    def fetching_info(self, _fetching_info):
+        self._fetching_info = _fetching_info
 
 
 
@@ -67,11 +117,15 @@ class InfoView:
         info_dictionary                  = {}
         info_dictionary["view"]          = copy.deepcopy( self.view          )
         info_dictionary["algorithm"]     = copy.deepcopy( self.algorithm     )
-        info_dictionary["origins"]       = copy.deepcopy( self.origins       )
-        info_dictionary["requirements"]  = copy.deepcopy( self.requirements  )
+        info_dictionary["origins"]       = list(          self.origins       )
+        info_dictionary["requirements"]  = list(          self.requirements  )
         info_dictionary["status"]        = copy.deepcopy( self.status        )
         info_dictionary["id_code"]       = copy.deepcopy( self.id_code       )
         info_dictionary["fetching_info"] = copy.deepcopy( self.fetching_info )
+        if self.histo is not None:
+            info_dictionary["histo"]     = copy.deepcopy( self.histo         )
+        if self.snapshot is not None:
+            info_dictionary["snapshot"]  = copy.deepcopy( self.snapshot      )
 
         return info_dictionary
 
@@ -82,13 +136,15 @@ class InfoView:
             print("[ InfoView ]  ERROR: info_dictionary is empty!!! ")
             return
 
-        self.view          = copy.deepcopy( info_dictionary["view"]          )
+        self.view          = sys.intern(    info_dictionary["view"]          )
         self.algorithm     = copy.deepcopy( info_dictionary["algorithm"]     )
-        self.origins       = copy.deepcopy( info_dictionary["origins"]       )
-        self.requirements  = copy.deepcopy( info_dictionary["requirements"]  )
+        self.origins       = tuple(sys.intern(o) for o in info_dictionary["origins"]      )
+        self.requirements  = tuple(sys.intern(r) for r in info_dictionary["requirements"] )
         self.status        = copy.deepcopy( info_dictionary["status"]        )
         self.id_code       = copy.deepcopy( info_dictionary["id_code"]       )
         self.fetching_info = copy.deepcopy( info_dictionary["fetching_info"] )
+        self.histo         = copy.deepcopy( info_dictionary.get("histo")     )
+        self.snapshot      = copy.deepcopy( info_dictionary.get("snapshot")  )
 
         return
             
@@ -123,11 +179,11 @@ class InfoView:
     ################################################
     # Building tools
 
-    def add_origin( self, iv):                         self.origins.append(iv.view)
-    def add_origins(self, _origins_list):              self.origins.extend(_origins_list)
+    def add_origin( self, iv):                         self.origins      += (iv.view,)
+    def add_origins(self, _origins_list):              self.origins      += tuple(sys.intern(o) for o in _origins_list)
 
-    def add_requirement( self, iv):                    self.requirements.append(iv.view)
-    def add_requirements(self, _requirements_list):    self.requirements.extend(_requirements_list)
+    def add_requirement( self, iv):                    self.requirements += (iv.view,)
+    def add_requirements(self, _requirements_list):    self.requirements += tuple(sys.intern(r) for r in _requirements_list)
 
 
     def set_algorithm(self, _algoName):                self.algorithm = _algoName
@@ -147,9 +203,12 @@ class InfoView:
     def has_origin(self):           return ( len(self.origins)      > 0       )
     def has_requirement(self):      return ( len(self.requirements) > 0       )
     def has_transformation(self):   return ( self.algorithm         != "NONE" )
-    def has_id_code(self):          return ( self.id_code           != 0      )
+    def has_id_code(self):          return ( self.id_code not in (0, "")      )     # addNode() default is ""
 
-    def has_fetching_info(self):    return ( len(self.fetching_info) > 0 )
+    def has_fetching_info(self):    return ( (self._fetching_info is not None) and (len(self._fetching_info) > 0) )
+    def is_histo(self):             return ( self.histo is not None )
+    def is_snapshot(self):          return ( self.snapshot is not None )
+    def is_output(self):            return ( self.is_histo() or self.is_snapshot() )     # filled/written by the backends, not computed
 
     def is_transformation(self):    return (      self.has_transformation()  and      self.has_origin()  )
     def is_aggregation(self):       return ( (not self.has_transformation()) and      self.has_origin()  )
@@ -179,6 +238,23 @@ class InfoView:
 
 
 
+    ################################################
+    # Copy (used by the copy-on-write sub-graph extraction)
+    #
+    # Strings and tuples are immutable: only the fetching_info needs to be duplicated (no deep copy needed - the
+    # histo and snapshot dictionaries are never modified, they are replaced)
+
+    def shallow_copy(self, reset_origins=False, reset_requirements=False):
+        nv               = copy.copy(self)
+        nv.n_graphs      = 0
+        if reset_origins:         nv.origins      = ()
+        if reset_requirements:    nv.requirements = ()
+        if self._fetching_info is not None:
+            nv._fetching_info = dict(self._fetching_info)
+        return nv
+
+
+
 
 
 
@@ -199,13 +275,32 @@ class InfoView:
 #   (The present setup prevent the possibility of definition of loops - not meaningfull
 #    for this problem (i.e. loops might be contained inside the algorithm parts))
 #
+# - Sub-graph extraction is copy-on-write: the views of a sub-graph are the SAME objects of
+#   the graph they have been extracted from (each view counts the graphs holding it - n_graphs).
+#   A view is copied only when it has to be modified:
+#    - at extraction, when its origins/requirements are cleared (view used as input)
+#    - afterwards, through own_view() (called by the graph methods changing the views' status/id_code)
+#   The sharing is seen from both sides: own_view() copies a view held by another graph, the
+#   parent graph included (the sub-graph keeps the original object).
+#   Views must NOT be modified directly (i.e. graph.views[name].set_...()) once a sub-graph has been
+#   extracted: use graph.own_view(name) to get a modifiable (private) copy first.
+#   A graph dropped without removing its views still counts: the other graphs copy once more (safe).
+#
+# - Integer node-id mode (optional - node_ids=True or enable_node_ids()): each view added to the graph
+#   gets a dense integer id (order of insertion, never reused), so that graph algorithms can work on
+#   integers/arrays instead of view names. Node ids belong to the graph (NOT to the views, which might be shared)
+#
 
 class InfoGraph:
-    def __init__(self, graph_name = "NONE"):
+    def __init__(self, graph_name = "NONE", node_ids = False):
 
         self.name          = graph_name
         self.comment       = ""
-        self.views         = {}           # Dictionary of the views
+        self.views         = {}           # Dictionary of the views (shared copy-on-write with the sub-graphs - see own_view)
+
+        self.use_node_ids  = node_ids     # Integer node-id mode
+        self.node_names    = []           # node id   -> view name (None for removed views)
+        self.node_index    = {}           # view name -> node id
 
         self.fetching_info = {}
 
@@ -219,7 +314,7 @@ class InfoGraph:
 
     def set_comment(self, comment_text):     self.comment = comment_text
 
-    def activate(self, view_name):           self.views[view_name].set_active()
+    def activate(self, view_name):           self.own_view(view_name).set_active()
 
 
 
@@ -260,7 +355,9 @@ class InfoGraph:
 
         self.fetching_info     = copy.deepcopy(info_dictionary['fetching_info'])
 
-        self.views.clear()
+        self.clear_views()
+        self.node_names.clear()
+        self.node_index.clear()
         for vd in info_dictionary['views'].values():
             self.add_view_from_info(vd)
 
@@ -300,6 +397,168 @@ class InfoGraph:
 
 
 
+    ################################################
+    # Binary format
+    #
+    # Compact alternative to the json format (no info_dictionary / deepcopy round trip):
+    #
+    #   magic              8 bytes       BINARY_MAGIC
+    #   header             7 x uint32    see BINARY_HEADER
+    #   string table       utf-8         all the strings, '\0' separated - stored once
+    #   views              5 x uint32    per view: view, algorithm, status, id_code, padding (string table indices)
+    #   origins            uint32        offsets (n_views+1) + string table indices
+    #   requirements       uint32        offsets (n_views+1) + string table indices
+    #   fetching_info      uint32        offsets (n_views+1) + (key, value) string table indices
+    #   extra info         utf-8         json - graph name, comment, fetching_info, histos ({ view : histo }) and snapshots ({ view : snapshot }) + any extra info of the caller
+    #
+    # All the sections are 4-byte aligned, little-endian. id_code = 0 (not evaluated) is stored as BINARY_NO_ID.
+    # The buffer can be a memory-mapped file: the integer tables are read in place (memoryview.cast)
+
+    BINARY_MAGIC  = b"NAILFLW1"
+    BINARY_HEADER = struct.Struct("<7I")     # strings size, n_views, n_origins, n_requirements, n_fetching_info, extra info size, version
+    BINARY_NO_ID  = 0xFFFFFFFF
+
+
+    def get_binary(self, extra_info={}):
+
+        strings      = {}
+        def _s(string):    return strings.setdefault(string, len(strings))
+
+        view_table        = array.array('I')
+        origins_table     = [array.array('I', [0]), array.array('I')]
+        requirements_table= [array.array('I', [0]), array.array('I')]
+        fetching_table    = [array.array('I', [0]), array.array('I')]
+
+        for iv in self.views.values():
+
+            _id_code = self.BINARY_NO_ID if iv.id_code == 0 else _s(iv.id_code)
+            view_table.extend((_s(iv.view), _s(iv.algorithm), _s(iv.status), _id_code, 0))
+
+            origins_table[1].extend([_s(o) for o in iv.origins])
+            origins_table[0].append(len(origins_table[1]))
+
+            requirements_table[1].extend([_s(r) for r in iv.requirements])
+            requirements_table[0].append(len(requirements_table[1]))
+
+            if iv.has_fetching_info():
+                for k, fv in iv.fetching_info.items():    fetching_table[1].extend((_s(k), _s(fv)))
+            fetching_table[0].append(len(fetching_table[1])//2)
+
+        _extra_info                  = dict(extra_info)
+        _extra_info['name']          = self.name
+        _extra_info['comment']       = self.comment
+        _extra_info['fetching_info'] = self.fetching_info
+        _extra_info['histos']        = {iv.view : iv.histo for iv in self.views.values() if iv.histo is not None}
+        _extra_info['snapshots']     = {iv.view : iv.snapshot for iv in self.views.values() if iv.snapshot is not None}
+
+        string_blob = '\0'.join(strings).encode()
+        extra_blob  = json.dumps(_extra_info).encode()
+
+        tables = [view_table] + origins_table + requirements_table + fetching_table
+        if sys.byteorder != 'little':
+            for t in tables:    t.byteswap()
+
+        header = self.BINARY_HEADER.pack(len(string_blob), len(self.views), len(origins_table[1]), len(requirements_table[1]),
+                                         len(fetching_table[1])//2, len(extra_blob), 1)
+
+        _pad = lambda b: b'\0' * (-len(b) % 4)
+        return b''.join([self.BINARY_MAGIC, header, string_blob, _pad(string_blob)] + [t.tobytes() for t in tables] + [extra_blob])
+
+
+
+    # Returns the extra info stored with the graph
+    def configure_from_binary(self, buffer):
+
+        mv = memoryview(buffer)
+
+        if bytes(mv[0:len(self.BINARY_MAGIC)]) != self.BINARY_MAGIC:
+            print("[ InfoGraph ]  ERROR: wrong binary format (magic number not found)!!! ")
+            return {}
+
+        pos = len(self.BINARY_MAGIC)
+        s_size, n_views, n_origins, n_requirements, n_fetching, e_size, version = self.BINARY_HEADER.unpack_from(mv, pos)
+        pos += self.BINARY_HEADER.size
+
+        strings = str(mv[pos:pos+s_size], 'utf-8').split('\0')
+        pos    += s_size + (-s_size % 4)
+
+        def _table(n_items):
+            nonlocal pos
+            _t = mv[pos:pos+4*n_items].cast('I')
+            t  = array.array('I', _t)
+            _t.release()
+            if sys.byteorder != 'little':
+                t.byteswap()
+            pos += 4*n_items
+            return t.tolist()
+
+        view_table           = _table(5*n_views)
+        origins_offsets      = _table(n_views+1)
+        origins              = _table(n_origins)
+        requirements_offsets = _table(n_views+1)
+        requirements         = _table(n_requirements)
+        fetching_offsets     = _table(n_views+1)
+        fetching             = _table(2*n_fetching)
+
+        extra_info = json.loads(str(mv[pos:pos+e_size], 'utf-8'))
+
+        self.name          = extra_info.pop('name')
+        self.comment       = extra_info.pop('comment')
+        self.fetching_info = extra_info.pop('fetching_info')
+        histos             = extra_info.pop('histos', {})
+        snapshots          = extra_info.pop('snapshots', {})
+
+        self.clear_views()
+        self.node_names.clear()
+        self.node_index.clear()
+
+        for i in range(n_views):
+
+            _v, _a, _s, _id, _ = view_table[5*i:5*i+5]
+
+            iv              = InfoView(strings[_v])
+            iv.algorithm    = strings[_a]
+            iv.status       = strings[_s]
+            iv.id_code      = 0 if _id == self.BINARY_NO_ID else strings[_id]
+            iv.origins      = tuple(sys.intern(strings[o]) for o in origins[origins_offsets[i]:origins_offsets[i+1]])
+            iv.requirements = tuple(sys.intern(strings[r]) for r in requirements[requirements_offsets[i]:requirements_offsets[i+1]])
+
+            if fetching_offsets[i+1] > fetching_offsets[i]:
+                _f = fetching[2*fetching_offsets[i]:2*fetching_offsets[i+1]]
+                iv.fetching_info = {strings[_f[j]] : strings[_f[j+1]] for j in range(0, len(_f), 2)}
+
+            iv.histo    = histos.get(iv.view)
+            iv.snapshot = snapshots.get(iv.view)
+
+            self.addView(iv)
+
+        mv.release()
+
+        return extra_info
+
+
+
+    def saveGraphBinary(self, fileName = "graph.ngraph"):
+
+        with open(fileName, "wb") as file:
+            file.write(self.get_binary())
+        return
+
+
+
+    def loadGraphFromBinaryFile(self, fileName, use_mmap = False):
+
+        print("Loading graph from binary file  ", fileName)
+
+        load_binary_file(fileName, self.configure_from_binary, use_mmap)
+
+        print("[ InfoGraph ]  Graph  ", self.name, "  loaded from binary file  ", fileName)
+
+        return
+
+
+
+
     ################################################
     ### Graph building
 
@@ -308,15 +567,18 @@ class InfoGraph:
             print("[infoGraph] WARNING - view ", _view_obj.view, " already present in ", self.name)
         else:
             self.views[_view_obj.view] = _view_obj
+            _view_obj.n_graphs += 1
+            self.register_node_id(_view_obj.view)
         return
 
 
 
-    # Used only in sub-graph extraction
+    # Not used in sub-graph extraction anymore (see add_view_shared) - kept for full, independent copies
     def add_view_deep_copy(self, _view_obj, reset_origins=False, reset_requirements=False):
         nv = copy.deepcopy(_view_obj)
-        if reset_origins:         nv.origins.clear()
-        if reset_requirements:    nv.requirements.clear()
+        nv.n_graphs = 0
+        if reset_origins:         nv.origins      = ()
+        if reset_requirements:    nv.requirements = ()
         self.addView(nv)
         return
 
@@ -326,6 +588,80 @@ class InfoGraph:
 
 
 
+    # Used in sub-graph extraction (copy-on-write): the view object is shared with the source graph,
+    # unless origins/requirements have to be cleared (a private shallow copy is added in this case)
+    def add_view_shared(self, _view_obj, reset_origins=False, reset_requirements=False):
+        if _view_obj.view in self.views:
+            print("[infoGraph] WARNING - view ", _view_obj.view, " already present in ", self.name)
+            return
+
+        if reset_origins or reset_requirements:
+            self.views[_view_obj.view] = _view_obj.shallow_copy(reset_origins, reset_requirements)
+        else:
+            self.views[_view_obj.view] = _view_obj
+
+        self.views[_view_obj.view].n_graphs += 1
+        self.register_node_id(_view_obj.view)
+        return
+
+
+    def addViewShared(self, _view_obj):              self.add_view_shared(_view_obj, reset_origins=False, reset_requirements=False)
+    def addViewSharedAsInput(self, _view_obj):       self.add_view_shared(_view_obj, reset_origins=True,  reset_requirements=True)
+
+
+
+    # Returns a view of this graph which can be safely modified (copied first if held by another graph - the
+    # graph it has been extracted from or a sub-graph extracted from this one)
+    def own_view(self, view_name):
+        iv = self.views[view_name]
+        if iv.n_graphs > 1:
+            iv.n_graphs -= 1
+            iv           = iv.shallow_copy()
+            iv.n_graphs  = 1
+            self.views[view_name] = iv
+        return iv
+
+
+    def clear_views(self):
+        for iv in self.views.values():
+            iv.n_graphs -= 1
+        self.views.clear()
+        return
+
+
+    def removeView(self, view_name):
+        self.views.pop(view_name).n_graphs -= 1
+
+        if view_name in self.node_index:
+            self.node_names[self.node_index.pop(view_name)] = None
+        return
+
+
+
+    ################################################
+    # Integer node-id mode
+
+    def enable_node_ids(self):
+        self.use_node_ids = True
+        for v in self.views:
+            self.register_node_id(v)
+        return
+
+
+    def register_node_id(self, view_name):
+        if self.use_node_ids and (not view_name in self.node_index):
+            self.node_index[view_name] = len(self.node_names)
+            self.node_names.append(view_name)
+        return
+
+
+    def get_node_id(self, view_name):        return self.node_index[view_name]
+    def get_node_name(self, node_id):        return self.node_names[node_id]
+
+    def get_source_ids(self, view_name):     return tuple(self.node_index[s] for s in self.views[view_name].get_sources())
+
+
+
     # Build the view and add it to the graph
     #
     # TBC : how fetching info are handled?????
@@ -501,6 +837,8 @@ class InfoGraph:
 
     def evaluate_id_code(self, iv):
         print('-- evaluate_id_code-- ', iv.view)
+
+        iv = self.views[iv.view]     # Current object for the view (it might have been copied by own_view)
         
         if iv.has_id_code():
             print('-- evaluate_id_code-- has_code')
@@ -531,15 +869,16 @@ class InfoGraph:
                     self.evaluate_id_code(self.views[rv])
                     digest_tool.update(str(self.views[rv].id_code).encode())
 
-            iv.set_id_code(digest_tool.hexdigest())
+            self.own_view(iv.view).set_id_code(digest_tool.hexdigest())
 
         return
 
 
 
     def evaluate_all_id_codes(self):
-        for iv in self.views.values():
-            self.evaluate_id_code(iv)
+        for v in list(self.views):
+            self.evaluate_id_code(self.views[v])
+            iv = self.views[v]
             print(iv.view, '  has id_code  ', iv.has_id_code(), '  -  ', iv.id_code)
 
 
@@ -553,10 +892,10 @@ class InfoGraph:
             v_id = self.views[ve].id_code
             if check_db.has_id(v_id):
                 print("available")
-                self.views[ve].set_available()
+                self.own_view(ve).set_available()
             else:
                 print("********* NOT available")
-                self.views[ve].set_active()
+                self.own_view(ve).set_active()
 
 
 
@@ -576,22 +915,22 @@ class InfoGraph:
             if not self.isNodeDefined(iv_name):   # Avoid attempting to add multiple times the same view
 
                 if (active_only and source_views[iv_name].is_available()):
-                    self.addViewDeepCopyAsInput(source_views[iv_name])
+                    self.addViewSharedAsInput(source_views[iv_name])
                 else:
-                    self.addViewDeepCopy(source_views[iv_name])
+                    self.addViewShared(source_views[iv_name])
                     self.add_backward_subgraph(iv_name, source_views, active_only)
         return
 
 
     # This method supports the extraction of a sub-graph to multiple endpoints - the target's names must be passed as a list (also in case of a single target) 
     def subGraphTo(self, view_names = [], subGraph_name = "UPSTREAM", active_only = False):
-        g1 = InfoGraph(subGraph_name)
+        g1 = InfoGraph(subGraph_name, node_ids=self.use_node_ids)
 
         for view_name in view_names:
             if view_name in self.views:
 
                 if not g1.isNodeDefined(view_name):
-                    g1.addViewDeepCopy(self.views[view_name])
+                    g1.addViewShared(self.views[view_name])
 
                 g1.add_backward_subgraph(view_name, self.views, active_only)
 
@@ -604,23 +943,23 @@ class InfoGraph:
         for iv in source_views.values():
             if (starting_view in iv.get_sources()):
                 if (iv.view in self.views):
-                    del self.views[iv.view]
-                self.addViewDeepCopy(iv)
+                    self.removeView(iv.view)
+                self.addViewShared(iv)
                 
                 for x in [ov for ov in iv.get_sources() if ((ov != starting_view) and not (ov in self.views))]:
-                    self.addViewDeepCopyAsInput(source_views[x])
+                    self.addViewSharedAsInput(source_views[x])
 
                 self.add_forward_subgraph(iv.view, source_views)
 
 
     # This method supports the extraction of a sub-graph from multiple start-points - the sources' names must be passed as a list (also in case of a single target) 
     def subGraphFrom(self, view_names = [], _graph_name = "DOWNSTREAM"):
-        g1 = InfoGraph(_graph_name)
+        g1 = InfoGraph(_graph_name, node_ids=self.use_node_ids)
 
         for view_name in view_names:
             if view_name in self.views:
                 if not (view_name in g1.views):
-                    g1.addViewDeepCopyAsInput(self.views[view_name])
+                    g1.addViewSharedAsInput(self.views[view_name])
                 g1.add_forward_subgraph(view_name, self.views)
 
         return g1
@@ -631,10 +970,9 @@ class InfoGraph:
     # Activation propagation
 
     def propagate_activation_forward(self, starting_view):
-        for iv in self.views.values():
-            if starting_view in iv.get_sources():
-                iv.set_active()
-                self.propagate_activation_forward(iv.view)
+        for v in [iv.view for iv in self.views.values() if starting_view in iv.get_sources()]:
+            self.own_view(v).set_active()
+            self.propagate_activation_forward(v)
         return
 
 
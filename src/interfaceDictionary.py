@@ -125,7 +125,7 @@ class interfaceDictionary:
     # info_dictionary 
 
     ###
-    def get_info_dictionary(self):
+    def get_info_dictionary(self, verbose = True):
 
         info_dictionary                     = {}
 
@@ -152,7 +152,8 @@ class interfaceDictionary:
         info_dictionary["DB"]               = self.DB
 
         print(f"{'[ interfaceDictionary ] info_dictionary updated'}")
-        print(info_dictionary, "\n")
+        if verbose:
+            print(info_dictionary, "\n")
 
         return info_dictionary
             
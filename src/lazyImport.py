@@ -0,0 +1,39 @@
+import importlib
+
+
+#######################################################################################
+#
+# LazyModule: placeholder for a module imported at its first use (i.e. first attribute access)
+#
+#   ROOT = LazyModule("ROOT")        # nothing imported here
+#   ROOT.gInterpreter.Declare(...)   # ROOT (and Cling) loaded here - once
+#
+# Used for the heavy (and optional) dependencies, so that the flow-building and graph tools
+# (eventFlow, infoGraph, interfaceDictionary) can be imported without paying their start-up cost
+#
+#######################################################################################
+
+
+class LazyModule:
+
+    def __init__(self, module_name):
+        self._module_name = module_name
+        self._module      = None
+
+
+    def __getattr__(self, attribute_name):
+        return getattr(self.load(), attribute_name)
+
+
+    def __repr__(self):
+        status = "loaded" if self._module is not None else "not loaded"
+        return f"<LazyModule {self._module_name} ({status})>"
+
+
+    def load(self):
+        if self._module is None:
+            self._module = importlib.import_module(self._module_name)
+        return self._module
+
+
+    def is_loaded(self):    return (self._module is not None)
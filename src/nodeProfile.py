@@ -0,0 +1,112 @@
+#######################################################################################
+#
+# Per-node profiling report - instrumented builds of the C++ processors (profile=True)
+#
+#  The generated code wraps each func__<view> call (event loop of processorLoop, DefineSlot
+#  functions of processorRDF) with NailClock() cycle counters and call counts, one row per
+#  slot (thread) - see NodeProfiler in helpers.h. The profiler is returned with the Result.
+#
+#  report = { view : { 'cycles', 'calls', 'mean_cycles', 'seconds', 'mean_ns', 'slots',
+#                      'origins', 'inclusive_seconds' } }
+#
+#   - seconds:           cycles converted with the clock rate measured by the profiler
+#   - inclusive_seconds: the view plus all the views upstream of it (origins and requirements)
+#                        in the dag - i.e. the cost of the view from the input variables
+#   - hot_path():        from a view, the chain of the most expensive sources up to the inputs
+#
+#######################################################################################
+
+
+def profile_report(profiler, dag=None):
+
+    nodes  = [str(n) for n in profiler.nodes]
+    cycles = [0] * len(nodes)
+    calls  = [0] * len(nodes)
+    slots  = [0] * len(nodes)
+
+    for c_row, n_row in zip(profiler.cycles, profiler.calls):
+        for i in range(len(nodes)):
+            cycles[i] += int(c_row[i])
+            calls[i]  += int(n_row[i])
+            slots[i]  += (int(n_row[i]) > 0)
+
+    rate   = float(profiler.CyclesPerSecond()) or 1.0
+    report = {}
+
+    for i, n in enumerate(nodes):
+        report[n] = {'cycles'      : cycles[i],
+                     'calls'       : calls[i],
+                     'mean_cycles' : cycles[i]/calls[i] if calls[i] else 0.0,
+                     'seconds'     : cycles[i]/rate,
+                     'mean_ns'     : 1e9*cycles[i]/rate/calls[i] if calls[i] else 0.0,
+                     'slots'       : slots[i]}
+
+    if dag is not None:
+        join_to_dag(report, dag)
+
+    return report
+
+
+
+#######################################################################################
+# Origins and inclusive cost of each view of the report
+#
+def join_to_dag(report, dag):
+
+    upstream = {}
+
+    def sources_of(v):
+        if not v in upstream:
+            upstream[v] = set()
+            for s in dag.views[v].get_sources():
+                upstream[v].add(s)
+                upstream[v].update(sources_of(s))
+        return upstream[v]
+
+    for v, r in report.items():
+        if not v in dag.views:
+            continue
+        r['origins']           = list(dag.views[v].get_sources())
+        r['inclusive_seconds'] = r['seconds'] + sum(report[s]['seconds'] for s in sources_of(v) if s in report)
+
+    return report
+
+
+
+#######################################################################################
+# Hot path: from the view (the most expensive one by default) the most expensive source at each step
+#
+def hot_path(report, view=""):
+
+    if view == "":
+        view = max(report, key=lambda v: report[v].get('inclusive_seconds', report[v]['seconds']))
+
+    path = [view]
+
+    while True:
+        sources = [s for s in report[path[-1]].get('origins', []) if s in report]
+        if not sources:
+            break
+        path.append(max(sources, key=lambda s: report[s].get('inclusive_seconds', report[s]['seconds'])))
+
+    return path
+
+
+
+def print_profile_report(report, n_top=20):
+
+    total = sum(r['seconds'] for r in report.values())
+
+    print("\n ================================== PROFILE == \n")
+    print(f"{' view' :<46}{'calls' :>12}{'total [s]' :>12}{'mean [ns]' :>12}{'incl. [s]' :>12}{'   %' :>7}{'slots' :>7}")
+
+    for v in sorted(report, key=lambda v: -report[v]['seconds'])[:n_top]:
+        r = report[v]
+        print(f"{' '+v :<46}{r['calls'] :>12}{r['seconds'] :>12.6f}{r['mean_ns'] :>12.1f}{r.get('inclusive_seconds', 0.0) :>12.6f}{100*r['seconds']/total if total > 0 else 0.0 :>7.1f}{r['slots'] :>7}")
+
+    if report:
+        print("\n hot path : ", " <- ".join(hot_path(report)))
+
+    print("\n ============================================ \n")
+
+    return
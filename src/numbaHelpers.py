@@ -0,0 +1,165 @@
+import numpy as np
+from numba import njit
+from numba.core import types
+from numba.extending import overload
+
+
+#######################################################################################
+#
+# Per-event functions of the NumPy expression dialect for the Numba kernels (see processorNumba.py)
+#
+#  - in the event loop a collection of the current event is a 1D array (the slice of the flat values),
+#    a scalar is a scalar - the same as RVecs and plain types in the C++ loop (helpers.h)
+#  - the functions are overloaded on the argument types (e.g. At(collection, mask) vs At(collection, index))
+#
+#######################################################################################
+
+
+def At(v, index, default=0):      pass
+def Size(v):                      pass
+def Fill(h, x, w, nBins, xMin, xMax):   pass
+def _int(x):                      pass
+def _float(x):                    pass
+
+
+@overload(At)
+def _ol_At(v, index, default=0):
+    # Combinations (leg x candidate indices) -> indices of the leg
+    if isinstance(v, types.Array) and v.ndim == 2:
+        def _at_leg(v, index, default=0):
+            return v[index]
+        return _at_leg
+
+    if isinstance(index, types.Array):
+        def _at_mask(v, index, default=0):
+            return v[index]
+        return _at_mask
+
+    _dtype = v.dtype
+
+    def _at_index(v, index, default=0):
+        if index >= 0 and index < len(v):
+            return v[index]
+        return _dtype(default)
+    return _at_index
+
+
+@overload(Size)
+def _ol_Size(v):
+    if isinstance(v, types.Array):
+        return lambda v: len(v)
+    return lambda v: 1
+
+
+@overload(_int)
+def _ol_int(x):
+    if isinstance(x, types.Array):
+        return lambda x: x.astype(np.int64)
+    return lambda x: np.int64(x)
+
+
+@overload(_float)
+def _ol_float(x):
+    if isinstance(x, types.Array):
+        return lambda x: x.astype(np.float64)
+    return lambda x: np.float64(x)
+
+
+@njit
+def _bin(x, nBins, xMin, xMax):
+    b = int(np.floor((x - xMin) * (nBins / (xMax - xMin)))) + 1
+    return min(max(b, 0), nBins+1)
+
+
+# h : (3, nBins+2) - sum of weights, sum of squared weights, entries (bin 0 underflow, bin nBins+1 overflow)
+@overload(Fill)
+def _ol_Fill(h, x, w, nBins, xMin, xMax):
+
+    if isinstance(x, types.Array):
+        def _fill_array(h, x, w, nBins, xMin, xMax):
+            for _x in x:
+                b = _bin(_x, nBins, xMin, xMax)
+                h[0, b] += w
+                h[1, b] += w*w
+                h[2, b] += 1
+        return _fill_array
+
+    def _fill_scalar(h, x, w, nBins, xMin, xMax):
+        b = _bin(x, nBins, xMin, xMax)
+        h[0, b] += w
+        h[1, b] += w*w
+        h[2, b] += 1
+    return _fill_scalar
+
+
+# Take/Nonzero: plain loops (one allocation, no temporaries) - used for all the features of a SubCollection
+@njit
+def Take(v, indices):
+    out = np.empty(len(indices), dtype=v.dtype)
+    for i in range(len(indices)):
+        out[i] = v[indices[i]]
+    return out
+
+@njit
+def Sum(v):                return np.sum(v)
+
+@njit
+def Nonzero(v):
+    n = 0
+    for x in v:
+        if x:
+            n += 1
+    out = np.empty(n, dtype=np.int64)
+    n = 0
+    for i in range(len(v)):
+        if v[i]:
+            out[n] = i
+            n += 1
+    return out
+
+@njit
+def Argsort(v):            return np.argsort(v, kind="mergesort")
+
+@njit
+def Argmax(v):             return np.argmax(v) if len(v) > 0 else -1
+
+@njit
+def Max(v):                return np.max(v) if len(v) > 0 else 0.
+
+@njit
+def Min(v):                return np.min(v) if len(v) > 0 else 0.
+
+@njit
+def Any(v):                return np.any(v)
+
+@njit
+def All(v):                return np.all(v)
+
+@njit
+def Where(condition, x, y):    return np.where(condition, x, y)
+
+@njit
+def _and(a, b):            return np.logical_and(a, b)
+
+@njit
+def _or(a, b):             return np.logical_or(a, b)
+
+@njit
+def _not(a):               return np.logical_not(a)
+
+
+abs   = np.abs
+sqrt  = np.sqrt
+exp   = np.exp
+log   = np.log
+sin   = np.sin
+cos   = np.cos
+tan   = np.tan
+atan2 = np.arctan2
+sinh  = np.sinh
+cosh  = np.cosh
+tanh  = np.tanh
+hypot = np.hypot
+pow   = np.power
+floor = np.floor
+ceil  = np.ceil
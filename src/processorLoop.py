@@ -1,10 +1,18 @@
 from infoGraph import InfoView, InfoGraph
 from interfaceDictionary import interfaceDictionary
 from eventFlow import SampleProcessing
-import ROOT
-from ROOT import TFile
-from ROOT import TFile
+from lazyImport import LazyModule
+from graphOptimizer import eliminate_common_subexpressions, fold_constants, fuse_linear_chains, number_of_columns
+from schemaCache import get_default_schema_cache
+from nodeProfile import profile_report, print_profile_report
+from cutflow import cutflow_targets, cutflow_weight, cutflow_selections, cutflow_table, print_cutflow
+from histoBooking import HISTO_KINDS, cpp_binning
+from snapshotOutput import compression_settings
 import os
+import time
+
+
+ROOT = LazyModule("ROOT")     # ROOT is imported the first time a processor uses it
 
 
 #######################################################################################
@@ -16,7 +24,7 @@ import os
 
 class ProcessorLoop:
 
-    def __init__(self, name, flow, file_name, tree_name):
+    def __init__(self, name, flow, file_name, tree_name, schema_cache=None, cse=True, fold=True, fuse=True, profile=False, cutflow=True, fill_batch=10000, snapshot_batch=10000):
 
         print("[pRDF] __init__ : name = ", name, "  for flow = ", flow.name)
 
@@ -27,6 +35,7 @@ class ProcessorLoop:
         self.dag       = "NOT_SET"
         self.cpp_text  = ""
 
+        self.schema_cache      = schema_cache if schema_cache is not None else get_default_schema_cache()
 
         self.Types             = {}
         self.fileTypes         = {}
@@ -34,6 +43,31 @@ class ProcessorLoop:
         self.listOfRankedViews = []
         self.active_regions    = []
 
+        self.cse               = cse        # common-subexpression elimination on the target graph
+        self.fold              = fold       # constant folding and trivial-weight elimination
+        self.fuse              = fuse       # fusion of linear chains of views
+        self.fused             = {}
+        self.n_columns         = 0
+        self.aliases           = {}
+        self.constant_values   = {}
+
+        self.profile           = profile    # instrumented build: cycles and calls per func__ (see nodeProfile.py)
+        self.profile_nodes     = []
+        self.profile_report    = {}
+
+        self.cutflow           = cutflow    # cut-flow counters in the if tree of the event loop (see cutflow.py)
+        self.cutflow_index     = {}
+        self.cutflow_table     = []
+        self.targets           = []         # targets of the flow + the cut-flow weights (see init_dag)
+
+        self.fill_batch        = fill_batch # H1Ds filled through FillBuffers flushed with FillN every fill_batch events (0: Fill per event)
+        self.histosDictionary  = {}
+        self.buffered          = []         # H1Ds with a FillBuffer
+
+        self.snapshot_batch    = snapshot_batch   # events buffered by the SnapshotWriters before being written to the trees
+        self.snapshotsDictionary = {}
+        self.snapshot_events   = {}
+
         self.cs                = self.generate_code_snippets()
 
 
@@ -60,8 +94,35 @@ class ProcessorLoop:
     #
     def getFileTypes(self):
 
-        _file = ROOT.TFile(self.file_name)
-        _tree = _file.Get(self.tree_name)
+        self.fileTypes = dict(self.schema_cache.get_schema(self.file_name, self.tree_name, "leaves", self.readFileTypes))
+
+        for l in self.fileTypes:
+
+            s_l   = self.flow.ID.target2source(l) 
+
+            vtest = self.flow.has_index(s_l)
+
+            if s_l != l:
+                print(f"{l :<55}{' '}{  self.fileTypes[l] :<40}{'  -  '}{vtest}{'   ----->  '}{s_l}")
+            else:
+                print(f"{l :<55}{' '}{  self.fileTypes[l] :<40}{'  -  '}{vtest}")
+
+        print("@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@\n")
+
+
+        return
+
+
+
+    #######################################################################################
+    # Leaf -> type map read from the file (called only if the schema is not in the cache)
+    #
+    def readFileTypes(self, file_name, tree_name):
+
+        fileTypes = {}
+
+        _file = ROOT.TFile(file_name)
+        _tree = _file.Get(tree_name)
 
         for _leaf in _tree.GetListOfLeaves():
 
@@ -79,35 +140,34 @@ class ProcessorLoop:
                 _type = 'array<'+_leaf_type+'>'
 
 
-            self.fileTypes[_leaf_name] = _type
+            fileTypes[_leaf_name] = _type
 
 
         _file.Close()
 
+        return fileTypes
 
-        for l in self.fileTypes:
-
-            s_l   = self.flow.ID.target2source(l) 
 
-            vtest = self.flow.has_index(s_l)
 
-            if s_l != l:
-                print(f"{l :<55}{' '}{  self.fileTypes[l] :<40}{'  -  '}{vtest}{'   ----->  '}{s_l}")
-            else:
-                print(f"{l :<55}{' '}{  self.fileTypes[l] :<40}{'  -  '}{vtest}")
+    #######################################################################################
+    #
+    def init_dag(self):
 
-        print("@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@\n")
+        # Targets of the processor: the cut-flow weights are not added to the targets of the flow
+        self.targets = cutflow_targets(self.flow) if self.cutflow else list(self.flow.targetList)
 
+        self.dag = self.flow.AG.subGraphTo(self.targets)
 
-        return
+        if self.cse:
+            self.aliases = eliminate_common_subexpressions(self.flow, self.dag, targets=self.targets)
 
+        if self.fold:
+            self.constant_values = fold_constants(self.flow, self.dag, targets=self.targets)
 
+        if self.fuse:
+            self.fused = fuse_linear_chains(self.flow, self.dag, targets=self.targets)
 
-    #######################################################################################
-    #
-    def init_dag(self):
-
-        self.dag = self.flow.GetGraphForTargets()
+        self.n_columns = number_of_columns(self.flow, self.dag)
 
         print(f"{'[pLoop] init_dag : '}{self.dag.name :<30}{'   ( '}{type(self.dag)}{' )'}")
 
@@ -125,7 +185,7 @@ class ProcessorLoop:
         # Update dictionary of variables' type for the input variables (here is the only place where the translation is strictly needed!)
         for v in self.dag.views:
 
-            t_v = self.flow.ID.translate_string(v)
+            t_v = self.flow.translate_string(v)
 
             print("CHECKING : ", v, "  -->  ", t_v)
 
@@ -278,8 +338,14 @@ class ProcessorLoop:
         ###  Input variables definition
         Loop_cpp_txt += self.define_input_variables()
 
-        ###  H1Ds definition
-        Loop_cpp_txt += self.define_H1Ds()
+        ###  Histograms definition
+        Loop_cpp_txt += self.define_histos()
+
+        ###  Snapshot writers (after the histograms: see SnapshotWriter)
+        Loop_cpp_txt += self.define_snapshots()
+
+        ###  Profiler (instrumented build) and cut-flow counters
+        Loop_cpp_txt += self.define_counters()
 
         ###  Begin event loop
         Loop_cpp_txt += self.cs["processorLoop_begin_event_loop"]
@@ -301,11 +367,23 @@ class ProcessorLoop:
         Loop_cpp_txt += self.event_operations()
         Loop_cpp_txt += "\n"
 
+        ###  Flush of the fill buffers every fill_batch events
+        if self.fill_batch > 0:
+            Loop_cpp_txt += "    if (((counter+1) % "+str(self.fill_batch)+") == 0) { for (auto _fb : fill_buffers) _fb->Flush(); }\n"
+
         
 
         ###  Close event loop
         Loop_cpp_txt += self.cs["processorLoop_close_event_loop"]
 
+        ###  Last flush of the fill buffers
+        if self.fill_batch > 0:
+            Loop_cpp_txt += "  for (auto _fb : fill_buffers) _fb->Flush();\n"
+
+        ###  Snapshots written and closed
+        for s in self.snapshotsDictionary:
+            Loop_cpp_txt += '  r.snapshots[std::string("'+s+'")] = sw_'+s+'.Close();\n'
+
         ###  Loop function end
         Loop_cpp_txt += self.cs["processorLoop_end"]
 
@@ -349,7 +427,7 @@ class ProcessorLoop:
 
             _view = self.dag.views[v]
 
-            if self.flow.is_view_H1D(_view):
+            if self.flow.is_view_output(_view):
                 continue
 
 
@@ -541,7 +619,7 @@ class ProcessorLoop:
 
             _v = self.dag.views[v]
 
-            if ((not self.flow.is_view_H1D(_v)) and (not _v.is_constant())):
+            if ((not self.flow.is_view_output(_v)) and (not _v.is_constant())):
 
                 inputTxt += '  '+f"{self.Types[_v.view] :<30}"+' '+_v.view+';\n'
 
@@ -555,47 +633,91 @@ class ProcessorLoop:
 
     #######################################################################################
     #
-    def define_H1Ds(self):
+    def define_histos(self):
 
         h1dsTxt = "\n"
 
-        h1dsDictionary = self.flow.GetH1DsDictionary()
-
-        for h in h1dsDictionary:
+        self.histosDictionary = self.flow.GetHistosDictionary()
 
-            hd = h1dsDictionary[h]
+        for h, hd in self.histosDictionary.items():
 
-            h_name      = h
-            h_var       = hd["var"]
-            h_weight    = hd["weight"]
-            h_nBins     = hd["nBins"]
-            h_xMin      = hd["xMin"]
-            h_xMax      = hd["xMax"]
-            h_region    = hd["histo_region"]
-            v_region    = hd["var_region"]
-            h_selection = hd["histo_selection"]
-            h_title     = hd["title"]
+            _k  = HISTO_KINDS[hd["kind"]]
 
-            #            _h1 = 'r.histos[std::string("'+h_name+'")]'
-            #            h1dsTxt += '  '+f"{_h1 :<65}"+' = TH1D("'+h_name+'", "'+h_title+'", '+h_nBins+', '+h_xMin+', '+h_xMax+');\n'
+            _h1 = 'r.'+_k["result"]+'[std::string("'+h+'")]'
+            _h2 = ' = '+_k["cpp_class"]+'("'+h+'", '
+            _h3 = '"'+hd["title"]+'", '
+            _h4 = cpp_binning(hd)+');'
 
-            _h1 = 'r.histos[std::string("'+h_name+'")]'
-            _h2 = ' = TH1D("'+h_name+'", '
-            _h3 = '"'+h_title+'", '
-            _h4 = f"{h_nBins :>6}{' , '}{h_xMin :>6}{' , '}{h_xMax :>6}{');'}"
-            
             h1dsTxt += f"{'  '}{_h1 :<65}{_h2 :<50}{_h3 :<35}{_h4}"+'\n'
 
         h1dsTxt += '\n\n'
 
-        for h in h1dsDictionary:
-            h1dsTxt += '  TH1D* '+f"{h :<40}"+' = &(r.histos[std::string("'+h+'")]);\n'
+        for h, hd in self.histosDictionary.items():
+            _k = HISTO_KINDS[hd["kind"]]
+            h1dsTxt += '  '+f"{_k['cpp_class']+'*' :<12}"+' '+f"{h :<40}"+' = &(r.'+_k["result"]+'[std::string("'+h+'")]);\n'
+
+        # H1Ds: FillBuffers (the other histograms are filled per event - see event_operations)
+        self.buffered = [h for h, hd in self.histosDictionary.items() if hd["kind"] == 'H1D'] if self.fill_batch > 0 else []
+
+        if self.fill_batch > 0:
+
+            h1dsTxt += '\n'
+
+            for h in self.buffered:
+                h1dsTxt += '  FillBuffer '+f"{'fb_'+h :<40}"+' ('+h+');\n'
+
+            h1dsTxt += '\n  std::vector<FillBuffer*> fill_buffers = {'+', '.join('&fb_'+h for h in self.buffered)+'};\n'
 
 
         return h1dsTxt
 
 
     
+    #######################################################################################
+    # Snapshots: one SnapshotWriter per snapshot - the types of the columns are the types of the views
+    # (output branches: see snapshotOutput.py)
+    #
+    def define_snapshots(self):
+
+        self.snapshotsDictionary = {s : sd for s, sd in self.flow.GetSnapshotsDictionary().items() if s in self.dag.views}
+
+        snapTxt = "\n"
+
+        for s, sd in self.snapshotsDictionary.items():
+
+            _types    = ', '.join(self.Types[c] for c in sd["columns"])
+            _branches = '{"'+'", "'.join(self.flow.translate_string(b) for b in sd["branches"])+'"}'
+            _options  = ', '.join(str(o) for o in (compression_settings(sd), sd["auto_flush"], sd["basket_size"], self.snapshot_batch))
+
+            snapTxt += '  SnapshotWriter<'+_types+'> sw_'+s+'("'+sd["file"]+'", "'+sd["tree"]+'", '+_branches+', '+_options+');\n'
+
+        return snapTxt
+
+
+
+    #######################################################################################
+    # Counters of the Result
+    #  - profiler: the functions called in the event loop (the constants are evaluated once)
+    #  - cut-flow: the selections (requirement nodes) ranked
+    #
+    def define_counters(self):
+
+        self.profile_nodes = [v for v in self.listOfRankedViews if self.dag.views[v].is_transformation() and not self.flow.is_view_output(self.dag.views[v])]
+
+        profTxt = ""
+
+        if self.profile:
+            profTxt += '  r.profile.Init({"'+'", "'.join(self.profile_nodes)+'"}, 1);\n\n'
+
+        if self.cutflow:
+            selections          = cutflow_selections(self.dag)
+            self.cutflow_index  = {s : i for i, s in enumerate(selections)}
+            profTxt += '  r.cutflow.Init({"'+'", "'.join(selections)+'"}, 1);\n\n'
+
+        return profTxt
+
+
+
     #######################################################################################
     #
     def define_input_update(self):
@@ -647,45 +769,92 @@ class ProcessorLoop:
 
         bodyTxt = ""
 
-        h1dsDictionary     = self.flow.GetH1DsDictionary()
         region_nodes       = self.flow.get_region_nodes_dictionary(self.dag)
+        profile_index      = {v : i for i, v in enumerate(self.profile_nodes)}
+
+        # Nodes computed inside the chain of a region (see nested_chain_levels): { region : { level : [nodes] } }
+        levels             = self.nested_chain_levels(region_nodes)
+        nested             = {}
+        for _n in self.listOfRankedViews:
+            if _n in levels:
+                nested.setdefault(levels[_n][0], {}).setdefault(levels[_n][1], []).append(_n)
+
+
+        def _operation(_n, indent):
+
+            _v = self.dag.views[_n]
+
+            if self.flow.is_view_histo(_v):
+
+                # All the histograms of the region filled from the variables computed in the region block
+                h_name   = _v.view
+                h_vars   = self.histosDictionary[h_name]["variables"]
+                h_weight = self.histosDictionary[h_name]["weight"]
+
+                # Weight removed by the constant folding (equal to 1) -> unweighted fill
+                if not h_weight in _v.origins:
+                    h_weight = "1.0"
+
+                if h_name in self.buffered:
+                    return indent+f"{'fb_'+h_name :<50}"+" .Add("+h_vars[0]+", "+h_weight+");\n"
+
+                return indent+"FillHisto("+f"{h_name+',' :<50}"+" "+", ".join([h_weight]+h_vars)+");\n"
+
+            if self.flow.is_view_snapshot(_v):
+
+                # Columns of the selected events buffered (written to the tree every snapshot_batch events)
+                return indent+f"{'sw_'+_v.view :<50}"+" .Add("+", ".join(self.snapshotsDictionary[_v.view]["columns"])+");\n"
+
+            f_parameters = ', '.join(_v.origins)
+
+            if self.profile:
+                _t0      = "{ auto __t0 = NailClock(); "
+                _count   = " r.profile.Add(0, "+str(profile_index[_n])+", __t0); }"
+                return indent+_t0+f"{_n :<50}"+" = func__"+_n+"("+f_parameters+");"+_count+"\n"
+
+            return indent+f"{_n :<50}"+" = func__"+_n+"("+f_parameters+");\n"
 
 
         for _r in region_nodes:
 
             indent = '    '
 
-            sels = self.flow.regions_dictionary[_r]['selections']
+            sels = self.flow.region_selection_chain(_r)
 
-            _condition = " and ".join(sels)
+            # One if per group of selections: the nodes of the next level computed inside it
+            _levels  = nested.get(_r, {})
+            _open    = 0
+            _pending = []
 
-            if sels:
-                bodyTxt += "\n\n"+indent+"if ("+_condition+") {\n"
-                indent += '  '
+            for k, _s in enumerate(sels + [None]):
 
+                if _pending and ((k in _levels) or (_s is None)):
+                    bodyTxt += ("\n\n" if not _open else "")+indent+"if ("+" and ".join(_pending)+") {\n"
+                    indent  += '  '
+                    _open   += 1
+                    _pending = []
 
-            for _n in region_nodes[_r]:
+                    for _n in _levels.get(k, []):
+                        bodyTxt += _operation(_n, indent)
 
-                _v = self.dag.views[_n]
+                _pending.append(_s)
 
-                if not _v.is_transformation():
-                    continue
 
-                if self.flow.is_view_H1D(_v):
+            for _n in region_nodes[_r]:
 
-                    h_name   = _v.view
-                    h_var    = h1dsDictionary[h_name]["var"]
-                    h_weight = h1dsDictionary[h_name]["weight"]
+                if (not self.dag.views[_n].is_transformation()) or (_n in levels):
+                    continue
 
-                    bodyTxt += indent+f"{h_name :<50}"+" -> Fill("+h_var+", "+h_weight+");\n"
+                bodyTxt += _operation(_n, indent)
 
-                else:
-                    f_parameters = ', '.join(_v.origins)
 
-                    bodyTxt += indent+f"{_n :<50}"+" = func__"+_n+"("+f_parameters+");\n"
+            # Cut-flow: selections of the region counted after all its nodes (the weight included)
+            for _n in region_nodes[_r]:
+                if _n in self.cutflow_index:
+                    bodyTxt += indent+"r.cutflow.Count(0, "+str(self.cutflow_index[_n])+", "+_n+", "+cutflow_weight(self.flow, _n)+");\n"
 
 
-            if sels:
+            for i in range(_open):
                 indent   = indent[:-2]
                 bodyTxt += indent+"}\n"
 
@@ -693,6 +862,71 @@ class ProcessorLoop:
 
 
 
+    #######################################################################################
+    # Nested selection chains: a node used only by the regions requiring the first selections of a chain
+    # is computed inside the if of those selections (the later selections of the chain and their upstream
+    # views evaluated only for the events passing the ones before them, in the order of costModel.py)
+    #
+    #  - region of the node: the first region (in the order of the blocks) using it, the other ones using it
+    #    must come after and require the same selections (a selection not computed is false: reset at each event)
+    #  - the node stays in the block of its own region if any of its selections is not among them
+    #  - cut-flow counters: every selection is evaluated for all the events of its region (not nested)
+    #
+    #  returns { node : (region, level) } - level: number of selections of the region chain before the node
+    #
+    def nested_chain_levels(self, region_nodes):
+
+        regions     = list(region_nodes)
+        chains      = {_r : self.flow.region_selection_chain(_r) for _r in regions}
+        node_region = {n : _r for _r in regions for n in region_nodes[_r]}
+
+        consumers   = {v : [] for v in self.dag.views}
+        for v in self.dag.views:
+            for s in self.dag.views[v].get_sources():
+                consumers[s].append(v)
+
+        # Uses (region, level, nested) of the weights by the cut-flow counters
+        counted     = {}
+        for s in self.cutflow_index:
+            counted.setdefault(cutflow_weight(self.flow, s), []).append((node_region[s], len(chains[node_region[s]]), False))
+
+        levels = {}
+
+        for n in reversed(self.listOfRankedViews):
+
+            _v = self.dag.views[n]
+
+            if (not n in node_region) or (not _v.is_transformation()) or self.flow.is_view_output(_v) or (n in self.cutflow_index):
+                continue
+
+            uses = list(counted.get(n, []))
+            uses += [(_r, chains[_r].index(n), False) for _r in regions if n in chains[_r]]
+
+            for c in consumers[n]:
+                if c in levels:
+                    uses.append(levels[c] + (True,))
+                elif (c in node_region) and self.dag.views[c].is_transformation():
+                    uses.append((node_region[c], len(chains[node_region[c]]), False))
+                else:
+                    uses.append((None, 0, False))
+
+            if (not uses) or any(u[0] is None for u in uses):
+                continue
+
+            _r     = min((u[0] for u in uses), key=regions.index)
+            _level = min(u[1] for u in uses if u[0] == _r)
+            _guard = set(chains[_r][:_level])
+
+            if (_r == node_region[n]) or (_level == 0) or (not set(chains[node_region[n]]) <= _guard):
+                continue
+
+            if all((u[0] == _r) or ((not u[2]) and (_guard <= set(chains[u[0]]))) for u in uses):
+                levels[n] = (_r, _level)
+
+        return levels
+
+
+
 
 
     #######################################################################################
@@ -730,7 +964,7 @@ class ProcessorLoop:
     # - .L lib_eventProcessor_Loop.so
     # - gInterpreter->Declare("Result event_processorLoop();")
     # - Result r = event_processorLoop()
-    # - TH1D* h = &(r.histos[std::string("HISTO_LeadMuon_pt__etaLeadMuonNeg")])
+    # - TH1D* h = &(r.histos[std::string("HISTO_LeadMuon_pt__etaLeadMuonNeg")])      (r.histos2D, r.histos3D, r.profiles1D, r.profiles2D - see histoBooking.py)
     # - h->Draw()
 
 
@@ -750,8 +984,12 @@ class ProcessorLoop:
 
 
 
+        _t_1 = time.time()
+
         _result = ROOT.event_processorLoop()
 
+        _t_2 = time.time()
+
         print("-------------- STEP 7 ")
 
         print(" result = ", _result)
@@ -761,9 +999,9 @@ class ProcessorLoop:
 
         cc = ROOT.TCanvas()
 
-        with TFile.Open("f.root", "recreate") as rootFile:
+        with ROOT.TFile.Open("f.root", "recreate") as rootFile:
 
-            for _n,_h in _result.histos:
+            for _n,_h in [_item for _k in HISTO_KINDS.values() for _item in getattr(_result, _k["result"])]:
 
                 print(" name =  ", _n)
 
@@ -775,6 +1013,27 @@ class ProcessorLoop:
                 cc.SaveAs("out-%s.png" % (_n))
 
 
+        print("\n ================================== TIMING == \n")
+        print(" t_run             =  ", (_t_2 - _t_1))
+        print(" histos            =  ", len(self.histosDictionary), "   (H1Ds buffered : ", len(self.buffered), "   fill_batch : ", self.fill_batch, ")")
+        print(" events            =  ", _result.n_events)
+        if (_t_2 - _t_1) > 0:
+            print(" events/s          =  ", _result.n_events/(_t_2 - _t_1))
+        print("\n ============================================ \n")
+
+        if self.profile:
+            self.profile_report = profile_report(_result.profile, self.dag)
+            print_profile_report(self.profile_report)
+
+        for _s in self.snapshotsDictionary:
+            self.snapshot_events[_s] = int(_result.snapshots[_s])
+            print(f"{'[pLoop] snapshot : '}{_s :<40}{self.snapshot_events[_s] :>12}{' events  -> '}{self.snapshotsDictionary[_s]['file']}")
+
+        if self.cutflow:
+            _c = _result.cutflow
+            self.cutflow_table = cutflow_table(self.dag, [str(s) for s in _c.selections], _c.evaluated, _c.passed, _c.sumw_evaluated, _c.sumw_passed)
+            print_cutflow(self.cutflow_table)
+
         return
 
 
@@ -799,6 +1058,10 @@ class ProcessorLoop:
 #include <TTreeReader.h>
 #include <TTreeReaderValue.h>
 #include <TH1D.h>
+#include <TH2D.h>
+#include <TH3D.h>
+#include <TProfile.h>
+#include <TProfile2D.h>
 
 #include <Math/VectorUtil.h>
 #include <ROOT/RVec.hxx>
@@ -817,6 +1080,14 @@ class ProcessorLoop:
 struct Result {
   Result() {}
   std::map<std::string, TH1D> histos;
+  std::map<std::string, TH2D> histos2D;
+  std::map<std::string, TH3D> histos3D;
+  std::map<std::string, TProfile> profiles1D;
+  std::map<std::string, TProfile2D> profiles2D;
+  NodeProfiler profile;                 // filled by the instrumented build only
+  CutflowCounters cutflow;              // events evaluating / passing each selection (see cutflow.py)
+  std::map<std::string, long long> snapshots;   // events written per snapshot (see snapshotOutput.py)
+  long long n_events = 0;
 };
 
 #endif
@@ -870,6 +1141,8 @@ Result event_processorLoop() {
 
         processorLoop_end_text = '''
 
+  r.n_events = counter;
+
   return r;
 }
 
@@ -890,6 +1163,8 @@ Result event_processorLoop() {
 
 #ifdef __CLING__
 
+#pragma link C++ struct NodeProfiler+;
+#pragma link C++ struct CutflowCounters+;
 #pragma link C++ struct Result+;
 
 #endif
@@ -0,0 +1,1036 @@
+from infoGraph import InfoView, InfoGraph
+from interfaceDictionary import interfaceDictionary
+from eventFlow import SampleProcessing
+from lazyImport import LazyModule
+from graphOptimizer import eliminate_common_subexpressions, fold_constants, fuse_linear_chains, number_of_columns
+from columnarStore import ColumnarStore
+from cutflow import cutflow_targets, cutflow_weight, cutflow_selections, cutflow_table, print_cutflow
+from snapshotOutput import store_directory
+import numpy as np
+import ast
+import re
+import time
+
+
+uproot  = LazyModule("uproot")      # Needed only to read ROOT files (input arrays can be passed directly)
+awkward = LazyModule("awkward")
+
+
+#######################################################################################
+#
+# Pure-NumPy columnar backend
+#
+#  - no ROOT, no compiler: each view of the DAG is evaluated as a vectorized NumPy operation
+#    over a batch of events (views in ranked order, region by region - as in the plain loop)
+#  - jagged collections (e.g. Muon_pt) are stored as flat values + offsets (Jagged)
+#  - each region is evaluated on the events passing its selection chain only
+#  - histograms (1D/2D/3D, profiles) are filled with bincount (Histo - same binning conventions of TH1)
+#  - snapshots are written as ColumnarStores (directory <file without extension>, uncompressed: the compression
+#    and cluster settings are used by the ROOT backends only) - the skim is the input_store of the following runs
+#  - inputs: arrays passed directly, a ColumnarStore (memory-mapped, zero-copy) or ROOT files (uproot)
+#
+#  Algorithms must be written in a NumPy-compatible expression dialect (see numpy_expression_tree()):
+#
+#  - arithmetic, comparisons, &&, ||, !, true/false, float literals with "f" suffix (e.g. 0.1056f)
+#  - x.size(), x[i], int(x), float(x)
+#  - functions: At, Take, Sum, Size, Nonzero, Argsort, Argmax, Max, Min, Any, All, Where
+#               and the usual math functions (abs, sqrt, exp, log, sin, cos, tan, atan2, ...)
+#  - CombinationsIf(CombinationSizes(...), CombinationGroups(...)[, CombinationPredicate(...)]) - see Combinations
+#    in eventFlow.py: all the candidates of the batch are built at once and the predicate is evaluated on them
+#
+#  C++-only constructs (templates, namespaces, lambdas, ROOT::VecOps::Combinations, ...) are NOT supported:
+#  the views using them are reported when the processor is configured.
+#
+#######################################################################################
+
+
+
+###########################################################################
+# Jagged array: flat values + offsets (offsets[i]:offsets[i+1] -> elements of event i)
+###########################################################################
+
+class Jagged(np.lib.mixins.NDArrayOperatorsMixin):
+
+    def __init__(self, values, offsets):
+        self.values  = np.asarray(values)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+
+        self._event_index = None
+        self._local_index = None
+        self._positions   = None     # Nonzero results: (offsets, flat positions) of the selected elements - see Take
+
+
+    @classmethod
+    def from_counts(cls, values, counts):
+        offsets = np.zeros(len(counts)+1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+        return cls(values, offsets)
+
+
+    @classmethod
+    def from_lists(cls, lists, dtype=None):
+        counts = [len(l) for l in lists]
+        values = np.concatenate([np.asarray(l, dtype=dtype) for l in lists]) if sum(counts) > 0 else np.zeros(0, dtype=dtype or np.float64)
+        return cls.from_counts(values, counts)
+
+
+    def __repr__(self):
+        return f"Jagged(n_events={self.n_events}, n_values={len(self.values)}, dtype={self.values.dtype})"
+
+
+    def __len__(self):     return self.n_events
+
+
+    @property
+    def n_events(self):    return len(self.offsets) - 1
+
+    @property
+    def counts(self):      return np.diff(self.offsets)
+
+
+    # Event of each element
+    @property
+    def event_index(self):
+        if self._event_index is None:
+            self._event_index = np.repeat(np.arange(self.n_events), self.counts)
+        return self._event_index
+
+
+    # Position of each element inside its event
+    @property
+    def local_index(self):
+        if self._local_index is None:
+            self._local_index = np.arange(len(self.values)) - np.repeat(self.offsets[:-1], self.counts)
+        return self._local_index
+
+
+    def tolist(self):
+        return [self.values[self.offsets[i]:self.offsets[i+1]].tolist() for i in range(self.n_events)]
+
+
+    def same_layout(self, other):
+        return (self.offsets is other.offsets) or np.array_equal(self.offsets, other.offsets)
+
+
+    # Per-event values (one per event) broadcast to the elements
+    def broadcast(self, per_event):
+        return np.repeat(np.asarray(per_event), self.counts)
+
+
+    # Selection of events (pos = indices of the events to keep)
+    def take_events(self, pos):
+        starts      = self.offsets[:-1][pos]
+        counts      = self.counts[pos]
+        new_offsets = np.zeros(len(pos)+1, dtype=np.int64)
+        np.cumsum(counts, out=new_offsets[1:])
+        index       = np.repeat(starts - new_offsets[:-1], counts) + np.arange(new_offsets[-1])
+        return Jagged(self.values[index], new_offsets)
+
+
+    # Element-wise operations (numpy ufunc protocol): per-event arrays are broadcast to the elements
+    def __array_ufunc__(self, ufunc, method, *inputs, **kwargs):
+
+        if method != "__call__" or "out" in kwargs:
+            return NotImplemented
+
+        _inputs = []
+        for x in inputs:
+            if isinstance(x, Jagged):
+                if not self.same_layout(x):
+                    raise ValueError("[Jagged] element-wise operation between collections with different layouts")
+                _inputs.append(x.values)
+            elif isinstance(x, np.ndarray) and x.ndim == 1:
+                _inputs.append(self.broadcast(x))
+            else:
+                _inputs.append(x)
+
+        result = getattr(ufunc, method)(*_inputs, **kwargs)
+
+        if isinstance(result, tuple):
+            return tuple(Jagged(r, self.offsets) for r in result)
+        return Jagged(result, self.offsets)
+
+
+    # x[i] : element i of each event (C++-like access)
+    def __getitem__(self, index):
+        return At(self, index)
+
+
+    def astype(self, dtype):
+        return Jagged(self.values.astype(dtype), self.offsets)
+
+
+
+
+###########################################################################
+# Function library of the NumPy expression dialect
+###########################################################################
+
+def _is_jagged(x):       return isinstance(x, Jagged)
+
+
+def _pick(v, index, default):
+    index  = np.broadcast_to(np.asarray(index, dtype=np.int64), (v.n_events,))
+    valid  = (index >= 0) & (index < v.counts)
+    result = np.full(v.n_events, default, dtype=v.values.dtype)
+    result[valid] = v.values[v.offsets[:-1][valid] + index[valid]]
+    return result
+
+
+def At(v, index, default=0):
+    if _is_jagged(v):
+        # Candidate indices of a combination (predicate of CombinationsIf) -> element of each candidate
+        if isinstance(index, CandidateIndex):
+            return Take(v, index)
+        # Combinations (candidate x leg indices) -> indices of the leg
+        if v.values.ndim == 2:
+            return Jagged(v.values[:, index], v.offsets)
+        # Mask (same layout) -> sub-collection
+        if _is_jagged(index):
+            mask   = index.values.astype(bool)
+            counts = np.bincount(index.event_index[mask], minlength=v.n_events)
+            return Jagged.from_counts(v.values[mask], counts)
+        # Index (one per event, or the same for all events) -> one element per event
+        return _pick(v, index, default)
+
+    return np.asarray(v)[index]
+
+
+def Take(v, indices):
+    if not (_is_jagged(v) and _is_jagged(indices)):
+        raise TypeError("[NumPy backend] Take : collection and indices must be jagged")
+    # Indices from Nonzero on the same layout: one gather with the flat positions (evaluated once for all the features)
+    if indices._positions is not None:
+        offsets, positions = indices._positions
+        if (v.offsets is offsets) or np.array_equal(v.offsets, offsets):
+            return Jagged(v.values[positions], indices.offsets)
+    return Jagged(v.values[v.offsets[:-1][indices.event_index] + indices.values], indices.offsets)
+
+
+def Sum(v):
+    if not _is_jagged(v):
+        return v
+    if v.values.dtype.kind in "biu":
+        return np.bincount(v.event_index, weights=v.values.astype(np.float64), minlength=v.n_events).astype(np.int64)
+    return np.bincount(v.event_index, weights=v.values, minlength=v.n_events)
+
+
+def Size(v):
+    if _is_jagged(v):
+        return v.counts
+    return np.full(len(v), 1, dtype=np.int64)
+
+
+def Nonzero(v):
+    mask    = v.values.astype(bool)
+    indices = Jagged.from_counts(v.local_index[mask], np.bincount(v.event_index[mask], minlength=v.n_events))
+    indices._positions = (v.offsets, np.flatnonzero(mask))
+    return indices
+
+
+def Argsort(v):
+    order = np.lexsort((v.values, v.event_index))
+    return Jagged(v.local_index[order], v.offsets)
+
+
+def Argmax(v):
+    order = np.lexsort((-v.values, v.event_index))
+    return _pick(Jagged(v.local_index[order], v.offsets), 0, -1)
+
+
+def _reduce(v, ufunc, identity):
+    result = np.full(v.n_events, identity, dtype=np.float64)
+    ufunc.at(result, v.event_index, v.values)
+    result[v.counts == 0] = 0
+    return result
+
+
+def Max(v):      return _reduce(v, np.maximum, -np.inf)
+def Min(v):      return _reduce(v, np.minimum,  np.inf)
+def Any(v):      return np.bincount(v.event_index, weights=v.values.astype(bool), minlength=v.n_events) > 0
+def All(v):      return np.bincount(v.event_index, weights=~v.values.astype(bool), minlength=v.n_events) == 0
+
+
+def Where(condition, x, y):
+    if _is_jagged(condition):
+        return Jagged(np.where(condition.values, _values_like(x, condition), _values_like(y, condition)), condition.offsets)
+    return np.where(condition, x, y)
+
+
+###########################################################################
+# Combinations (see CombinationsIf in helpers.h): the candidates are stored as a Jagged with values of shape
+# (candidates, legs) - At(indices, leg) is the Jagged of the indices of the leg (r[leg] of the C++ layout)
+#
+#  - legs with the same group (same collection): strictly increasing indices (no repetitions, no permutations)
+#  - the candidates of each event in the order of the nested loops of the C++ kernel
+#  - predicate: evaluated once on all the candidates, _i[leg] are the indices of the leg (CandidateIndex)
+
+class CandidateIndex(Jagged):
+    pass
+
+
+class _Candidates:
+
+    def __init__(self, candidates):    self.candidates = candidates
+
+    def __getitem__(self, leg):        return CandidateIndex(self.candidates.values[:, leg], self.candidates.offsets)
+
+
+def CombinationSizes(*sizes):      return sizes
+def CombinationGroups(*groups):    return groups
+
+
+def CombinationsIf(sizes, groups, predicate=None):
+
+    sizes    = [np.asarray(s, dtype=np.int64) for s in sizes]
+    n_events = max(len(s) for s in sizes if s.ndim == 1)
+    sizes    = [np.broadcast_to(s, (n_events,)) for s in sizes]
+
+    event = np.arange(n_events)
+    legs  = []
+
+    for leg in range(len(sizes)):
+
+        first = np.zeros(len(event), dtype=np.int64)
+        for l in range(leg):
+            if groups[l] == groups[leg]:
+                first = legs[l] + 1
+
+        counts = np.maximum(sizes[leg][event] - first, 0)
+        parent = np.repeat(np.arange(len(event)), counts)
+        local  = np.arange(len(parent)) - np.repeat(np.cumsum(counts) - counts, counts)
+
+        event = event[parent]
+        legs  = [x[parent] for x in legs] + [first[parent] + local]
+
+    candidates = Jagged.from_counts(np.stack(legs, axis=1), np.bincount(event, minlength=n_events))
+
+    if predicate is None:
+        return candidates
+
+    mask = predicate(_Candidates(candidates))
+    mask = mask.values if _is_jagged(mask) else candidates.broadcast(np.broadcast_to(np.asarray(mask), (n_events,)))
+    mask = np.asarray(mask, dtype=bool)
+
+    return Jagged.from_counts(candidates.values[mask], np.bincount(event[mask], minlength=n_events))
+
+
+
+def _values_like(x, reference):
+    if _is_jagged(x):                                   return x.values
+    if isinstance(x, np.ndarray) and x.ndim == 1:       return reference.broadcast(x)
+    return x
+
+
+def _cast(dtype):
+    def _cast_to(x):
+        if _is_jagged(x):                return x.astype(dtype)
+        if isinstance(x, np.ndarray):    return x.astype(dtype)
+        return dtype(x)
+    return _cast_to
+
+
+def _and(*args):
+    result = args[0]
+    for a in args[1:]:     result = np.logical_and(result, a)
+    return result
+
+
+def _or(*args):
+    result = args[0]
+    for a in args[1:]:     result = np.logical_or(result, a)
+    return result
+
+
+def _not(x):     return np.logical_not(x)
+
+
+
+NUMPY_DIALECT_FUNCTIONS = {
+    "At"      : At,       "Take"    : Take,      "Sum"     : Sum,      "Size"    : Size,
+    "Nonzero" : Nonzero,  "Argsort" : Argsort,   "Argmax"  : Argmax,   "Max"     : Max,
+    "Min"     : Min,      "Any"     : Any,       "All"     : All,      "Where"   : Where,
+    "CombinationsIf"    : CombinationsIf,      "CombinationSizes" : CombinationSizes,   "CombinationGroups" : CombinationGroups,
+    "abs"     : np.absolute,   "sqrt"  : np.sqrt,   "exp"   : np.exp,    "log"   : np.log,
+    "sin"     : np.sin,        "cos"   : np.cos,    "tan"   : np.tan,    "atan2" : np.arctan2,
+    "sinh"    : np.sinh,       "cosh"  : np.cosh,   "tanh"  : np.tanh,   "hypot" : np.hypot,
+    "pow"     : np.power,      "floor" : np.floor,  "ceil"  : np.ceil,
+    "_int"    : _cast(np.int64),    "_float" : _cast(np.float64),
+    "_and"    : _and,      "_or"     : _or,       "_not"    : _not,
+    "True"    : True,      "False"   : False,
+}
+
+
+
+
+###########################################################################
+# Expression dialect: C-like algorithm string -> Python expression
+###########################################################################
+
+class _BoolOpsToCalls(ast.NodeTransformer):
+
+    def visit_BoolOp(self, node):
+        self.generic_visit(node)
+        f    = "_and" if isinstance(node.op, ast.And) else "_or"
+        call = node.values[0]
+        for v in node.values[1:]:      # a && b && c -> _and(_and(a, b), c)
+            call = ast.Call(func=ast.Name(id=f, ctx=ast.Load()), args=[call, v], keywords=[])
+        return call
+
+    def visit_UnaryOp(self, node):
+        self.generic_visit(node)
+        if isinstance(node.op, ast.Not):
+            return ast.Call(func=ast.Name(id="_not", ctx=ast.Load()), args=[node.operand], keywords=[])
+        return node
+
+
+# CombinationPredicate(expr) -> lambda _i, <names>=<names>: expr (the names of the view are bound when the
+# lambda is built: eval() does not pass its locals to the body of a lambda)
+class _PredicatesToLambdas(ast.NodeTransformer):
+
+    def visit_Call(self, node):
+        self.generic_visit(node)
+        if not (isinstance(node.func, ast.Name) and node.func.id == "CombinationPredicate" and len(node.args) == 1):
+            return node
+
+        body      = node.args[0]
+        functions = {n.func.id for n in ast.walk(body) if isinstance(n, ast.Call) and isinstance(n.func, ast.Name)}
+        names     = sorted({n.id for n in ast.walk(body) if isinstance(n, ast.Name) and not n.id in functions} - {"_i"})
+
+        arguments = ast.arguments(posonlyargs=[], args=[ast.arg(arg=a) for a in ["_i"]+names], kwonlyargs=[], kw_defaults=[],
+                                  defaults=[ast.Name(id=a, ctx=ast.Load()) for a in names])
+        return ast.Lambda(args=arguments, body=body)
+
+
+def numpy_expression_tree(algorithm):
+
+    expr = algorithm
+
+    if ("::" in expr) or ("->" in expr) or ("{" in expr):
+        raise SyntaxError("C++-only construct")
+
+    expr = re.sub(r"(?<![\w.])(\d+\.\d*|\.\d+|\d+)[fF]\b", r"\1", expr)     # 0.1056f -> 0.1056
+    expr = re.sub(r"(\w+)\.size\(\)",                   r"Size(\1)", expr)
+    expr = re.sub(r"\bint\(",                           "_int(",     expr)
+    expr = re.sub(r"\bfloat\(",                         "_float(",   expr)
+    expr = re.sub(r"\btrue\b",                          "True",      expr)
+    expr = re.sub(r"\bfalse\b",                         "False",     expr)
+    expr = expr.replace("&&", " and ").replace("||", " or ")
+    expr = re.sub(r"!(?!=)",                            " not ",     expr)
+
+    return ast.fix_missing_locations(_PredicatesToLambdas().visit(_BoolOpsToCalls().visit(ast.parse(expr.strip(), mode="eval"))))
+
+
+# CombinationsIf views: (sizes, groups, predicate) in the dialect (predicate = None if not given), None for the other views
+def combinations_arguments(algorithm):
+
+    try:
+        call = numpy_expression_tree(algorithm).body
+    except SyntaxError:
+        return None
+
+    if not (isinstance(call, ast.Call) and isinstance(call.func, ast.Name) and call.func.id == "CombinationsIf"):
+        return None
+
+    sizes     = [ast.unparse(a) for a in call.args[0].args]
+    groups    = [ast.literal_eval(a) for a in call.args[1].args]
+    predicate = ast.unparse(call.args[2].body) if len(call.args) > 2 else None
+
+    return (sizes, groups, predicate)
+
+
+def numpy_expression(algorithm):          return compile(numpy_expression_tree(algorithm), "<view>", "eval")
+def numpy_expression_source(algorithm):   return ast.unparse(numpy_expression_tree(algorithm))
+
+
+
+
+###########################################################################
+# Histograms (TH1-like conventions on each axis: bin 0 underflow, bin nBins+1 overflow)
+#
+#  - axes: fixed ({'nBins', 'xMin', 'xMax'}) or variable binning ({'nBins', 'edges'}) - see histoBooking.py
+#  - the bins are stored in a flat array, shape (nBins_x+2, nBins_y+2, ...)
+#  - profiles: the last coordinate is averaged in the bins of the others (sum of w*y and w*y^2 stored)
+###########################################################################
+
+class Histo:
+
+    def __init__(self, name, title, axes, kind="H1D"):
+        self.name    = name
+        self.title   = title
+        self.kind    = kind
+        self.axes    = [dict(a) for a in axes]
+        self.shape   = tuple(int(a['nBins'])+2 for a in self.axes)
+        self.sumw    = np.zeros(int(np.prod(self.shape)))
+        self.sumw2   = np.zeros_like(self.sumw)
+        self.entries = 0
+
+        self.profile = kind.startswith('Profile')
+        if self.profile:
+            self.sumwy   = np.zeros_like(self.sumw)
+            self.sumwy2  = np.zeros_like(self.sumw)
+
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.name}, {self.kind}, entries={self.entries}, integral={self.integral()})"
+
+
+    def integral(self):
+        return float(self.sumw.reshape(self.shape)[tuple(slice(1, -1) for _ in self.shape)].sum())
+
+
+    def axis_edges(self, i):
+        a = self.axes[i]
+        if 'edges' in a:    return np.asarray(a['edges'], dtype=np.float64)
+        return np.linspace(float(a['xMin']), float(a['xMax']), int(a['nBins'])+1)
+
+
+    def axis_bins(self, i, x):
+        a = self.axes[i]
+        if 'edges' in a:
+            return np.searchsorted(self.axis_edges(i), x, side='right')
+        nBins = int(a['nBins'])
+        bins  = np.floor((x - float(a['xMin'])) * (nBins / (float(a['xMax']) - float(a['xMin'])))).astype(np.int64) + 1
+        return np.clip(bins, 0, nBins+1, out=bins)
+
+
+    # coords: one array per variable (profiles: the averaged one last)
+    def fill_coords(self, coords, w=1.0):
+        coords = [np.asarray(x, dtype=np.float64) for x in coords]
+        w      = np.broadcast_to(np.asarray(w, dtype=np.float64), coords[0].shape)
+
+        index  = np.zeros(coords[0].shape, dtype=np.int64)
+        for i in range(len(self.axes)):
+            index = index * self.shape[i] + self.axis_bins(i, coords[i])
+
+        n = len(self.sumw)
+        self.sumw    += np.bincount(index, weights=w,   minlength=n)
+        self.sumw2   += np.bincount(index, weights=w*w, minlength=n)
+        self.entries += len(index)
+
+        if self.profile:
+            y = coords[-1]
+            self.sumwy   += np.bincount(index, weights=w*y,   minlength=n)
+            self.sumwy2  += np.bincount(index, weights=w*y*y, minlength=n)
+        return
+
+
+    def fill(self, coords, w=1.0):    return self.fill_coords(coords, w)
+
+
+    def add(self, other):
+        self.sumw    += other.sumw
+        self.sumw2   += other.sumw2
+        self.entries += other.entries
+        if self.profile:
+            self.sumwy   += other.sumwy
+            self.sumwy2  += other.sumwy2
+        return
+
+
+    # Contents with the shape of the bins: sum of weights (histograms), mean of the last variable (profiles)
+    def values(self):
+        if not self.profile:
+            return self.sumw.reshape(self.shape)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(self.sumw != 0, self.sumwy / np.where(self.sumw != 0, self.sumw, 1.0), 0.0).reshape(self.shape)
+
+
+    # Conversion to ROOT (imported here only): TH1D, TH2D, TH3D, TProfile, TProfile2D
+    def to_ROOT(self):
+        ROOT  = LazyModule("ROOT")
+        _cls  = {'H1D' : ROOT.TH1D, 'H2D' : ROOT.TH2D, 'H3D' : ROOT.TH3D, 'Profile1D' : ROOT.TProfile, 'Profile2D' : ROOT.TProfile2D}[self.kind]
+        _args = []
+        for i, a in enumerate(self.axes):
+            if any('edges' in _a for _a in self.axes):
+                _args += [int(a['nBins']), np.ascontiguousarray(self.axis_edges(i))]
+            else:
+                _args += [int(a['nBins']), float(a['xMin']), float(a['xMax'])]
+        h = _cls(self.name, self.title, *_args)
+
+        if self.profile:
+            h.Sumw2()
+
+        for flat, idx in enumerate(np.ndindex(*self.shape)):
+            b = h.GetBin(*idx)
+            if self.profile:
+                h.SetBinEntries(b, self.sumw[flat])
+                h.SetBinContent(b, self.sumwy[flat])
+                h.GetSumw2().AddAt(self.sumwy2[flat], b)
+                h.GetBinSumw2().AddAt(self.sumw2[flat], b)
+            else:
+                h.SetBinContent(b, self.sumw[flat])
+                h.SetBinError(b, np.sqrt(self.sumw2[flat]))
+        h.SetEntries(self.entries)
+        return h
+
+
+
+# 1D histogram with fixed binning (H1D)
+class Histo1D(Histo):
+
+    def __init__(self, name, title, nBins, xMin, xMax):
+        super().__init__(name, title, [{'nBins' : int(nBins), 'xMin' : float(xMin), 'xMax' : float(xMax)}])
+        self.nBins   = int(nBins)
+        self.xMin    = float(xMin)
+        self.xMax    = float(xMax)
+
+
+    def edges(self):     return self.axis_edges(0)
+
+
+    def fill(self, x, w=1.0):
+        return self.fill_coords([x], w)
+
+
+    def to_TH1D(self):   return self.to_ROOT()
+
+
+
+def book_histo(name, hd):
+    axes = hd["axes"]
+    if hd["kind"] == 'H1D' and not 'edges' in axes[0]:
+        return Histo1D(name, hd["title"], axes[0]['nBins'], axes[0]['xMin'], axes[0]['xMax'])
+    return Histo(name, hd["title"], axes, hd["kind"])
+
+
+
+
+###########################################################################
+# Input sources: read(branch_names, start, stop) -> { branch : ndarray or Jagged }
+###########################################################################
+
+class ArraysInput:
+
+    def __init__(self, arrays):
+        self.arrays   = arrays
+        self.n_events = len(next(iter(arrays.values()))) if arrays else 0
+
+
+    def read(self, branch_names, start, stop):
+        batch = {}
+        for b in branch_names:
+            a = self.arrays[b]
+            if _is_jagged(a):    batch[b] = a.take_events(np.arange(start, stop))
+            else:                batch[b] = np.asarray(a[start:stop])
+        return batch
+
+
+
+class UprootInput:
+
+    def __init__(self, file_name, tree_name):
+        self.tree     = uproot.open(file_name)[tree_name]
+        self.n_events = self.tree.num_entries
+
+
+    def read(self, branch_names, start, stop):
+        batch  = {}
+        arrays = self.tree.arrays(branch_names, entry_start=start, entry_stop=stop, library="ak")
+        for b in branch_names:
+            a = arrays[b]
+            if a.ndim > 1:
+                batch[b] = Jagged.from_counts(awkward.to_numpy(awkward.flatten(a)), awkward.to_numpy(awkward.num(a)))
+            else:
+                batch[b] = awkward.to_numpy(a)
+        return batch
+
+
+
+
+###########################################################################
+# Processor
+###########################################################################
+
+class Processor_NumPy:
+
+    def __init__(self, name, flow, file_name="", tree_name="", input_arrays=None, input_store="", batch_size=100000, cse=True, fold=True, fuse=True, cutflow=True):
+
+        print("[pNumPy] __init__ : name = ", name, "  for flow = ", flow.name)
+
+        self.name         = name
+        self.flow         = flow
+        self.file_name    = file_name
+        self.tree_name    = tree_name
+        self.input_arrays = input_arrays
+        self.input_store  = input_store      # directory of a ColumnarStore (see columnarStore.py)
+        self.batch_size   = batch_size
+        self.cse          = cse              # common-subexpression elimination on the target graph
+        self.fold         = fold             # constant folding and trivial-weight elimination
+        self.fuse         = fuse             # fusion of linear chains of views
+        self.fused        = {}
+        self.n_columns    = 0
+        self.aliases      = {}
+        self.constant_values = {}
+        self.dag          = "NOT_SET"
+
+        self.listOfRankedViews = []
+        self.active_regions    = []
+        self.region_nodes      = {}
+        self.region_parents    = {}     # region -> region evaluated before it with the most selections in common (see region_events)
+
+        self.codes             = {}     # view -> compiled expression
+        self.constants         = {}     # view -> value
+        self.inputs            = {}     # view -> input branch name
+        self.histosDictionary  = {}
+
+        self.histos            = {}
+        self.errors            = []
+
+        self.snapshotsDictionary = {}
+        self.snapshots         = {}     # snapshot -> ColumnarStore (opened at the first batch written)
+        self.snapshot_events   = {}     # snapshot -> events written
+
+        self.cutflow           = cutflow    # cut-flow counters of the selections (see cutflow.py)
+        self.cutflow_index     = {}         # selection -> row of the counters
+        self.targets           = []         # targets of the flow + the cut-flow weights (see init_dag)
+        self.cutflow_counters  = {}
+        self.cutflow_table     = []
+
+        print("[pNumPy] Processor_NumPy __init__ : flow      = ", self.flow.name)
+
+
+
+    #######################################################################################
+    #
+    def init_dag(self):
+
+        # Targets of the processor: the cut-flow weights are not added to the targets of the flow
+        self.targets = cutflow_targets(self.flow) if self.cutflow else list(self.flow.targetList)
+
+        self.dag = self.flow.AG.subGraphTo(self.targets)
+
+        if self.cse:
+            self.aliases = eliminate_common_subexpressions(self.flow, self.dag, targets=self.targets)
+
+        if self.fold:
+            self.constant_values = fold_constants(self.flow, self.dag, targets=self.targets)
+
+        if self.fuse:
+            self.fused = fuse_linear_chains(self.flow, self.dag, targets=self.targets)
+
+        self.n_columns = number_of_columns(self.flow, self.dag)
+
+        print(f"{'[pNumPy] init_dag : '}{self.dag.name :<30}{'   ( '}{type(self.dag)}{' )'}")
+
+        self.listOfRankedViews = self.dag.list_of_ranked_views()
+        self.active_regions    = self.flow.GetListOfRegionsForTargets()
+        self.region_nodes      = self.flow.get_region_nodes_dictionary(self.dag)
+        self.histosDictionary  = self.flow.GetHistosDictionary()
+        self.snapshotsDictionary = {s : sd for s, sd in self.flow.GetSnapshotsDictionary().items() if s in self.dag.views}
+
+        # Region lattice: the events of a region are selected starting from the events of its parent
+        self.region_parents.clear()
+        evaluated = ["base"]
+        for _r in self.region_nodes:
+            if self.region_nodes[_r] and (_r != "base"):
+                self.region_parents[_r] = self.flow.region_parent(_r, candidates=evaluated)
+                evaluated.append(_r)
+
+        return
+
+
+
+    #######################################################################################
+    # Translation of the algorithms to the NumPy dialect, constants and input branches
+    #
+    def init_views(self):
+
+        self.codes.clear()
+        self.constants.clear()
+        self.inputs.clear()
+        self.errors.clear()
+
+        for v in self.listOfRankedViews:
+
+            _v = self.dag.views[v]
+
+            if self.flow.is_view_output(_v):
+                continue
+
+            if _v.is_input() and (not _v.is_constant()):
+
+                _prefix, _feature = self.flow.ID.split_name_feat_base(v)
+
+                if _prefix == self.flow.ID.CONSTANT_label:
+                    self.constants[v] = self.evaluate(numpy_expression(self.flow.ID.translate_string(v)), {}, v)
+                else:
+                    self.inputs[v] = self.flow.ID.translate_string(v)
+                continue
+
+            try:
+                code = numpy_expression(_v.algorithm)
+            except SyntaxError:
+                self.errors.append(v)
+                print(f"{'[pNumPy] ERROR : algorithm NOT supported by the NumPy backend  '}{v :<40}{_v.algorithm}")
+                continue
+
+            if _v.is_constant():
+                self.constants[v] = self.evaluate(code, {}, v)
+            else:
+                self.codes[v] = code
+
+        print(f"{'[pNumPy] init_views : '}{len(self.inputs)}{' inputs, '}{len(self.constants)}{' constants, '}{len(self.codes)}{' transformations'}")
+
+        return (len(self.errors) == 0)
+
+
+
+    def evaluate(self, code, arguments, view_name):
+        return eval(code, NUMPY_DIALECT_FUNCTIONS, arguments)
+
+
+
+    #######################################################################################
+    #
+    def book_histos(self):
+
+        self.histos = {}
+        for h, hd in self.histosDictionary.items():
+            if not h in self.dag.views:
+                continue
+            self.histos[h] = book_histo(h, hd)
+
+        if self.cutflow:
+            selections            = cutflow_selections(self.dag)
+            self.cutflow_index    = {s : i for i, s in enumerate(selections)}
+            self.cutflow_counters = {c : np.zeros(len(selections), dtype=(np.int64 if c in ("evaluated", "passed") else np.float64))
+                                     for c in ("evaluated", "passed", "sumw_evaluated", "sumw_passed")}
+        return
+
+
+
+    # Selections evaluated in the region: counted once all the nodes of the region are evaluated (weight included)
+    def count_selections(self, values, regions, region_id, positions):
+
+        n_events = len(regions[region_id])
+        w        = None
+
+        for _n in self.region_nodes[region_id]:
+
+            if not _n in self.cutflow_index:
+                continue
+
+            if w is None:
+                w = np.broadcast_to(np.asarray(self.get_value(values, regions, cutflow_weight(self.flow, _n), region_id, positions), dtype=np.float64), (n_events,))
+
+            i    = self.cutflow_index[_n]
+            mask = np.broadcast_to(np.asarray(self.get_value(values, regions, _n, region_id, positions), dtype=bool), (n_events,))
+
+            self.cutflow_counters["evaluated"][i]      += n_events
+            self.cutflow_counters["passed"][i]         += np.count_nonzero(mask)
+            self.cutflow_counters["sumw_evaluated"][i] += w.sum()
+            self.cutflow_counters["sumw_passed"][i]    += w[mask].sum()
+
+        return
+
+
+
+    #######################################################################################
+    # Values are stored as (region, value): value is defined for the events of the region only
+    #
+    def get_value(self, values, regions, view_name, region_id, positions):
+
+        v_region, value = values[view_name]
+
+        if (v_region == region_id) or not (_is_jagged(value) or isinstance(value, np.ndarray)):
+            return value
+
+        _key = (v_region, region_id)
+        if not _key in positions:
+            positions[_key] = np.searchsorted(regions[v_region], regions[region_id])
+        pos = positions[_key]
+
+        if _is_jagged(value):    return value.take_events(pos)
+        return value[pos]
+
+
+
+    def region_events(self, values, regions, region_id, positions):
+
+        parent      = self.region_parents.get(region_id, "base")
+        parent_sels = self.flow.region_selections(parent)
+
+        regions[region_id] = regions[parent]
+
+        # Only the selections not applied yet to the parent events (evaluation order of the region)
+        for sel in [s for s in self.flow.region_selection_chain(region_id) if not s in parent_sels]:
+            mask = self.get_value(values, regions, sel, region_id, positions)
+            mask = np.broadcast_to(np.asarray(mask, dtype=bool), regions[region_id].shape)
+
+            regions[region_id] = regions[region_id][mask]
+            positions = {k : p for k, p in positions.items() if region_id not in k}   # region events changed
+
+        return positions
+
+
+
+    def process_batch(self, batch, n_events):
+
+        values    = {v : ("base", batch[b]) for v, b in self.inputs.items()}
+        values.update({v : ("base", c) for v, c in self.constants.items()})
+
+        regions   = {"base" : np.arange(n_events)}
+        positions = {}
+
+        for _r in self.region_nodes:
+
+            if not self.region_nodes[_r]:
+                continue
+
+            if _r != "base":
+                positions = self.region_events(values, regions, _r, positions)
+
+            for _n in self.region_nodes[_r]:
+
+                if not _n in self.codes and not self.flow.is_view_output(self.dag.views[_n]):
+                    continue
+
+                _v        = self.dag.views[_n]
+                arguments = {o : self.get_value(values, regions, o, _r, positions) for o in _v.origins}
+
+                if self.flow.is_view_histo(_v):
+                    self.fill_histo(_n, arguments, len(regions[_r]))
+                elif self.flow.is_view_snapshot(_v):
+                    self.write_snapshot(_n, arguments, len(regions[_r]))
+                else:
+                    values[_n] = (_r, self.evaluate(self.codes[_n], arguments, _n))
+
+            if self.cutflow:
+                self.count_selections(values, regions, _r, positions)
+
+        return
+
+
+
+    #######################################################################################
+    # Histograms of the region filled from the columns of the region: collections filled element-wise
+    # (the per-event variables and the weight are broadcast to the elements)
+    #
+    def fill_histo(self, h, arguments, n_events):
+
+        hd     = self.histosDictionary[h]
+        coords = [arguments[x] for x in hd["variables"]]
+        w      = arguments[hd["weight"]] if hd["weight"] in arguments else 1.0     # weight equal to 1 removed by the constant folding
+        w      = np.broadcast_to(np.asarray(w, dtype=np.float64), (n_events,))
+
+        jagged = [x for x in coords if _is_jagged(x)]
+
+        if jagged:
+            _j = jagged[0]
+            if not all(x.same_layout(_j) for x in jagged[1:]):
+                print(f"{'[pNumPy] ERROR : collections with different sizes in  '}{h}{'  - not filled'}")
+                return
+            coords = [x.values if _is_jagged(x) else _j.broadcast(np.broadcast_to(np.asarray(x), (n_events,))) for x in coords]
+            w      = _j.broadcast(w)
+        else:
+            coords = [np.broadcast_to(np.asarray(x), (n_events,)) for x in coords]
+
+        self.histos[h].fill_coords(coords, w)
+        return
+
+
+
+    #######################################################################################
+    # Snapshots: the columns of the events of the region appended to the store (branch names: see snapshotOutput.py)
+    # Jagged columns share the offsets of their collection counter (e.g. nSelectedMuon)
+    #
+    def write_snapshot(self, s, arguments, n_events):
+
+        sd    = self.snapshotsDictionary[s]
+        batch = {}
+
+        for c, b in zip(sd["columns"], sd["branches"]):
+            x = arguments[c]
+            batch[self.flow.translate_string(b)] = x if _is_jagged(x) else np.broadcast_to(np.asarray(x), (n_events,))
+
+        if not s in self.snapshots:
+
+            branches = {}
+            for b, x in zip(sd["branches"], batch.values()):
+                counter = ""
+                if _is_jagged(x):
+                    counter = self.flow.translate_string(self.flow.ID.get_counter_name_for(self.flow.ID.split_name_feat_base(b)[0])) if self.flow.has_index(b) else "n"+b
+                branches[self.flow.translate_string(b)] = counter
+
+            self.snapshots[s] = ColumnarStore(store_directory(sd))
+            self.snapshots[s].open_writer(branches)
+
+        self.snapshots[s].write_batch(batch, n_events)
+
+        return
+
+
+
+    def close_snapshots(self):
+
+        self.snapshot_events = {}
+
+        for s, sd in self.snapshotsDictionary.items():
+
+            # No batch written (e.g. no input events)
+            if not s in self.snapshots:
+                continue
+
+            self.snapshots[s].close_writer(source_key="snapshot:"+s)
+            self.snapshot_events[s] = self.snapshots[s].n_events
+
+            print(f"{'[pNumPy] snapshot : '}{s :<40}{self.snapshot_events[s] :>12}{' events  -> '}{store_directory(sd)}")
+
+        self.snapshots.clear()
+
+        return
+
+
+
+    #######################################################################################
+    #
+    def get_input_source(self):
+        if self.input_store != "":
+            return ColumnarStore(self.input_store)
+        if self.input_arrays is not None:
+            return ArraysInput(self.input_arrays)
+        return UprootInput(self.file_name, self.tree_name)
+
+
+
+    def RunProcessor(self):
+
+        _t_1 = time.time()
+
+        self.init_dag()
+
+        if not self.init_views():
+            print("[pNumPy] ERROR : flow NOT supported by the NumPy backend - views : ", self.errors)
+            return None
+
+        self.book_histos()
+
+        source   = self.get_input_source()
+        branches = sorted(set(self.inputs.values()))
+
+        _t_2 = time.time()
+
+        for start in range(0, source.n_events, self.batch_size):
+            stop  = min(start+self.batch_size, source.n_events)
+            batch = source.read(branches, start, stop)
+            self.process_batch(batch, stop-start)
+
+        self.close_snapshots()
+
+        _t_3 = time.time()
+
+        print("\n ================================== TIMING == \n")
+        print(" t_configure       =  ", (_t_2 - _t_1))
+        print(" t_run             =  ", (_t_3 - _t_2))
+        print(" columns           =  ", self.n_columns, "   (fused : ", len(self.fused), ")")
+        print(" events            =  ", source.n_events)
+        if (_t_3 - _t_2) > 0:
+            print(" events/s          =  ", source.n_events/(_t_3 - _t_2))
+        print("\n ============================================ \n")
+
+        if self.cutflow:
+            self.cutflow_table = cutflow_table(self.dag, list(self.cutflow_index), *[self.cutflow_counters[c] for c in ("evaluated", "passed", "sumw_evaluated", "sumw_passed")])
+            print_cutflow(self.cutflow_table)
+
+        return self.histos
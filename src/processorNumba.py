@@ -0,0 +1,524 @@
+from infoGraph import InfoView, InfoGraph
+from interfaceDictionary import interfaceDictionary
+from eventFlow import SampleProcessing
+from lazyImport import LazyModule
+from graphOptimizer import eliminate_common_subexpressions, fold_constants, fuse_linear_chains, number_of_columns
+from processorNumPy import Jagged, Histo1D, ArraysInput, UprootInput, numpy_expression_source, combinations_arguments
+from columnarStore import ColumnarStore
+from histoBooking import is_variable_axis
+import numpy as np
+import importlib.util
+import hashlib
+import os
+import sys
+import time
+
+
+numba = LazyModule("numba")     # Numba is imported when the kernel is compiled/loaded
+
+
+#######################################################################################
+#
+# Numba-JIT loop backend
+#
+#  Same structure of ProcessorLoop, but the generated code is a Python per-event kernel
+#  compiled by Numba (nopython, parallel over chunks of events) instead of C++ compiled by rootcling/g++:
+#
+#   - func__<view>            one @njit function per transformation (algorithm in the NumPy expression dialect)
+#                             CombinationsIf: nested loops over the legs with the predicate inline (combinations_function)
+#   - define_constants        module-level constants (frozen by Numba at compilation)
+#   - define_input_variables  kernel parameters: rv_<view> (one value per event), ra_<view>/of_<view> (flat values/offsets)
+#   - define_input_update     per-event update of the input variables (a collection is the slice of its flat values)
+#   - event_operations        one "if <selections>:" block per region, H1Ds filled with Fill()
+#                             (1D histograms with fixed binning only: the other histograms are reported and not filled)
+#                             (snapshots are reported and not written - see Processor_NumPy)
+#
+#  Kernels are cached on disk (cache_dir): the generated module is named after the id_codes of the
+#  target views and the layout of the inputs, and it is compiled with cache=True - i.e. a flow already
+#  processed (with the same input types) is neither regenerated nor recompiled.
+#
+#######################################################################################
+
+
+class ProcessorNumba:
+
+    KERNEL_VERSION = "2"     # to be increased when the generated code changes
+
+    def __init__(self, name, flow, file_name="", tree_name="", input_arrays=None, input_store="", batch_size=1000000, n_chunks=0, cache_dir=".nail_numba_cache", cse=True, fold=True, fuse=True):
+
+        print("[pNumba] __init__ : name = ", name, "  for flow = ", flow.name)
+
+        self.name         = name
+        self.flow         = flow
+        self.file_name    = file_name
+        self.tree_name    = tree_name
+        self.input_arrays = input_arrays
+        self.input_store  = input_store      # directory of a ColumnarStore (see columnarStore.py)
+        self.batch_size   = batch_size
+        self.n_chunks     = n_chunks         # 0 -> number of Numba threads
+        self.cache_dir    = cache_dir
+        self.cse          = cse              # common-subexpression elimination on the target graph
+        self.fold         = fold             # constant folding and trivial-weight elimination
+        self.fuse         = fuse             # fusion of linear chains of views
+        self.fused        = {}
+        self.n_columns    = 0
+        self.aliases      = {}
+        self.constant_values = {}
+        self.dag          = "NOT_SET"
+        self.py_text      = ""
+
+        self.listOfRankedViews = []
+        self.active_regions    = []
+        self.region_nodes      = {}
+        self.h1dsDictionary    = {}
+        self.h1dsList          = []
+
+        self.inputs            = {}     # input view -> branch name
+        self.kernel_key        = ""
+        self.kernel_module     = None
+
+        self.histos            = {}
+
+        print("[pNumba] ProcessorNumba __init__ : flow      = ", self.flow.name)
+
+
+
+    #######################################################################################
+    #
+    def init_dag(self):
+
+        self.dag = self.flow.GetGraphForTargets()
+
+        if self.cse:
+            self.aliases = eliminate_common_subexpressions(self.flow, self.dag)
+
+        if self.fold:
+            self.constant_values = fold_constants(self.flow, self.dag)
+
+        if self.fuse:
+            self.fused = fuse_linear_chains(self.flow, self.dag)
+
+        self.n_columns = number_of_columns(self.flow, self.dag)
+
+        print(f"{'[pNumba] init_dag : '}{self.dag.name :<30}{'   ( '}{type(self.dag)}{' )'}")
+
+        self.dag.evaluate_all_id_codes()
+
+        self.listOfRankedViews = self.dag.list_of_ranked_views()
+        self.active_regions    = self.flow.GetListOfRegionsForTargets()
+        self.region_nodes      = self.flow.get_region_nodes_dictionary(self.dag)
+        histosDictionary       = {h : hd for h, hd in self.flow.GetHistosDictionary().items() if h in self.dag.views}
+        self.h1dsDictionary    = {h : hd for h, hd in histosDictionary.items() if (hd["kind"] == 'H1D') and not is_variable_axis(hd["axes"][0])}
+        self.h1dsList          = list(self.h1dsDictionary)
+
+        for h, hd in histosDictionary.items():
+            if not h in self.h1dsDictionary:
+                print(f"{'[pNumba] ERROR : histogram NOT supported by the Numba backend (H1D with fixed binning only)  '}{h :<40}{hd['kind']}")
+
+        for s in [v for v in self.listOfRankedViews if self.flow.is_view_snapshot(self.dag.views[v])]:
+            print(f"{'[pNumba] ERROR : snapshot NOT supported by the Numba backend (see Processor_NumPy)  '}{s}")
+
+        return
+
+
+
+    #######################################################################################
+    #
+    def init_input_variables(self):
+
+        self.inputs = {}
+
+        for v in self.listOfRankedViews:
+
+            _v = self.dag.views[v]
+
+            if _v.is_input() and (not _v.is_constant()) and (not self.is_id_constant(v)):
+                self.inputs[v] = self.flow.ID.translate_string(v)
+
+        return
+
+
+
+    def is_id_constant(self, v):
+        _prefix, _feature = self.flow.ID.split_name_feat_base(v)
+        return (_prefix == self.flow.ID.CONSTANT_label)
+
+
+
+    #######################################################################################
+    # Kernel key: id_codes of the targets (they depend on the whole upstream graph) + input layout
+    #
+    def get_kernel_key(self, batch):
+
+        digest_tool = hashlib.md5()
+
+        digest_tool.update(self.KERNEL_VERSION.encode())
+
+        for t in sorted(self.flow.targetList):
+            digest_tool.update(str(self.dag.views[t].id_code).encode())
+
+        for v, b in self.inputs.items():
+            a = batch[b]
+            _layout = "jagged:"+str(a.values.dtype) if isinstance(a, Jagged) else str(np.asarray(a).dtype)
+            digest_tool.update((v+"|"+_layout).encode())
+
+        return digest_tool.hexdigest()
+
+
+
+    #######################################################################################
+    #
+    def Generate_Kernel_py(self):
+
+        print("[pNumba] Generate_Kernel_py  \n\n")
+
+        kernel_txt  = ""
+
+        ###  Imports and helpers
+        kernel_txt += self.cs_preamble()
+
+        ###  Constants definition
+        kernel_txt += self.define_constants()
+
+        ###  Functions
+        kernel_txt += self.generate_Loop_Functions_Code()
+
+        ###  Kernel begin (input variables as parameters)
+        kernel_txt += self.define_input_variables()
+
+        ###  Begin event loop
+        kernel_txt += "    _chunk_size = (_n_events + _n_chunks - 1) // _n_chunks\n\n"
+        kernel_txt += "    for _chunk in prange(_n_chunks):\n\n"
+        kernel_txt += "        _h = _histos[_chunk]\n\n"
+        kernel_txt += "        for _i in range(_chunk*_chunk_size, min(_n_events, (_chunk+1)*_chunk_size)):\n"
+
+        ###  Reset all the selections variables to false at the beginning of a new event
+        kernel_txt += self.reset_requirement_variables()
+        kernel_txt += "\n"
+
+        ###  Update input variables
+        kernel_txt += self.define_input_update()
+        kernel_txt += "\n"
+
+        ###  event loop operations
+        kernel_txt += self.event_operations()
+        kernel_txt += "\n"
+
+        self.py_text = kernel_txt
+
+        return kernel_txt
+
+
+
+    def cs_preamble(self):
+
+        txt  = "#####################################################\n"
+        txt += "# Numba kernel generated by ProcessorNumba\n"
+        txt += "#   flow    : "+self.flow.name+"\n"
+        txt += "#   targets : "+", ".join(self.flow.targetList)+"\n"
+        txt += "#####################################################\n\n"
+        txt += "import numpy as np\n"
+        txt += "from numba import njit, prange\n"
+        txt += "from numbaHelpers import *\n"
+        txt += "from numbaHelpers import _and, _or, _not, _int, _float\n\n\n"
+
+        return txt
+
+
+
+    #######################################################################################
+    #
+    def define_constants(self):
+
+        constTxt = ""
+
+        for v in self.listOfRankedViews:
+
+            _v = self.dag.views[v]
+
+            if _v.is_constant():
+                constTxt += f"{v :<40}"+" = "+numpy_expression_source(_v.algorithm)+"\n"
+            elif _v.is_input() and self.is_id_constant(v):
+                constTxt += f"{v :<40}"+" = "+numpy_expression_source(self.flow.ID.translate_string(v))+"\n"
+
+        return constTxt+"\n\n"
+
+
+
+    #######################################################################################
+    #
+    def generate_Loop_Functions_Code(self):
+
+        funTxt = ""
+
+        for v in self.listOfRankedViews:
+
+            _view = self.dag.views[v]
+
+            if self.flow.is_view_output(_view) or (not _view.is_transformation()):
+                continue
+
+            print(f"{'[pNumba] Generate function for view  '}{v :<30}{' TRANSFORMATION -> inputs = '}{' '.join(_view.origins)}")
+
+            funTxt += "@njit(cache=True)\n"
+            funTxt += "def func__"+v+"("+", ".join(_view.origins)+"):\n"
+
+            _combinations = combinations_arguments(_view.algorithm)
+            if _combinations is not None:
+                funTxt += self.combinations_function(*_combinations)+"\n"
+            else:
+                funTxt += "    return "+numpy_expression_source(_view.algorithm)+"\n\n"
+
+        return funTxt+"\n"
+
+
+
+    #######################################################################################
+    # Body of a CombinationsIf function: one loop per leg (legs of the same group start after the previous one),
+    # the candidate indices in _i - result: r[leg, candidate] (same layout of CombinationsIf in helpers.h)
+    #
+    def combinations_function(self, sizes, groups, predicate):
+
+        k    = len(sizes)
+        body = ""
+
+        for leg, size in enumerate(sizes):
+            body += "    _n"+str(leg)+" = int("+size+")\n"
+
+        body += "    _r  = np.empty(("+str(k)+", max("+" * ".join("_n"+str(leg) for leg in range(k))+", 0)), dtype=np.int64)\n"
+        body += "    _i  = np.empty("+str(k)+", dtype=np.int64)\n"
+        body += "    _c  = 0\n"
+
+        indent = "    "
+        for leg in range(k):
+            _same  = [l for l in range(leg) if groups[l] == groups[leg]]
+            _first = "_i"+str(_same[-1])+"+1" if _same else "0"
+            body  += indent+"for _i"+str(leg)+" in range("+_first+", _n"+str(leg)+"):\n"
+            indent += "    "
+            body  += indent+"_i["+str(leg)+"] = _i"+str(leg)+"\n"
+
+        if predicate is not None:
+            body  += indent+"if "+predicate+":\n"
+            indent += "    "
+
+        for leg in range(k):
+            body += indent+"_r["+str(leg)+", _c] = _i"+str(leg)+"\n"
+        body += indent+"_c += 1\n"
+
+        body += "    return np.ascontiguousarray(_r[:, :_c])\n"
+
+        return body
+
+
+
+    #######################################################################################
+    #
+    def define_input_variables(self):
+
+        parameters = ["_n_events", "_n_chunks"]
+
+        for v in self.inputs:
+            if self.flow.has_index(v):
+                parameters += ["ra_"+v, "of_"+v]
+            else:
+                parameters += ["rv_"+v]
+
+        parameters += ["_histos"]
+
+        return "@njit(parallel=True, cache=True)\ndef event_processorLoop("+", ".join(parameters)+"):\n\n"
+
+
+
+    def input_arguments(self, batch):
+
+        arguments = []
+
+        for v, b in self.inputs.items():
+            a = batch[b]
+            if self.flow.has_index(v):
+                arguments += [np.asarray(a.values), np.asarray(a.offsets)]     # np.asarray : memory-mapped arrays as plain (zero-copy) arrays
+            else:
+                arguments += [np.ascontiguousarray(a)]
+
+        return arguments
+
+
+
+    #######################################################################################
+    #
+    def define_input_update(self):
+
+        inputTxt = ""
+
+        for v in self.inputs:
+
+            if self.flow.has_index(v):
+                inputTxt += '            '+f"{v :<30}"+" = ra_"+v+"[of_"+v+"[_i]:of_"+v+"[_i+1]]\n"
+            else:
+                inputTxt += '            '+f"{v :<30}"+" = rv_"+v+"[_i]\n"
+
+        return inputTxt
+
+
+
+    #######################################################################################
+    #
+    def reset_requirement_variables(self):
+
+        inputTxt = ""
+
+        for v in self.dag.list_of_requirement_nodes():
+
+            inputTxt += '            '+f"{v :<30}"+' = False\n'
+
+        return inputTxt
+
+
+
+    #######################################################################################
+    #
+    def event_operations(self):
+
+        bodyTxt = ""
+
+        for _r in self.region_nodes:
+
+            indent = '            '
+
+            sels = self.flow.regions_dictionary[_r]['selections']
+
+            _condition = " and ".join(sels)
+
+            if sels:
+                bodyTxt += "\n"+indent+"if "+_condition+":\n"
+                indent += '    '
+
+            _n_operations = 0
+
+            for _n in self.region_nodes[_r]:
+
+                _v = self.dag.views[_n]
+
+                if (not _v.is_transformation()) or self.flow.is_view_snapshot(_v) or (self.flow.is_view_histo(_v) and not _n in self.h1dsDictionary):
+                    continue
+
+                _n_operations += 1
+
+                if self.flow.is_view_histo(_v):
+
+                    hd       = self.h1dsDictionary[_n]
+                    h_index  = self.h1dsList.index(_n)
+                    h_axis   = hd["axes"][0]
+
+                    h_weight = hd["weight"] if hd["weight"] in _v.origins else "1.0"     # weight equal to 1 removed by the constant folding
+
+                    bodyTxt += indent+"Fill(_h["+str(h_index)+"], "+hd["variables"][0]+", "+h_weight+", "+str(h_axis["nBins"])+", "+str(h_axis["xMin"])+", "+str(h_axis["xMax"])+")     # "+_n+"\n"
+
+                else:
+                    f_parameters = ', '.join(_v.origins)
+
+                    bodyTxt += indent+f"{_n :<50}"+" = func__"+_n+"("+f_parameters+")\n"
+
+            if sels and _n_operations == 0:
+                bodyTxt += indent+"pass\n"
+
+        return bodyTxt
+
+
+
+    #######################################################################################
+    # Generated module: <cache_dir>/nail_kernel_<key>.py (Numba caches the compiled code in <cache_dir>/__pycache__)
+    #
+    def load_kernel(self, batch):
+
+        self.kernel_key = self.get_kernel_key(batch)
+
+        module_name = "nail_kernel_"+self.kernel_key
+        file_name   = os.path.join(self.cache_dir, module_name+".py")
+
+        if os.path.exists(file_name):
+            print(f"{'[pNumba] kernel from cache  : '}{file_name}")
+        else:
+            print(f"{'[pNumba] generating kernel  : '}{file_name}")
+            os.makedirs(self.cache_dir, exist_ok=True)
+            with open(file_name+".tmp", "w") as _file:
+                _file.write(self.Generate_Kernel_py())
+            os.replace(file_name+".tmp", file_name)
+
+        if module_name in sys.modules:
+            self.kernel_module = sys.modules[module_name]
+        else:
+            spec               = importlib.util.spec_from_file_location(module_name, file_name)
+            self.kernel_module = importlib.util.module_from_spec(spec)
+            sys.modules[module_name] = self.kernel_module
+            spec.loader.exec_module(self.kernel_module)
+
+        return self.kernel_module
+
+
+
+    #######################################################################################
+    #
+    def get_input_source(self):
+        if self.input_store != "":
+            return ColumnarStore(self.input_store)
+        if self.input_arrays is not None:
+            return ArraysInput(self.input_arrays)
+        return UprootInput(self.file_name, self.tree_name)
+
+
+
+    def RunProcessor(self):
+
+        _t_1 = time.time()
+
+        self.init_dag()
+        self.init_input_variables()
+
+        source   = self.get_input_source()
+        branches = sorted(set(self.inputs.values()))
+        n_chunks = self.n_chunks if self.n_chunks > 0 else numba.get_num_threads()
+        n_bins   = max([int(hd["axes"][0]["nBins"]) for hd in self.h1dsDictionary.values()], default=0) + 2
+
+        self.histos = {h : Histo1D(h, hd["title"], *[hd["axes"][0][k] for k in ("nBins", "xMin", "xMax")]) for h, hd in self.h1dsDictionary.items()}
+
+        _t_2 = _t_3 = time.time()
+
+        for start in range(0, source.n_events, self.batch_size):
+
+            stop  = min(start+self.batch_size, source.n_events)
+            batch = source.read(branches, start, stop)
+
+            if self.kernel_module is None:
+                self.load_kernel(batch)
+                _t_2 = time.time()
+
+            _histos = np.zeros((n_chunks, len(self.h1dsList), 3, n_bins))
+
+            self.kernel_module.event_processorLoop(stop-start, n_chunks, *self.input_arguments(batch), _histos)
+
+            _histos = _histos.sum(axis=0)
+
+            for i, h in enumerate(self.h1dsList):
+                _h = self.histos[h]
+                _h.sumw  += _histos[i, 0, :_h.nBins+2]
+                _h.sumw2 += _histos[i, 1, :_h.nBins+2]
+                _h.entries += int(_histos[i, 2].sum())
+
+            if start == 0:
+                _t_3 = time.time()
+
+        _t_4 = time.time()
+
+        print("\n ================================== TIMING == \n")
+        print(" kernel            =  ", self.kernel_key)
+        print(" t_configure       =  ", (_t_2 - _t_1))
+        print(" t_first_batch     =  ", (_t_3 - _t_2), "   (includes the compilation if the kernel is not cached)")
+        print(" t_run             =  ", (_t_4 - _t_2))
+        print(" columns           =  ", self.n_columns, "   (fused : ", len(self.fused), ")")
+        print(" events            =  ", source.n_events)
+        if (_t_4 - _t_2) > 0:
+            print(" events/s          =  ", source.n_events/(_t_4 - _t_2))
+        print("\n ============================================ \n")
+
+        return self.histos
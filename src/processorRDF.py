@@ -1,12 +1,20 @@
 from infoGraph import InfoView, InfoGraph
 from interfaceDictionary import interfaceDictionary
 from eventFlow import SampleProcessing
-import ROOT
-from ROOT import TFile
+from lazyImport import LazyModule
+from graphOptimizer import eliminate_common_subexpressions, fold_constants, fuse_linear_chains, number_of_columns
+from schemaCache import get_default_schema_cache
+from nodeProfile import profile_report, print_profile_report
+from cutflow import cutflow_targets, cutflow_weight, cutflow_selections, cutflow_table, print_cutflow
+from histoBooking import HISTO_KINDS, cpp_binning
+from snapshotOutput import compression_settings
 import os
 import time
 
 
+ROOT = LazyModule("ROOT")     # ROOT is imported the first time a processor uses it
+
+
 #######################################################################################
 #
 #
@@ -16,7 +24,7 @@ import time
 
 class Processor_RDF:
 
-    def __init__(self, name, flow, file_name, tree_name):
+    def __init__(self, name, flow, file_name, tree_name, schema_cache=None, cse=True, fold=True, fuse=True, profile=False, cutflow=True):
 
         print("[pRDF] __init__ : name = ", name, "  for flow = ", flow.name)
 
@@ -30,9 +38,30 @@ class Processor_RDF:
         self.Types     = {}
         self.fileTypes = {}
 
+        self.schema_cache = schema_cache if schema_cache is not None else get_default_schema_cache()
+
         self.listOfRankedViews = []
         self.active_regions    = []
 
+        self.cse               = cse        # common-subexpression elimination on the target graph
+        self.fold              = fold       # constant folding and trivial-weight elimination
+        self.fuse              = fuse       # fusion of linear chains of views
+        self.fused             = {}
+        self.n_columns         = 0
+        self.aliases           = {}
+        self.constant_values   = {}
+
+        self.profile           = profile    # instrumented build: cycles and calls per func__ and slot (see nodeProfile.py)
+        self.profile_nodes     = []
+        self.profile_index     = {}
+        self.profile_report    = {}
+
+        self.cutflow           = cutflow    # cut-flow counters: Count/Sum actions booked on the filter chains (see cutflow.py)
+        self.cutflow_table     = []
+        self.targets           = []         # targets of the flow + the cut-flow weights (see init_dag)
+
+        self.snapshotsDictionary = {}
+
         self.cs        = codeSnippets()
 
         self.getFileTypes()
@@ -48,28 +77,58 @@ class Processor_RDF:
     #
     def getFileTypes(self):
 
-        _rdf = ROOT.RDataFrame(self.tree_name, self.file_name)
+        columnTypes = self.schema_cache.get_schema(self.file_name, self.tree_name, "columns", self.readColumnTypes)
 
-        for x in _rdf.GetColumnNames():
-            v_n = str(x)
+        for v_n in columnTypes:
             vs  = self.flow.ID.target2source(v_n)
             if self.flow.ID.is_defined(vs):
-                self.fileTypes[vs] = _rdf.GetColumnType(v_n)
+                self.fileTypes[vs] = columnTypes[v_n]
 
                 print("v_n =", v_n, "   ", self.fileTypes[vs])
                 print("vs  =", vs)
-                
-        del _rdf
 
         return
 
 
 
+    #######################################################################################
+    # Column -> type map read from the file (called only if the schema is not in the cache)
+    #
+    def readColumnTypes(self, file_name, tree_name):
+
+        columnTypes = {}
+
+        _rdf = ROOT.RDataFrame(tree_name, file_name)
+
+        for x in _rdf.GetColumnNames():
+            v_n = str(x)
+            columnTypes[v_n] = str(_rdf.GetColumnType(v_n))
+
+        del _rdf
+
+        return columnTypes
+
+
+
     #######################################################################################
     #
     def init_dag(self, translate=False):
 
-        _graph = self.flow.GetGraphForTargets()
+        # Targets of the processor: the cut-flow weights are not added to the targets of the flow
+        self.targets = cutflow_targets(self.flow) if self.cutflow else list(self.flow.targetList)
+
+        _graph = self.flow.AG.subGraphTo(self.targets)
+
+        if self.cse:
+            self.aliases = eliminate_common_subexpressions(self.flow, _graph, targets=self.targets)
+
+        if self.fold:
+            self.constant_values = fold_constants(self.flow, _graph, targets=self.targets)
+
+        if self.fuse:
+            self.fused = fuse_linear_chains(self.flow, _graph, targets=self.targets)
+
+        self.n_columns = number_of_columns(self.flow, _graph)
 
 
         if translate:
@@ -112,8 +171,12 @@ class Processor_RDF:
 
 
 
-        # Get list of active regions
+        # Get list of active regions (with the cut-flow, the region of each regionWeight in the targets: the
+        # node of the region where each selection is evaluated is declared and the counters booked on it)
         self.active_regions = self.flow.GetListOfRegionsForTargets()
+        for r_id in [self.flow.region_id_for_node(t) for t in self.targets]:
+            if not r_id in self.active_regions:
+                self.active_regions.append(r_id)
 
         print("\n List of active regions : \n", self.active_regions, "\n")
 
@@ -160,8 +223,16 @@ class Processor_RDF:
         RDFcpp_txt += self.generate_RDF_Filters_Declaration()
 
 
-        ### RDF H1Ds declaration
-        RDFcpp_txt += self.generate_RDF_H1D_Declaration()
+        ### RDF cut-flow counters
+        RDFcpp_txt += self.generate_RDF_Cutflow_Declaration()
+
+
+        ### RDF histograms declaration
+        RDFcpp_txt += self.generate_RDF_Histos_Declaration()
+
+
+        ### RDF snapshots (lazy: same event loop of the histograms)
+        RDFcpp_txt += self.generate_RDF_Snapshots_Declaration()
 
 
         ### event processor extra
@@ -194,11 +265,18 @@ class Processor_RDF:
 
         funTxt = ""
 
+        # Nodes profiled: the functions of the DefineSlot calls
+        self.profile_nodes = [v for v in self.listOfRankedViews if (not self.flow.is_view_output(self.dag.views[v])) and (self.dag.views[v].is_transformation() or self.dag.views[v].is_constant())]
+        self.profile_index = {v : i for i, v in enumerate(self.profile_nodes)}
+
+        if self.profile:
+            funTxt += "NodeProfiler nail_profiler;\n\n"
+
         for v in self.listOfRankedViews:
 
             _view = self.dag.views[v]
 
-            if self.flow.is_view_H1D(_view):
+            if self.flow.is_view_output(_view):
                 continue
 
 
@@ -227,14 +305,18 @@ class Processor_RDF:
 
         rdfSlots = ''
 
+        if self.profile:
+            rdfSlots += '  nail_profiler.Init({"'+'", "'.join(self.profile_nodes)+'"}, rdf.GetNSlots());\n'
+            rdfSlots += '  r.profile = &nail_profiler;\n\n'
+
         _rdf = f"{'  auto rdf0 = rdf'}"
 
         for v in self.listOfRankedViews:
 
             _view = self.dag.views[v]
 
-            # Skip slot delaration for H1Ds
-            if not self.flow.is_view_H1D(_view):
+            # Skip slot delaration for the histograms and the snapshots
+            if not self.flow.is_view_output(_view):
                 if _view.is_transformation() or _view.is_constant():
 
                     slotTxt  = _rdf+'.DefineSlot("'+_view.view+'", '
@@ -296,7 +378,7 @@ class Processor_RDF:
 
             _txt = '  auto selection_'+region_id+' = rdf0'
 
-            for sel in r_d[region_id]['selections']:
+            for sel in self.flow.region_selection_chain(region_id):
                 _txt += '.Filter("'+sel+'", "'+sel+'")'
             _txt += ';\n'
 
@@ -311,58 +393,121 @@ class Processor_RDF:
 
 
     #######################################################################################
+    # Cut-flow: for each selection (ranked) the node of its region (selection_<region>, declared with the
+    # active regions) is the evaluated node, one Filter on it the passed one - Count and Sum (weight of
+    # the region) booked on both
     #
-    def generate_RDF_H1D_Declaration(self):
+    def generate_RDF_Cutflow_Declaration(self):
+
+        if not self.cutflow:
+            return ""
+
+        cutTxt = '  // Cut-flow counters\n'
+
+        for i, sel in enumerate(cutflow_selections(self.dag)):
 
-        rdf_H1Ds = "\n  std::vector<ROOT::RDF::RResultPtr<TH1D>> H1Ds;\n\n"
+            _region = self.flow.region_id_for_node(sel)
+            _node   = "" if _region == "base" else "selection_"+_region
+            _weight = cutflow_weight(self.flow, sel)
 
+            cutTxt += '  ROOT::RDF::RNode cutflow_evaluated_'+str(i)+' = r.rdf.find("'+_node+'")->second;\n'
+            cutTxt += '  auto cutflow_passed_'+str(i)+'    = cutflow_evaluated_'+str(i)+'.Filter("'+sel+'", "'+sel+'");\n'
+            cutTxt += '  r.cutflow_selections.push_back("'+sel+'");\n'
+            cutTxt += '  r.cutflow_evaluated.push_back(     cutflow_evaluated_'+str(i)+'.Count());\n'
+            cutTxt += '  r.cutflow_passed.push_back(        cutflow_passed_'+str(i)+'.Count());\n'
+            cutTxt += '  r.cutflow_sumw_evaluated.push_back(cutflow_evaluated_'+str(i)+'.Sum("'+_weight+'"));\n'
+            cutTxt += '  r.cutflow_sumw_passed.push_back(   cutflow_passed_'+str(i)+'.Sum("'+_weight+'"));\n\n'
+
+        print(cutTxt)
+
+        return cutTxt
+
+
+
+    #######################################################################################
+    #
+    def generate_RDF_Histos_Declaration(self):
+
+        histosDictionary = self.flow.GetHistosDictionary()
+
+        rdf_Histos = "\n"
+        for _k in HISTO_KINDS.values():
+            rdf_Histos += "  std::vector<ROOT::RDF::RResultPtr<"+_k["cpp_class"]+">> "+_k["result"]+";\n"
+        rdf_Histos += "\n"
+
+        # All the histograms of a region are booked on the node of the region: filled in the same event loop
+        # from the same columns (Define) of the region
         for v in self.listOfRankedViews:
 
             _view = self.dag.views[v]
 
-            if not self.flow.is_view_H1D(_view):
+            if not self.flow.is_view_histo(_view):
                 continue
 
-            h_name = _view.view
-            h_def  = _view.algorithm
+            hd = histosDictionary[v]
+            _k = HISTO_KINDS[hd["kind"]]
 
-            h_pars = h_def.replace('H1D::(','').replace(')','').replace(', ',',').split(',')
+            # Weight removed by the constant folding (equal to 1) -> unweighted histogram
+            columns = hd["variables"] + ([hd["weight"]] if hd["weight"] in _view.origins else [])
 
-            h_var       = h_pars[0]
-            h_weight    = h_pars[1]
-            h_nBins     = h_pars[2]
-            h_xMin      = h_pars[3]
-            h_xMax      = h_pars[4]
+            _model  = 'ROOT::RDF::'+_k["cpp_class"]+'Model("'+v+'", "'+hd["title"]+'", '+cpp_binning(hd)+')'
 
-            v_region    = self.flow.region_id_for_node(v)
+            rdf_Histos += '  '+_k["result"]+'.emplace_back(r.rdf.find("'+hd["histo_selection"]+'")->second'
+            rdf_Histos += '.'+_k["rdf_method"]+'('+_model+', "'+'", "'.join(columns)+'"));\n'
 
-            h_selection = ""
-            if v_region != "base":
-                h_selection = 'selection_'+v_region
 
-            
-            h_region = "__".join(_view.requirements)
-            
-            print("\n == H1D :: ", v)
-            print(" h_name      = ", h_name  )
-            print(" h_var       = ", h_var   )
-            print(" h_weight    = ", h_weight)
-            print(" h_nBins     = ", h_nBins )
-            print(" h_xMin      = ", h_xMin  )
-            print(" h_xMax      = ", h_xMax  )
-            print(" h_region    = ", h_region)
-            print(" v_region    = ", v_region)
-            print(" h_selection = ", h_selection)
-            print("\n")
+        rdf_Histos += "\n"
+        for _k in HISTO_KINDS.values():
+            rdf_Histos += "  r."+_k["result"]+" = "+_k["result"]+";\n"
+        
+        return rdf_Histos
 
-            rdf_H1Ds += '  H1Ds.emplace_back(r.rdf.find("'+h_selection+'")->second'
-            rdf_H1Ds += '.Histo1D({"'+h_name+'", "'+h_var+' {'+h_region+'}", '+h_nBins+', '+h_xMin+', '+h_xMax+'},"'+h_var+'","'+h_weight+'"));\n'
 
 
-        rdf_H1Ds += "\n"
-        rdf_H1Ds += "  r.histos = H1Ds;\n"
-        
-        return rdf_H1Ds
+
+    #######################################################################################
+    # Snapshots: lazy Snapshot booked on the filter node of the region, with the compression and cluster
+    # settings of the snapshot (RSnapshotOptions). Columns written with another name (e.g. the varied columns
+    # of a variation - see snapshotOutput.py) are renamed on the node of the snapshot only (Redefine/Alias)
+    #
+    def generate_RDF_Snapshots_Declaration(self):
+
+        self.snapshotsDictionary = {s : sd for s, sd in self.flow.GetSnapshotsDictionary().items() if s in self.dag.views}
+
+        snapTxt = "\n"
+
+        for i, (s, sd) in enumerate(self.snapshotsDictionary.items()):
+
+            _opts = 'snapshot_options_'+str(i)
+            _node = 'snapshot_node_'+str(i)
+
+            snapTxt += '  ROOT::RDF::RSnapshotOptions '+_opts+';\n'
+            snapTxt += '  '+_opts+'.fLazy       = true;\n'
+            snapTxt += '  '+_opts+'.fAutoFlush  = '+str(sd["auto_flush"])+';\n'
+            snapTxt += '  '+_opts+'.fBasketSize = '+str(sd["basket_size"])+';\n'
+            if sd["compression"] != "":
+                _settings = compression_settings(sd)
+                snapTxt += '  '+_opts+'.fCompressionAlgorithm = ROOT::RCompressionSetting::EAlgorithm::EValues('+str(_settings//100)+');\n'
+                snapTxt += '  '+_opts+'.fCompressionLevel     = '+str(_settings % 100)+';\n'
+
+            snapTxt += '  ROOT::RDF::RNode '+_node+' = r.rdf.find("'+sd["snapshot_selection"]+'")->second;\n'
+
+            branches = []
+            for c, b in zip(sd["columns"], sd["branches"]):
+
+                # Input columns: names of the file
+                _c = self.flow.translate_string(c) if self.flow.AG.views[c].is_input_variable() else c
+                _b = self.flow.translate_string(b)
+
+                if _b != _c:
+                    snapTxt += '  '+_node+' = '+_node+'.HasColumn("'+_b+'") ? ROOT::RDF::RNode('+_node+'.Redefine("'+_b+'", "'+_c+'")) : ROOT::RDF::RNode('+_node+'.Alias("'+_b+'", "'+_c+'"));\n'
+
+                branches.append(_b)
+
+            snapTxt += '  r.snapshot_names.push_back("'+s+'");\n'
+            snapTxt += '  r.snapshots.push_back('+_node+'.Snapshot("'+sd["tree"]+'", "'+sd["file"]+'", {"'+'", "'.join(branches)+'"}, '+_opts+'));\n\n'
+
+        return snapTxt
 
 
 
@@ -399,10 +544,16 @@ class Processor_RDF:
             
         fCode  = f_type+' '+f_name
         fCode += '(\n\t\t'+f_parameters+')'
-        if not declaration_only:
-            fCode += ' {\n\treturn '+f_body+';\n}'
-        else:
+        if declaration_only:
             fCode += ';'
+        elif self.profile:
+            # Instrumented build: cycles and calls per slot (the function is called by DefineSlot)
+            fCode += ' {\n\tauto __t0 = NailClock();\n'
+            fCode += '\t'+f_type+' __r = '+f_body+';\n'
+            fCode += '\tnail_profiler.Add(__slot, '+str(self.profile_index[view_name])+', __t0);\n'
+            fCode += '\treturn __r;\n}'
+        else:
+            fCode += ' {\n\treturn '+f_body+';\n}'
 
 
         if self.dag.isNodeRequirement(view_name):
@@ -531,6 +682,8 @@ class Processor_RDF:
         ## This call returns an object "Result" (defined in the autogen.C file) which contains both the configured rdfs (one per selection node) and the resulting histos
         _result = _processor(_rdf)
 
+        _n_events = _rdf.Count()     # booked before the loop: counted in the same event loop
+
         print("-------------- STEP 7 ")
 
         print(" result = ", _result)
@@ -543,9 +696,9 @@ class Processor_RDF:
 
         stop_timer = True
 
-        with TFile.Open("f.root", "recreate") as rootFile:
+        with ROOT.TFile.Open("f.root", "recreate") as rootFile:
 
-            for o in _result.histos:
+            for o in [_h for _k in HISTO_KINDS.values() for _h in getattr(_result, _k["result"])]:
 
                 print(" histo   ", o.GetName(), "  ->  ", o)
 
@@ -559,6 +712,14 @@ class Processor_RDF:
 
                 cc.SaveAs("out-%s.png" % (o.GetName()))
 
+        # Lazy snapshots: written in the event loop of the histograms (run here if there are no histograms)
+        for _s, _snap in zip(_result.snapshot_names, _result.snapshots):
+            _snap.GetValue()
+            print(f"{'[pRDF] snapshot : '}{str(_s) :<40}{' -> '}{self.snapshotsDictionary[str(_s)]['file']}")
+
+        if stop_timer:
+            _t_3 = time.time()
+
 
         t_compile         = (_t_2 - _t_1)
         t_declare_and_run = (_t_3 - _t_2)
@@ -566,8 +727,21 @@ class Processor_RDF:
         print("\n ================================== TIMING == \n")
         print(" t_compile         =  ", t_compile)
         print(" t_declare_and_run =  ", t_declare_and_run)
+        print(" columns (Define)  =  ", self.n_columns, "   (fused : ", len(self.fused), ")")
+        print(" events            =  ", _n_events.GetValue())
+        if t_declare_and_run > 0:
+            print(" events/s          =  ", _n_events.GetValue()/t_declare_and_run)
         print("\n ============================================ \n")
 
+        if self.profile:
+            self.profile_report = profile_report(_result.profile, self.dag)
+            print_profile_report(self.profile_report)
+
+        if self.cutflow:
+            _counters = [[x.GetValue() for x in c] for c in (_result.cutflow_evaluated, _result.cutflow_passed, _result.cutflow_sumw_evaluated, _result.cutflow_sumw_passed)]
+            self.cutflow_table = cutflow_table(self.dag, [str(s) for s in _result.cutflow_selections], *_counters)
+            print_cutflow(self.cutflow_table)
+
         return
 
     
@@ -596,6 +770,10 @@ class codeSnippets:
 #include <ROOT/RVec.hxx>
 #include "Math/Vector4D.h"
 #include <ROOT/RDataFrame.hxx>
+#include <TH2D.h>
+#include <TH3D.h>
+#include <TProfile.h>
+#include <TProfile2D.h>
 #include "src/helpers.h"
 
 #define MemberMap(vector,member) Map(vector,[](auto x){return x.member;})
@@ -614,7 +792,19 @@ struct Result {
   std::map<std::string,RNode> rdf;
   ROOT::RDF::RResultPtr<TH1D> histo;
   std::vector<ROOT::RDF::RResultPtr<TH1D>> histos;
+  std::vector<ROOT::RDF::RResultPtr<TH2D>> histos2D;
+  std::vector<ROOT::RDF::RResultPtr<TH3D>> histos3D;
+  std::vector<ROOT::RDF::RResultPtr<TProfile>> profiles1D;
+  std::vector<ROOT::RDF::RResultPtr<TProfile2D>> profiles2D;
   std::map<std::string,std::vector<ROOT::RDF::RResultPtr<TH1D> > > histosOutSplit;
+  NodeProfiler* profile = nullptr;      // instrumented build only - filled during the event loop
+  std::vector<std::string> cutflow_selections;
+  std::vector<ROOT::RDF::RResultPtr<ULong64_t>> cutflow_evaluated;
+  std::vector<ROOT::RDF::RResultPtr<ULong64_t>> cutflow_passed;
+  std::vector<ROOT::RDF::RResultPtr<double>> cutflow_sumw_evaluated;
+  std::vector<ROOT::RDF::RResultPtr<double>> cutflow_sumw_passed;
+  std::vector<std::string> snapshot_names;
+  std::vector<ROOT::RDF::RResultPtr<ROOT::RDF::RInterface<ROOT::Detail::RDF::RLoopManager>>> snapshots;
 };
 
 // Not used right now (ROOT.RDF.AsRNode is used instead) !!
@@ -0,0 +1,128 @@
+import json
+import os
+
+
+#######################################################################################
+#
+# SchemaCache: cache of the input files' schema (i.e. the type of the branches/columns of a tree)
+#
+#  - key    : (absolute file path, file size, file modification time, tree name) -> a changed file is re-read
+#  - schema : { kind : { leaf/column name : type } }
+#             kind identifies the function used to read the schema (each backend has its own, e.g.
+#             "leaves" for the plain loop - TTree leaves - and "columns" for RDF - RDataFrame column types)
+#
+#  The schema is read through the function passed by the backend only if it is not in the cache
+#  (the cache is saved to cache_file_name and it is shared by all the processors of the same process).
+#
+#  Datasets (list of files):
+#  - representative_file = True  : the schema of the FIRST file is used for all the files (files sharing the same layout)
+#  - representative_file = False : the schema of every file is read/checked (a WARNING is printed if layouts differ)
+#
+#######################################################################################
+
+
+class SchemaCache:
+
+    def __init__(self, cache_file_name = ".nail_schema_cache.json", representative_file = False):
+
+        self.cache_file_name     = cache_file_name
+        self.representative_file = representative_file
+        self.schemas             = {}
+
+        self.load()
+
+
+    ##################################
+    # Key
+
+    def key_for(self, file_name, tree_name):
+
+        _path = os.path.abspath(file_name)
+
+        if os.path.exists(_path):
+            _stat = os.stat(_path)
+            return f"{_path}|{_stat.st_size}|{_stat.st_mtime_ns}|{tree_name}"
+
+        # Remote files (e.g. root://...) - no size/mtime available -> the name only is used
+        return f"{file_name}|-|-|{tree_name}"
+
+
+    ##################################
+    # Save & Load
+
+    def load(self):
+        if self.cache_file_name == "" or (not os.path.exists(self.cache_file_name)):
+            return
+
+        with open(self.cache_file_name) as file:
+            self.schemas = json.load(file)
+
+        print(f"{'[SchemaCache] loaded from : ' : <30}{self.cache_file_name}{'   ('}{len(self.schemas)}{' entries)'}")
+        return
+
+
+    def save(self):
+        if self.cache_file_name == "":
+            return
+
+        with open(self.cache_file_name, "w") as file:
+            json.dump(self.schemas, file)
+        return
+
+
+    ##################################
+    # Schema access
+
+    def get_schema(self, file_names, tree_name, kind, read_schema_function):
+
+        if isinstance(file_names, str):
+            file_names = [file_names]
+
+        if self.representative_file:
+            file_names = file_names[:1]
+
+        schema = {}
+
+        for i, file_name in enumerate(file_names):
+
+            _schema = self.get_file_schema(file_name, tree_name, kind, read_schema_function)
+
+            if i == 0:
+                schema = _schema
+            elif _schema != schema:
+                print(f"{'[SchemaCache] WARNING - schema of  '}{file_name}{'  differs from the one of  '}{file_names[0]}")
+
+        return schema
+
+
+    def get_file_schema(self, file_name, tree_name, kind, read_schema_function):
+
+        _key = self.key_for(file_name, tree_name)
+
+        if (_key in self.schemas) and (kind in self.schemas[_key]):
+            print(f"{'[SchemaCache] ' : <14}{kind : <10}{' from cache  : '}{file_name}")
+            return self.schemas[_key][kind]
+
+        print(f"{'[SchemaCache] ' : <14}{kind : <10}{' from file   : '}{file_name}")
+
+        self.schemas.setdefault(_key, {})[kind] = read_schema_function(file_name, tree_name)
+        self.save()
+
+        return self.schemas[_key][kind]
+
+
+    def clear(self):
+        self.schemas.clear()
+        self.save()
+        return
+
+
+
+# Cache shared (by default) by all the processors - created at its first use
+_default_schema_cache = None
+
+def get_default_schema_cache():
+    global _default_schema_cache
+    if _default_schema_cache is None:
+        _default_schema_cache = SchemaCache()
+    return _default_schema_cache
@@ -0,0 +1,94 @@
+import os
+
+
+#######################################################################################
+#
+# Snapshot (skim) output: the events of a region written with a chosen set of views
+#
+#  DefineSnapshot (eventFlow.py) registers the snapshot; at BuildFlow its view (SNAPSHOT_<name>) is added to
+#  the AG - origins = the columns written, requirements = the selections of the region - and the definition
+#  is stored on the view (InfoView.snapshot):
+#
+#   snapshot = { 'columns'           : views written
+#                'branches'          : output names of the columns (input views: translated by the backends, i.e. the
+#                                      names of the input file - the skim can be read by a flow with the same dictionary)
+#                'file', 'tree'      : output file and tree
+#                'compression'       : 'ZLIB' | 'LZMA' | 'LZ4' | 'ZSTD' | '' (default of ROOT)
+#                'compression_level' : 1 .. 9
+#                'auto_flush'        : cluster size of the output tree (> 0 entries, < 0 bytes - TTree::SetAutoFlush)
+#                'basket_size'       : buffer size of the branches (bytes) }
+#
+#  The backends write the snapshot from the metadata of the view, in the same event loop of the histograms:
+#   - RDF      : lazy Snapshot booked on the filter node of the region (RSnapshotOptions)
+#   - Loop     : SnapshotWriter (helpers.h) - the events are buffered and written to the TTree in batches
+#   - NumPy    : ColumnarStore in the directory <file without extension> (see columnarStore.py) - the skim is the
+#                input_store of the following runs
+#
+#  The snapshot dictionary of a view is never modified: renames (variations, CSE, analysis train, translation)
+#  replace it with a new one (rename_snapshot). The branches are not renamed: the varied snapshots (written to
+#  <file>__<variation>) have the same schema of the nominal one.
+#
+#######################################################################################
+
+
+# ROOT::RCompressionSetting::EAlgorithm
+COMPRESSION_ALGORITHMS = {'ZLIB' : 1, 'LZMA' : 2, 'LZ4' : 4, 'ZSTD' : 5}
+
+
+
+def make_snapshot(columns, file_name, tree_name="Events", compression="ZSTD", compression_level=5, auto_flush=-30000000, basket_size=32000):
+
+    if not columns:
+        raise ValueError("no columns to write")
+
+    if (compression != "") and (not compression in COMPRESSION_ALGORITHMS):
+        raise ValueError("unknown compression algorithm : "+compression)
+
+    return {'columns'           : list(columns),
+            'branches'          : list(columns),
+            'file'              : file_name,
+            'tree'              : tree_name,
+            'compression'       : compression,
+            'compression_level' : compression_level,
+            'auto_flush'        : auto_flush,
+            'basket_size'       : basket_size}
+
+
+
+def snapshot_name(name):    return "SNAPSHOT_"+name
+
+
+
+# Canonical algorithm of the view (output file included: two snapshots of the same columns are different views)
+def snapshot_code(snapshot):
+    return "Snapshot::("+", ".join(snapshot['columns'])+") -> \""+snapshot['file']+":"+snapshot['tree']+"\""
+
+
+
+def varied_file_name(file_name, variation):
+    _base, _ext = os.path.splitext(file_name)
+    return _base+"__"+variation+_ext
+
+
+
+def rename_snapshot(snapshot, renames, variation=""):
+
+    _snapshot            = dict(snapshot)
+    _snapshot['columns'] = [renames.get(c, c) for c in snapshot['columns']]
+
+    if variation != "":
+        _snapshot['file'] = varied_file_name(snapshot['file'], variation)
+
+    return _snapshot
+
+
+
+# ROOT compression settings: 100 * algorithm + level (-1: default of ROOT)
+def compression_settings(snapshot):
+    if snapshot['compression'] == "":
+        return -1
+    return 100*COMPRESSION_ALGORITHMS[snapshot['compression']] + int(snapshot['compression_level'])
+
+
+
+def store_directory(snapshot):    return os.path.splitext(snapshot['file'])[0]
@@ -0,0 +1,56 @@
+from infoGraph import InfoView, InfoGraph
+import tracemalloc
+import time
+
+
+##########################################
+# Memory benchmark: analysis graph with 50k views
+#
+# The view names are built with string formatting (as done by the flow building tools), so that
+# the same name referenced by several views is - in principle - a different string object
+#
+# > python benchmark_InfoGraph_memory.py
+
+nCollections = 500
+nFeatures    = 100       # nCollections * nFeatures = 50k views
+
+
+def build_graph(node_ids=False):
+
+    g = InfoGraph("benchmark_AG", node_ids=node_ids)
+
+    for c in range(nCollections):
+
+        mask = "mask_%s_%s" % ("Muon", "Coll%d" % c)
+        g.addNode(mask, ["Muon_pt", "Muon_eta"], "Muon_pt > %d" % c, requirements_list=["twoSelectedMuons"])
+
+        for f in range(nFeatures - 1):
+            var_target = "%s_%s" % ("Coll%d" % c, "feature_%d" % f)
+            var_source = "%s_%s" % ("Muon", "feature_%d" % f)
+            g.addNode(var_target, [var_source, mask], "At(%s,%s)" % (var_source, mask), requirements_list=["twoSelectedMuons"])
+
+    return g
+
+
+
+for _node_ids in [False, True]:
+
+    tracemalloc.start()
+    _t_1 = time.time()
+
+    graph = build_graph(_node_ids)
+
+    _t_2 = time.time()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print("\n ================================== MEMORY == \n")
+    print(" node_ids          =  ", _node_ids)
+    print(" number of views   =  ", len(graph.views))
+    print(" memory (current)  =  ", f"{current/1024/1024 :.2f}", " MB")
+    print(" memory (peak)     =  ", f"{peak/1024/1024 :.2f}", " MB")
+    print(" bytes per view    =  ", f"{current/len(graph.views) :.1f}")
+    print(" t_build           =  ", f"{_t_2-_t_1 :.3f}", " s")
+    print("\n ============================================ \n")
+
+    del graph
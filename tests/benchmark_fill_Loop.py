@@ -0,0 +1,49 @@
+from eventFlow import SampleProcessing
+from processorLoop import ProcessorLoop
+import sys
+
+
+##########################################
+# Batched histogram filling of the plain-loop backend: events/s with many booked H1Ds
+#
+# > source setup ; python tests/benchmark_fill_Loop.py [fill_batch] [n_histos]
+#
+# - fill_batch = 0      : TH1D::Fill per histogram and event
+# - fill_batch = 10000  : FillBuffers flushed with FillN every 10000 events (default)
+#
+# The generated library has a fixed name (one configuration per process): run the script once
+# per fill_batch value and compare the events/s printed in the TIMING summary.
+# The RVec-valued variables (Muon_pt, Muon_eta) are filled element-wise with fill_batch > 0 only.
+
+fill_batch = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+n_histos   = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+
+
+flow = SampleProcessing("flowFill", 'dictionaries/nanoAOD_nanoAOD_id_OpenData.json')
+
+flow.DefineEventWeight("Weight_normalisation", "1.0f")
+flow.DefineEventWeight("Weight_base_1",        "0.5f")
+
+targets = []
+
+for k in range(n_histos):
+    flow.Define("MET_ptShift"+str(k), "MET_pt + "+str(k)+".0f")
+    flow.DefineHisto1D("MET_ptShift"+str(k), [], 100, 0.0, 200.0+k)
+    targets.append("HISTO_MET_ptShift"+str(k))
+
+if fill_batch > 0:
+    flow.DefineHisto1D("Muon_pt",  [], 100, 0.0, 200.0)
+    flow.DefineHisto1D("Muon_eta", [], 48, -2.4, 2.4)
+    targets += ["HISTO_Muon_pt", "HISTO_Muon_eta"]
+
+flow.BuildFlow()
+flow.SetTargets(targets)
+
+
+pLoop = ProcessorLoop("pLoop", flow, "../test_data/OpenData_CMS-DA1BF301-762C-5048-A9EB-AB534069FB4B.root", "Events", fill_batch=fill_batch)
+
+pLoop.Generate_Loop_cpp()
+
+pLoop.Compile_cpp_file()
+
+pLoop.RunProcessor()
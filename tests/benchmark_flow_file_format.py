@@ -0,0 +1,49 @@
+from eventFlow import SampleProcessing
+import os
+import sys
+import time
+
+
+##########################################
+# Save/load timing: json vs binary flow format
+#
+# > python benchmark_flow_file_format.py [flow_file.json] [n_repetitions]
+#
+# The flow file is produced by build_flow_NANOAOD.py (default: flow_OpenData_CMS.json)
+
+flow_file_name = sys.argv[1]      if len(sys.argv) > 1 else "flow_OpenData_CMS.json"
+n_repetitions  = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+
+
+flow = SampleProcessing("flowBenchmark")
+flow.loadFlowFromFile(flow_file_name)
+
+
+def timing(function, *args, **kwargs):
+    _t_1 = time.time()
+    for i in range(n_repetitions):
+        function(*args, **kwargs)
+    return (time.time() - _t_1) / n_repetitions
+
+
+t_save_json   = timing(flow.saveFlowToFile,         "_benchmark_flow.json")
+t_save_binary = timing(flow.saveFlowToBinaryFile,   "_benchmark_flow.nflow")
+
+t_load_json   = timing(SampleProcessing("flowBenchmark_json").loadFlowFromFile,         "_benchmark_flow.json")
+t_load_binary = timing(SampleProcessing("flowBenchmark_binary").loadFlowFromBinaryFile, "_benchmark_flow.nflow")
+t_load_mmap   = timing(SampleProcessing("flowBenchmark_mmap").loadFlowFromBinaryFile,   "_benchmark_flow.nflow", use_mmap=True)
+
+
+print("\n ================================== TIMING == \n")
+print(" flow file         =  ", flow_file_name, "  (", len(flow.AG.views), " views )")
+print(" size json         =  ", os.path.getsize("_benchmark_flow.json"),  " bytes")
+print(" size binary       =  ", os.path.getsize("_benchmark_flow.nflow"), " bytes")
+print(" t_save_json       =  ", f"{1000*t_save_json :.2f}",   " ms")
+print(" t_save_binary     =  ", f"{1000*t_save_binary :.2f}", " ms")
+print(" t_load_json       =  ", f"{1000*t_load_json :.2f}",   " ms")
+print(" t_load_binary     =  ", f"{1000*t_load_binary :.2f}", " ms")
+print(" t_load_mmap       =  ", f"{1000*t_load_mmap :.2f}",   " ms")
+print("\n ============================================ \n")
+
+os.remove("_benchmark_flow.json")
+os.remove("_benchmark_flow.nflow")
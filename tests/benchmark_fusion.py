@@ -0,0 +1,95 @@
+from eventFlow import SampleProcessing
+from processorNumPy import Processor_NumPy, Jagged
+import numpy as np
+import time
+import sys
+
+
+##########################################
+# Fusion of linear chains (graphOptimizer.fuse_linear_chains): columns and events/s with and without
+#
+# > source setup ; python tests/benchmark_fusion.py [n_events]
+#
+# - synthetic events (no ROOT, no input file needed), flow in the NumPy expression dialect with
+#   chains of single-consumer Defines (e.g. Muon_px -> Muon_px2 -> Muon_p2 -> Muon_p)
+# - the NumPy backend runs with fuse=False and fuse=True (the Numba one as well, if numba is installed)
+# - the histograms must be the same
+
+n_events = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+
+
+def make_flow():
+
+    flow = SampleProcessing("flowFusion", 'dictionaries/nanoAOD_nanoAOD_id_OpenData.json')
+
+    flow.DefineEventWeight("Weight_normalisation", "1.0f")
+
+    flow.Define("Muon_px",  "Muon_pt*cos(Muon_phi)")
+    flow.Define("Muon_py",  "Muon_pt*sin(Muon_phi)")
+    flow.Define("Muon_pz",  "Muon_pt*sinh(Muon_eta)")
+    flow.Define("Muon_pz2", "Muon_pz*Muon_pz")
+    flow.Define("Muon_p2",  "Muon_pt*Muon_pt + Muon_pz2")
+    flow.Define("Muon_p",   "sqrt(Muon_p2)")
+    flow.Define("Muon_sumpx", "Sum(Muon_px)")
+    flow.Define("Muon_sumpy", "Sum(Muon_py)")
+    flow.Define("Muon_ht2",   "Muon_sumpx*Muon_sumpx + Muon_sumpy*Muon_sumpy")
+    flow.Define("Muon_ht",    "sqrt(Muon_ht2)")
+
+    flow.SubCollection("FwdMuon", "Muon", sel="Muon_p > 2.0f*Muon_pt")
+
+    flow.DefineHisto1D("nFwdMuon", [], 10, 0, 10)
+    flow.DefineHisto1D("Muon_ht",  [], 100, 0, 200)
+
+    flow.BuildFlow()
+    flow.SetTargets(["HISTO_nFwdMuon", "HISTO_Muon_ht"])
+
+    return flow
+
+
+rng    = np.random.default_rng(12345)
+counts = rng.poisson(2.0, n_events)
+n_mu   = counts.sum()
+
+arrays = {
+    "nMuon"    : counts,
+    "Muon_pt"  : Jagged.from_counts(rng.exponential(30.0, n_mu).astype(np.float32),      counts),
+    "Muon_eta" : Jagged.from_counts(rng.uniform(-3.0, 3.0, n_mu).astype(np.float32),     counts),
+    "Muon_phi" : Jagged.from_counts(rng.uniform(-np.pi, np.pi, n_mu).astype(np.float32), counts),
+}
+
+
+processors = [("NumPy", Processor_NumPy, {})]
+
+try:
+    from processorNumba import ProcessorNumba
+    import numba
+    processors.append(("Numba", ProcessorNumba, {}))
+except ImportError:
+    print("[benchmark_fusion] numba not installed : NumPy backend only")
+
+
+results = {}
+
+for backend, processor_class, options in processors:
+    for fuse in (False, True):
+
+        processor = processor_class(backend+"_fuse_"+str(fuse), make_flow(), input_arrays=arrays, fuse=fuse, **options)
+
+        # Numba: the first run includes the compilation
+        runs = 2 if backend == "Numba" else 1
+        for r in range(runs):
+            _t_1   = time.time()
+            histos = processor.RunProcessor()
+            _t_2   = time.time()
+
+        results[(backend, fuse)] = (processor.n_columns, n_events/(_t_2 - _t_1), histos)
+
+
+
+print("\n ================================== FUSION == \n")
+print(f"{' backend' :<12}{'fuse' :>8}{'columns' :>10}{'events/s' :>16}{'histos' :>10}")
+for (backend, fuse), (n_columns, rate, histos) in results.items():
+    _ref  = results[(backend, False)][2]
+    _same = all(np.allclose(histos[h].sumw, _ref[h].sumw) for h in histos)
+    print(f"{' '+backend :<12}{str(fuse) :>8}{n_columns :>10}{rate :>16.0f}{'same' if _same else 'DIFFERENT' :>10}")
+print("\n ============================================ \n")
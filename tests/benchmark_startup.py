@@ -0,0 +1,56 @@
+import subprocess
+import sys
+
+
+##########################################
+# Start-up time of the entry points (each one in a fresh interpreter)
+#
+# > source setup ; python tests/benchmark_startup.py
+#
+# - t_import : time to import the module
+# - t_use    : time to import the module AND build a minimal flow/graph with it
+# - ROOT     : is ROOT loaded after t_use? (it should be loaded only when a processor touches it)
+
+entry_points = {
+    "infoGraph"           : "g = infoGraph.InfoGraph('g'); g.addNode('a'); g.addNode('b', ['a'], 'a+1'); g.list_of_ranked_views()",
+    "interfaceDictionary" : "d = interfaceDictionary.interfaceDictionary('d'); d.add_variable('Muon_pt'); d.get_var_list('Muon_pt > 20')",
+    "eventFlow"           : "f = eventFlow.SampleProcessing('f'); f.ID.add_variable('Muon_pt'); f.Define('x', 'Muon_pt*2'); f.GetGraphForTargets(['x'])",
+    "processorLoop"       : "f = processorLoop.SampleProcessing('f'); f.ID.add_variable('Muon_pt'); f.Define('x', 'Muon_pt*2'); f.GetGraphForTargets(['x'])",
+    "processorRDF"        : "f = processorRDF.SampleProcessing('f'); f.ID.add_variable('Muon_pt'); f.Define('x', 'Muon_pt*2'); f.GetGraphForTargets(['x'])",
+}
+
+
+timing_code = '''
+import sys, time, io, contextlib
+_t_0 = time.perf_counter()
+import {module}
+_t_1 = time.perf_counter()
+with contextlib.redirect_stdout(io.StringIO()):
+    {use}
+_t_2 = time.perf_counter()
+print(_t_1-_t_0, _t_2-_t_0, "ROOT" in sys.modules)
+'''
+
+
+n_repetitions = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+
+
+print("\n ================================== START-UP == \n")
+print(f"{' entry point' :<24}{'t_import [ms]' :>16}{'t_use [ms]' :>16}{'ROOT loaded' :>14}")
+
+for module, use in entry_points.items():
+
+    t_import = t_use = float("inf")
+
+    for i in range(n_repetitions):
+        out = subprocess.run([sys.executable, "-c", timing_code.format(module=module, use=use)], capture_output=True, text=True)
+        if out.returncode != 0:
+            print(f"{' '+module :<24}{'  ERROR : '}{out.stderr.strip().splitlines()[-1]}")
+            break
+        _t_i, _t_u, root_loaded = out.stdout.split()
+        t_import = min(t_import, 1000*float(_t_i))
+        t_use    = min(t_use,    1000*float(_t_u))
+    else:
+        print(f"{' '+module :<24}{t_import :>16.1f}{t_use :>16.1f}{root_loaded :>14}")
+
+print("\n ============================================ \n")
@@ -0,0 +1,63 @@
+from eventFlow import *
+from columnarStore import ColumnarStore, build_store_for_flow
+from processorNumPy import UprootInput
+import time
+
+
+##########################################
+# Conversion of the input branches of a flow to a ColumnarStore, and reading time: ROOT file vs store
+#
+# > source setup ; python tests/build_store_NANOAOD.py
+#
+# The store is re-written only if the ROOT file changed or some branches needed by the flow are missing
+
+file_name  = "../test_data/OpenData_CMS-DA1BF301-762C-5048-A9EB-AB534069FB4B.root"
+tree_name  = "Events"
+store_dir  = "store_OpenData_CMS"
+batch_size = 1000000
+
+
+##########################################
+# FLOW
+
+flow = SampleProcessing("flowTest")
+
+flow.loadFlowFromFile("flow_OpenData_CMS.json")
+
+
+##########################################
+# Conversion
+
+_t_1  = time.time()
+store = build_store_for_flow(flow, store_dir, file_name, tree_name, batch_size=batch_size)
+_t_2  = time.time()
+
+
+##########################################
+# Reading all the branches (batches)
+
+def read_all(source, branches):
+    n_values = 0
+    for start in range(0, source.n_events, batch_size):
+        batch = source.read(branches, start, min(start+batch_size, source.n_events))
+        for b in batch.values():
+            n_values += len(b.values) if hasattr(b, "offsets") else len(b)
+    return n_values
+
+
+branches = sorted(store.branches)
+
+_t_3 = time.time()
+n_root  = read_all(UprootInput(file_name, tree_name), branches)
+_t_4 = time.time()
+n_store = read_all(ColumnarStore(store_dir), branches)
+_t_5 = time.time()
+
+
+print("\n ================================== TIMING == \n")
+print(" branches          =  ", len(branches), "  ", branches)
+print(" events            =  ", store.n_events)
+print(" t_build_store     =  ", (_t_2 - _t_1))
+print(" t_read_root       =  ", (_t_4 - _t_3), "   (", n_root,  " values )")
+print(" t_read_store      =  ", (_t_5 - _t_4), "   (", n_store, " values )")
+print("\n ============================================ \n")
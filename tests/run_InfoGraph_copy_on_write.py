@@ -0,0 +1,72 @@
+from infoGraph import InfoGraph
+from synthetic_events import Checks
+
+
+##########################################
+# Copy-on-write sub-graph extraction (no ROOT, no input file needed)
+#
+# > source setup ; python tests/run_InfoGraph_copy_on_write.py
+#
+# - the views of a sub-graph are the objects of the graph it has been extracted from
+# - a view changed through own_view() is copied first, whichever graph changes it (the sub-graph or
+#   the graph it has been extracted from): the other graph is never modified
+
+
+def make_graph():
+
+    g = InfoGraph("AG")
+    g.addNode("Muon_pt")
+    g.addNode("nMuon")
+    g.addNode("ptSum",     ["Muon_pt"],          "Sum(Muon_pt)")
+    g.addNode("ptMean",    ["ptSum", "nMuon"],   "ptSum / nMuon")
+    g.addNode("ptMean2",   ["ptMean"],           "ptMean * 2")
+    return g
+
+
+print("[run_InfoGraph_copy_on_write] start")
+
+results = []
+
+# Parent changed after the extraction (e.g. AG.evaluate_all_id_codes() with a processor's dag alive)
+g   = make_graph()
+dag = g.subGraphTo(["ptMean2"])
+results.append(("views shared at extraction",                  all(dag.views[v] is g.views[v] for v in dag.views)))
+
+g.evaluate_all_id_codes()
+results.append(("parent id_codes evaluated",                   g.views["ptMean"].has_id_code()))
+results.append(("sub-graph not changed by the parent",         not any(dag.views[v].has_id_code() for v in dag.views)))
+results.append(("parent views copied",                         not any(dag.views[v] is g.views[v] for v in dag.views)))
+
+_iv = dag.views["ptMean"]
+results.append(("sub-graph keeps the original (no copy)",      dag.own_view("ptMean") is _iv))
+
+# Sub-graph changed after the extraction
+g   = make_graph()
+dag = g.subGraphTo(["ptMean2"])
+dag.own_view("ptMean").set_algorithm("ptSum / (nMuon + 1)")
+dag.activate("ptSum")
+results.append(("parent not changed by the sub-graph",         (g.views["ptMean"].algorithm == "ptSum / nMuon") and not g.views["ptSum"].is_active()))
+results.append(("sub-graph changed",                           (dag.views["ptMean"].algorithm == "ptSum / (nMuon + 1)") and dag.views["ptSum"].is_active()))
+
+# Sub-graph of a sub-graph: the three graphs are independent
+g    = make_graph()
+dag  = g.subGraphTo(["ptMean2"])
+dag2 = dag.subGraphTo(["ptMean"])
+dag.own_view("ptSum").set_algorithm("Sum(Muon_pt) + 0")
+results.append(("sub-graph of a sub-graph",                    (g.views["ptSum"].algorithm == "Sum(Muon_pt)") and (dag2.views["ptSum"].algorithm == "Sum(Muon_pt)")))
+results.append(("sub-graph of a sub-graph still shared",       dag2.views["ptSum"] is g.views["ptSum"]))
+
+# Views removed: no more shared
+g   = make_graph()
+dag = g.subGraphTo(["ptMean2"])
+_iv = g.views["ptMean2"]
+dag.removeView("ptMean2")
+results.append(("view removed from the sub-graph: not copied", g.own_view("ptMean2") is _iv))
+
+
+
+checks = Checks()
+for label, ok in results:
+    checks.check(label, ok)
+
+checks.exit()
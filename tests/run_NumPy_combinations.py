@@ -0,0 +1,142 @@
+from eventFlow import SampleProcessing
+from processorNumPy import Processor_NumPy, Jagged
+from processorNumba import ProcessorNumba
+from synthetic_events import synthetic_events, reference_histos, fill, Checks
+import numpy as np
+import itertools
+import tempfile
+import sys
+
+
+##########################################
+# Combinations on synthetic events (no ROOT, no input file needed)
+#
+# > source setup ; python tests/run_NumPy_combinations.py [n_events]
+#
+# - legs from the same collection (no repetitions, no permutations) and from different collections,
+#   with and without a predicate evaluated in the combinatorics kernel (CombinationsIf)
+# - the candidates built by the NumPy and Numba backends are checked against a plain python reference
+#   (itertools): indices of each leg in the order of the C++ kernel, and the histograms of the legs
+
+n_events = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+
+
+# name : (legs, predicate, reference predicate on (muons, jets, candidate))
+combinations = {
+    "MuMu"    : (["SelectedMuon", "SelectedMuon"],          "MuMu0_charge != MuMu1_charge", lambda mu, jet, c: mu["charge"][c[0]] != mu["charge"][c[1]]),
+    "MuMuAll" : (["SelectedMuon", "SelectedMuon"],          "",                             None),
+    "MuJet"   : (["SelectedMuon", "Jet"],                   "MuJet0_pt > MuJet1_pt",        lambda mu, jet, c: mu["pt"][c[0]] > jet["pt"][c[1]]),
+    "MuMuJet" : (["SelectedMuon", "SelectedMuon", "Jet"],   "",                             None),
+}
+
+
+flow = SampleProcessing("flowCombinations", 'dictionaries/nanoAOD_nanoAOD_id_OpenData.json')
+
+flow.DefineEventWeight("Weight_normalisation", "1.0f")
+
+flow.SubCollection("SelectedMuon", "Muon", sel="Muon_pt > 10.")
+
+for name, (legs, predicate, _) in combinations.items():
+    flow.Combinations(name, legs, predicate)
+
+targetList = []
+for name, (legs, _, _) in combinations.items():
+    flow.DefineHisto1D("n"+name+"0", [], 20, 0, 20)
+    targetList.append("HISTO_n"+name+"0")
+    for leg in range(len(legs)):
+        flow.DefineHisto1D("indices_"+name+str(leg), [], 10, 0, 10)
+        flow.DefineHisto1D(name+str(leg)+"_pt",      [], 50, 0.0, 150.0)
+        targetList += ["HISTO_indices_"+name+str(leg), "HISTO_"+name+str(leg)+"_pt"]
+
+flow.BuildFlow()
+flow.SetTargets(targetList)
+
+
+
+##########################################
+# Synthetic events
+
+arrays  = synthetic_events(n_events, {"Muon" : ["pt", "charge"], "Jet" : ["pt"]}, seed=97531, means={"Muon" : 2.5})
+n_muons = arrays["nMuon"]
+n_jets  = arrays["nJet"]
+
+
+print("[run_NumPy_combinations] start")
+
+processor = Processor_NumPy("NumPy_combinations", flow, input_arrays=arrays, batch_size=max(1, n_events//3))
+histos    = processor.RunProcessor()
+
+with tempfile.TemporaryDirectory() as cache_dir:
+    processor_numba = ProcessorNumba("Numba_combinations", flow, input_arrays=arrays, batch_size=max(1, n_events//3), cache_dir=cache_dir)
+    histos_numba    = processor_numba.RunProcessor()
+    kernel          = processor_numba.kernel_module
+
+
+
+##########################################
+# Reference: candidates of each event from itertools (lexicographic order = nested loops of the kernel)
+
+pt, charge, jet_pt = [arrays[b].tolist() for b in ["Muon_pt", "Muon_charge", "Jet_pt"]]
+
+def reference_candidates(i, legs, reference_predicate):
+    sel  = [j for j in range(n_muons[i]) if pt[i][j] > 10.]
+    mu   = {"pt" : [pt[i][j] for j in sel], "charge" : [charge[i][j] for j in sel]}
+    jet  = {"pt" : jet_pt[i]}
+    size = {"SelectedMuon" : len(sel), "Jet" : n_jets[i]}
+
+    candidates = []
+    for c in itertools.product(*[range(size[l]) for l in legs]):
+        # same collection: strictly increasing indices
+        if any(c[a] >= c[b] for a, b in itertools.combinations(range(len(legs)), 2) if legs[a] == legs[b]):
+            continue
+        if (reference_predicate is None) or reference_predicate(mu, jet, c):
+            candidates.append(c)
+    return candidates, mu, jet
+
+
+reference = reference_histos(histos)
+layout_ok = {(backend, name) : True for backend in ("NumPy", "Numba") for name in combinations}
+
+sel_pt     = [[p for p in pt[i] if p > 10.] for i in range(n_events)]
+sel_charge = [[q for p, q in zip(pt[i], charge[i]) if p > 10.] for i in range(n_events)]
+
+# NumPy: the view evaluated on the first n_layout events at once
+n_layout  = min(500, n_events)
+np_inputs = {"nSelectedMuon"       : np.array([len(x) for x in sel_pt[:n_layout]]),
+             "nJet"                : n_jets[:n_layout],
+             "SelectedMuon_pt"     : Jagged.from_lists(sel_pt[:n_layout],     dtype=np.float32),
+             "SelectedMuon_charge" : Jagged.from_lists(sel_charge[:n_layout], dtype=np.int32),
+             "Jet_pt"              : Jagged.from_lists(jet_pt[:n_layout],     dtype=np.float32)}
+
+for name, (legs, _, reference_predicate) in combinations.items():
+
+    # Candidates of the Numba kernel function (one event at a time) and of the NumPy view (all the events)
+    _f_indices = getattr(kernel, "func__indices_"+name)
+    _origins   = flow.AG.views["indices_"+name].origins
+    _np        = processor.evaluate(processor.codes["indices_"+name], {o : np_inputs[o] for o in _origins}, "indices_"+name)
+
+    for i in range(n_events):
+        candidates, mu, jet = reference_candidates(i, legs, reference_predicate)
+
+        fill(reference, histos, "HISTO_n"+name+"0", len(candidates))
+        for leg, l in enumerate(legs):
+            for c in candidates:
+                fill(reference, histos, "HISTO_indices_"+name+str(leg), c[leg])
+                fill(reference, histos, "HISTO_"+name+str(leg)+"_pt",   (mu if l == "SelectedMuon" else jet)["pt"][c[leg]])
+
+        if i < n_layout:
+            _arguments = {o : (np_inputs[o][i] if not isinstance(np_inputs[o], Jagged) else np_inputs[o].values[np_inputs[o].offsets[i]:np_inputs[o].offsets[i+1]]) for o in _origins}
+            _r = _f_indices(*[_arguments[o] for o in _origins])
+            layout_ok[("Numba", name)] &= ([tuple(int(x) for x in c) for c in _r.T] == candidates)
+            layout_ok[("NumPy", name)] &= ([tuple(int(x) for x in c) for c in _np.values[_np.offsets[i]:_np.offsets[i+1]]] == candidates)
+
+
+checks = Checks()
+for h in histos:
+    checks.check("NumPy  "+h,              np.allclose(histos[h].sumw, reference[h]))
+for h in histos_numba:
+    checks.check("Numba  "+h,              np.allclose(histos_numba[h].sumw, reference[h]))
+for (backend, name), ok in layout_ok.items():
+    checks.check(f"{backend :<7}{'candidates in kernel order   '}{name}",    ok)
+
+checks.exit()
@@ -0,0 +1,113 @@
+from eventFlow import SampleProcessing
+from processorNumPy import Processor_NumPy
+from infoGraph import InfoGraph
+from histoBooking import variable_bins
+from synthetic_events import synthetic_events, Checks
+import numpy as np
+import sys
+
+
+##########################################
+# Histogram booking: 2D, 3D, profiles and variable binning on synthetic events (no ROOT, no input file needed)
+#
+# > source setup ; python tests/run_NumPy_histos.py [n_events]
+#
+# - the histograms filled by the NumPy backend are compared to np.histogramdd on the same events
+#   (in-range bins - the flow bins follow the TH1 conventions)
+# - the definitions stored on the views survive the json and binary round trips of the graph
+
+n_events = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+
+met_edges = [0.0, 10.0, 20.0, 35.0, 60.0, 100.0, 200.0]
+
+
+flow = SampleProcessing("flowHistos", 'dictionaries/nanoAOD_nanoAOD_id_OpenData.json')
+
+flow.DefineEventWeight("Weight_normalisation", "0.5f")
+
+flow.SubCollection("SelectedMuon", "Muon", sel="Muon_pfRelIso04_all < 0.25 && Muon_pt > 20. && abs(Muon_eta) < 2.4")
+flow.Selection("twoSelectedMuons", "nSelectedMuon >= 2")
+
+flow.DefineHisto1D("MET_pt", [], edges=met_edges)
+flow.DefineHisto2D("SelectedMuon_pt", "SelectedMuon_eta", ["twoSelectedMuons"], [20, 20.0, 120.0], [12, -2.4, 2.4])
+flow.DefineHisto3D("SelectedMuon_pt", "SelectedMuon_eta", "MET_pt", [], [10, 20.0, 120.0], [6, -2.4, 2.4], variable_bins(met_edges))
+flow.DefineProfile1D("PV_npvsGood", "MET_pt", [], [10, -0.5, 39.5])
+flow.DefineProfile2D("SelectedMuon_eta", "PV_npvsGood", "SelectedMuon_pt", [], [6, -2.4, 2.4], [4, -0.5, 39.5])
+
+flow.BuildFlow()
+
+targets = ["HISTO_MET_pt",
+           "HISTO2D_SelectedMuon_pt_vs_SelectedMuon_eta__twoSelectedMuons",
+           "HISTO3D_SelectedMuon_pt_vs_SelectedMuon_eta_vs_MET_pt",
+           "PROFILE_MET_pt_vs_PV_npvsGood",
+           "PROFILE2D_SelectedMuon_pt_vs_SelectedMuon_eta_vs_PV_npvsGood"]
+
+flow.SetTargets(targets)
+
+
+
+##########################################
+# Synthetic events
+
+arrays = synthetic_events(n_events, variables=["PV_npvsGood", "MET_pt"], seed=4321)
+
+
+print("[run_NumPy_histos] start")
+
+histos = Processor_NumPy("NumPy_histos", flow, input_arrays=arrays, batch_size=max(1, n_events//3)).RunProcessor()
+
+
+
+##########################################
+# Reference
+
+_mu     = arrays["Muon_pt"]
+_sel    = (arrays["Muon_pfRelIso04_all"].values < 0.25) & (_mu.values > 20.) & (np.abs(arrays["Muon_eta"].values) < 2.4)
+_event  = _mu.event_index[_sel]
+mu_pt   = _mu.values[_sel].astype(np.float64)
+mu_eta  = arrays["Muon_eta"].values[_sel].astype(np.float64)
+n_sel   = np.bincount(_event, minlength=n_events)
+met     = arrays["MET_pt"].astype(np.float64)
+npv     = arrays["PV_npvsGood"].astype(np.float64)
+
+def edges(n, a, b):    return np.linspace(a, b, n+1)
+
+_two    = n_sel[_event] >= 2
+
+reference = {
+    targets[0] : (np.histogramdd([met],                               [met_edges],                                                 weights=np.full(n_events, 0.5))[0], None),
+    targets[1] : (np.histogramdd([mu_pt[_two], mu_eta[_two]],         [edges(20, 20., 120.), edges(12, -2.4, 2.4)],                weights=np.full(_two.sum(), 0.5))[0], None),
+    targets[2] : (np.histogramdd([mu_pt, mu_eta, met[_event]],        [edges(10, 20., 120.), edges(6, -2.4, 2.4), met_edges],      weights=np.full(len(mu_pt), 0.5))[0], None),
+    targets[3] : (np.histogramdd([npv],                               [edges(10, -0.5, 39.5)],                                     weights=np.full(n_events, 0.5))[0],
+                  np.histogramdd([npv],                               [edges(10, -0.5, 39.5)],                                     weights=0.5*met)[0]),
+    targets[4] : (np.histogramdd([mu_eta, npv[_event]],               [edges(6, -2.4, 2.4), edges(4, -0.5, 39.5)],                 weights=np.full(len(mu_pt), 0.5))[0],
+                  np.histogramdd([mu_eta, npv[_event]],               [edges(6, -2.4, 2.4), edges(4, -0.5, 39.5)],                 weights=0.5*mu_pt)[0]),
+}
+
+
+
+checks = Checks(width=66, n_values=5)
+
+for h, (sumw, sumwy) in reference.items():
+
+    _h     = histos[h]
+    inner  = tuple(slice(1, -1) for _ in _h.shape)
+    ok     = np.allclose(_h.sumw.reshape(_h.shape)[inner], sumw)
+    if sumwy is not None:
+        ok = ok and np.allclose(_h.sumwy.reshape(_h.shape)[inner], sumwy)
+
+    checks.check(h, ok, _h.kind, str(_h.shape), _h.integral(), sumw.sum())
+
+
+# Definitions on the views: json and binary round trips
+for fmt in ("json", "binary"):
+
+    g = InfoGraph("copy")
+    if fmt == "json":
+        g.configure_from_info_dictionary(flow.AG.get_info_dictionary())
+    else:
+        g.configure_from_binary(flow.AG.get_binary())
+
+    checks.check("views histo ("+fmt+")", all(g.views[h].histo == flow.AG.views[h].histo for h in targets))
+
+checks.exit()
@@ -0,0 +1,78 @@
+from eventFlow import SampleProcessing
+from processorNumPy import Processor_NumPy
+from costModel import build_cost_model, save_cost_model, load_cost_model, reorder_selections
+from synthetic_events import synthetic_events, Checks
+import numpy as np
+import time
+import sys
+
+
+##########################################
+# Selection reordering on synthetic events (no ROOT, no input file needed)
+#
+# > source setup ; python tests/run_NumPy_reorder.py [n_events]
+#
+# - sample run: cut-flow (pass fractions) -> cost model saved to cost_model_synthetic.json
+# - production run: cost model loaded, independent selections of the regions reordered
+#   (the most rejecting first) - the histograms must be the same of the sample run
+
+n_events = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+
+
+def make_flow(name):
+
+    flow = SampleProcessing(name, 'dictionaries/nanoAOD_nanoAOD_id_OpenData.json')
+
+    flow.DefineEventWeight("Weight_normalisation", "1.0f")
+
+    flow.SubCollection("SelectedMuon", "Muon", sel="Muon_pfRelIso04_all < 0.25 && Muon_pt > 20. && abs(Muon_eta) < 2.4")
+
+    # Independent selections: ranked in order of definition, the last one rejects most of the events
+    flow.Selection("atLeastOneMuon",   "nSelectedMuon >= 1")
+    flow.Selection("goodVertex",       "PV_npvsGood > 0")
+    flow.Selection("highMET",          "MET_pt > 80.")
+
+    flow.Define("SelectedMuon_ptSum", "Sum(SelectedMuon_pt)", requires=["atLeastOneMuon", "goodVertex", "highMET"])
+
+    flow.DefineHisto1D("SelectedMuon_ptSum", ["atLeastOneMuon", "goodVertex", "highMET"], 100, 0.0, 300.0)
+    flow.DefineHisto1D("MET_pt",             ["goodVertex", "highMET"],                   100, 0.0, 300.0)
+
+    flow.BuildFlow()
+    flow.SetTargets(["HISTO_SelectedMuon_ptSum__atLeastOneMuon__goodVertex__highMET", "HISTO_MET_pt__goodVertex__highMET"])
+
+    return flow
+
+
+
+##########################################
+# Synthetic events
+
+arrays = synthetic_events(n_events, variables=["PV_npvsGood", "MET_pt"])
+
+
+print("[run_NumPy_reorder] start")
+
+# Sample run
+flow      = make_flow("flowSample")
+processor = Processor_NumPy("NumPy_sample", flow, input_arrays=arrays, batch_size=max(1, n_events//3))
+_t_0      = time.time()
+sample    = processor.RunProcessor()
+_t_1      = time.time()
+
+save_cost_model(build_cost_model(processor.cutflow_table), "cost_model_synthetic.json")
+
+# Production run
+flow      = make_flow("flowProduction")
+reorder_selections(flow, load_cost_model("cost_model_synthetic.json"))
+_t_2      = time.time()
+histos    = Processor_NumPy("NumPy_production", flow, input_arrays=arrays, batch_size=max(1, n_events//3)).RunProcessor()
+_t_3      = time.time()
+
+
+
+checks = Checks(width=60, n_values=2)
+for h, _h in sample.items():
+    checks.check(h, np.allclose(_h.sumw, histos[h].sumw), _h.integral(), histos[h].integral())
+print(f"\n{' regions reordered : '}{len(flow.selection_order)}{'   run : '}{_t_1-_t_0 :.3f}{' s -> '}{_t_3-_t_2 :.3f}{' s'}")
+
+checks.exit(len(flow.selection_order) > 0)
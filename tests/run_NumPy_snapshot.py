@@ -0,0 +1,115 @@
+from eventFlow import SampleProcessing
+from processorNumPy import Processor_NumPy
+from columnarStore import ColumnarStore
+from infoGraph import InfoGraph
+from synthetic_events import synthetic_events, Checks
+import numpy as np
+import shutil
+import sys
+
+
+##########################################
+# Snapshot (skim) on synthetic events (no ROOT, no input file needed)
+#
+# > source setup ; python tests/run_NumPy_snapshot.py [n_events]
+#
+# - the events with two selected muons are written once (input branches + a derived column) in the same
+#   event loop of the histograms
+# - a second flow runs on the skim (input_store) and fills the same histograms of the first one
+# - the varied snapshot (scaled MET) is written to skim__metUp with the same branches
+# - the definitions stored on the views survive the json and binary round trips of the graph
+
+n_events = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+
+skim_file = "skim_twoMuons.root"      # NumPy backend: ColumnarStore in skim_twoMuons/
+scale     = 1.2
+
+inputs    = ["nMuon", "Muon_pt", "Muon_eta", "Muon_pfRelIso04_all", "MET_pt"]
+
+
+def make_flow(name, skim=True):
+
+    flow = SampleProcessing(name, 'dictionaries/nanoAOD_nanoAOD_id_OpenData.json')
+
+    flow.DefineEventWeight("Weight_normalisation", "0.5f")
+
+    flow.SubCollection("SelectedMuon", "Muon", sel="Muon_pfRelIso04_all < 0.25 && Muon_pt > 20. && abs(Muon_eta) < 2.4")
+    flow.Selection("twoSelectedMuons", "nSelectedMuon >= 2")
+
+    flow.Define("SelectedMuon_ptSum", "Sum(SelectedMuon_pt)", requires=["twoSelectedMuons"])
+
+    flow.DefineHisto1D("MET_pt",             ["twoSelectedMuons"], 50, 0.0, 200.0)
+    flow.DefineHisto1D("SelectedMuon_ptSum", ["twoSelectedMuons"], 50, 0.0, 400.0)
+
+    targets = ["HISTO_MET_pt__twoSelectedMuons", "HISTO_SelectedMuon_ptSum__twoSelectedMuons"]
+
+    if skim:
+        flow.DefineSnapshot("twoMuons", inputs+["SelectedMuon_ptSum"], ["twoSelectedMuons"], file_name=skim_file)
+        flow.Variation("metUp", "MET_pt", "MET_pt * "+str(scale)+"f")
+        targets.append("SNAPSHOT_twoMuons")
+
+    flow.BuildFlow()
+    flow.SetTargets(targets)
+
+    return flow
+
+
+
+##########################################
+# Synthetic events
+
+arrays = synthetic_events(n_events, variables=["MET_pt"], seed=2468)
+counts = arrays["nMuon"]
+
+
+print("[run_NumPy_snapshot] start")
+
+for d in ("skim_twoMuons", "skim_twoMuons__metUp"):
+    shutil.rmtree(d, ignore_errors=True)
+
+flow      = make_flow("flowSkim")
+processor = Processor_NumPy("NumPy_skim", flow, input_arrays=arrays, batch_size=max(1, n_events//3))
+histos    = processor.RunProcessor()
+
+flow_skim   = make_flow("flowOnSkim", skim=False)
+histos_skim = Processor_NumPy("NumPy_on_skim", flow_skim, input_store="skim_twoMuons", batch_size=max(1, n_events//7)).RunProcessor()
+
+
+
+##########################################
+# Reference
+
+_sel    = (arrays["Muon_pfRelIso04_all"].values < 0.25) & (arrays["Muon_pt"].values > 20.) & (np.abs(arrays["Muon_eta"].values) < 2.4)
+n_sel   = np.bincount(arrays["Muon_pt"].event_index[_sel], minlength=n_events)
+pt_sum  = np.bincount(arrays["Muon_pt"].event_index[_sel], weights=arrays["Muon_pt"].values[_sel], minlength=n_events)
+events  = np.nonzero(n_sel >= 2)[0]
+
+store   = ColumnarStore("skim_twoMuons")
+skim    = store.read(list(store.branches), 0, store.n_events)
+varied  = ColumnarStore("skim_twoMuons__metUp")
+skim_up = varied.read(["MET_pt"], 0, varied.n_events)
+
+
+
+checks = Checks()
+
+checks.check(f"skim events ({store.n_events} of {n_events})",      store.n_events == len(events) == processor.snapshot_events["SNAPSHOT_twoMuons"])
+checks.check("skim branches",                                      sorted(store.branches) == sorted(inputs+["SelectedMuon_ptSum"]))
+checks.check("skim MET_pt",                                        np.array_equal(skim["MET_pt"], arrays["MET_pt"][events]))
+checks.check("skim Muon_pt (jagged, offsets of nMuon)",            skim["Muon_pt"].tolist() == arrays["Muon_pt"].take_events(events).tolist())
+checks.check("skim nMuon",                                         np.array_equal(skim["nMuon"], counts[events]))
+checks.check("skim SelectedMuon_ptSum",                            np.allclose(skim["SelectedMuon_ptSum"], pt_sum[events], rtol=1e-5))
+checks.check("varied skim MET_pt (metUp)",                         np.allclose(skim_up["MET_pt"], scale*arrays["MET_pt"][events], rtol=1e-6))
+
+for h in histos_skim:
+    checks.check("histogram on the skim   "+h,                    np.allclose(histos_skim[h].sumw, histos[h].sumw) and (histos_skim[h].entries == histos[h].entries))
+
+for fmt in ("json", "binary"):
+    g = InfoGraph("copy")
+    if fmt == "json":
+        g.configure_from_info_dictionary(flow.AG.get_info_dictionary())
+    else:
+        g.configure_from_binary(flow.AG.get_binary())
+    checks.check("views snapshot ("+fmt+")",                        all(g.views[s].snapshot == flow.AG.views[s].snapshot for s in ("SNAPSHOT_twoMuons", "SNAPSHOT_twoMuons__metUp")))
+
+checks.exit()
@@ -0,0 +1,168 @@
+from eventFlow import SampleProcessing
+from processorNumPy import Processor_NumPy
+from graphOptimizer import fold_constants
+from synthetic_events import synthetic_events, reference_histos, fill, Checks
+import numpy as np
+import tempfile
+import os
+import sys
+
+
+##########################################
+# NumPy backend on synthetic events (no ROOT, no input file needed)
+#
+# > source setup ; python tests/run_NumPy_synthetic.py [n_events]
+#
+# - the flow is written in the NumPy expression dialect (see processorNumPy.py)
+# - the histograms are checked against a plain python loop over the same events
+# - the cut-flow yields are weighted with the weight of the region of each selection (the muon efficiency weight
+#   applies after twoSelectedMuons) and the targets of the flow are not modified by the processor
+# - the constant weights are folded with the C promotion rules (Weight_base_1 = 1.0f), a float identity
+#   factor of a view which is not a region weight is kept (nMuon * 1.0f is a float)
+# - the flow is saved and loaded back (json and binary): the features of the derived collections not used yet
+#   (lazy views) are still defined by their code after the round trip
+
+n_events = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+
+
+print("[run_NumPy_synthetic] start")
+
+flow = SampleProcessing("flowNumPy", 'dictionaries/nanoAOD_nanoAOD_id_OpenData.json')
+
+
+flow.DefineEventWeight("Weight_normalisation",   "1.0f")
+flow.DefineEventWeight("Weight_base_1",          "1/2*1.0f + 1.0f")     # folded as C: 1/2 is an int division -> 1.0f
+
+flow.Define("Muon_iso", "Muon_pfRelIso04_all")
+
+flow.SubCollection("SelectedMuon", "Muon", sel="Muon_iso < 0.25 && Muon_tightId && Muon_pt > 20. && abs(Muon_eta) < 2.4")
+
+flow.DefineHisto1D("nSelectedMuon", [], 10, 0, 10)
+
+flow.Selection("twoSelectedMuons", "nSelectedMuon==2")
+
+flow.DefineEventWeight("Weight_Mu_selection_eff", "0.95f", requires=["twoSelectedMuons"])
+
+flow.Define("SelectedMuon_chargeSum", "Sum(SelectedMuon_charge)", requires=["twoSelectedMuons"])
+
+flow.Selection("twoOppositeSignMuons", "SelectedMuon_chargeSum == 0")
+
+flow.Define("indices_SelectedMuon_pt_sorted", "Argsort(-SelectedMuon_pt)", requires=["twoOppositeSignMuons"])
+
+flow.ObjectAt("LeadMuon", "SelectedMuon", "indices_SelectedMuon_pt_sorted[0]")
+
+flow.Selection("etaLeadMuonPos", "LeadMuon_eta > 0.0")
+flow.Selection("etaLeadMuonNeg", "LeadMuon_eta <= 0.0")
+
+flow.DefineHisto1D("SelectedMuon_pt", ["twoOppositeSignMuons"], 100, 0.0, 200.0)
+flow.DefineHisto1D("LeadMuon_pt",     ['etaLeadMuonPos'],       100, 0.0, 200.0)
+flow.DefineHisto1D("LeadMuon_pt",     ['etaLeadMuonNeg'],       100, 0.0, 200.0)
+
+flow.BuildFlow()
+
+targetList = ["HISTO_nSelectedMuon",
+              "HISTO_SelectedMuon_pt__twoOppositeSignMuons",
+              "HISTO_LeadMuon_pt__etaLeadMuonPos",
+              "HISTO_LeadMuon_pt__etaLeadMuonNeg"]
+
+flow.SetTargets(targetList)
+
+
+
+##########################################
+# Synthetic events
+
+arrays = synthetic_events(n_events, {"Muon" : ["pt", "eta", "charge", "pfRelIso04_all", "tightId"]})
+counts = arrays["nMuon"]
+
+
+processor = Processor_NumPy("NumPy_synthetic", flow, input_arrays=arrays, batch_size=max(1, n_events//3))
+histos    = processor.RunProcessor()
+
+
+
+##########################################
+# Reference: plain python loop
+
+reference = reference_histos(histos)
+passed    = {s : 0 for s in ["twoSelectedMuons", "twoOppositeSignMuons", "etaLeadMuonPos", "etaLeadMuonNeg"]}
+weights   = {"twoSelectedMuons" : 1.0, "twoOppositeSignMuons" : 0.95, "etaLeadMuonPos" : 0.95, "etaLeadMuonNeg" : 0.95}
+
+pt, eta, charge, iso, tight = [arrays[b].tolist() for b in ["Muon_pt", "Muon_eta", "Muon_charge", "Muon_pfRelIso04_all", "Muon_tightId"]]
+
+for i in range(n_events):
+    sel = [j for j in range(counts[i]) if iso[i][j] < 0.25 and tight[i][j] and pt[i][j] > 20. and abs(eta[i][j]) < 2.4]
+    fill(reference, histos, "HISTO_nSelectedMuon", len(sel), 1.0)
+
+    if len(sel) != 2:
+        continue
+    passed["twoSelectedMuons"] += 1
+
+    if sum(charge[i][j] for j in sel) != 0:
+        continue
+    passed["twoOppositeSignMuons"] += 1
+
+    for j in sel:
+        fill(reference, histos, "HISTO_SelectedMuon_pt__twoOppositeSignMuons", pt[i][j], 0.95)
+
+    lead = max(sel, key=lambda j: pt[i][j])
+    fill(reference, histos, "HISTO_LeadMuon_pt__etaLeadMuonPos" if eta[i][lead] > 0.0 else "HISTO_LeadMuon_pt__etaLeadMuonNeg", pt[i][lead], 0.95)
+    passed["etaLeadMuonPos" if eta[i][lead] > 0.0 else "etaLeadMuonNeg"] += 1
+
+
+
+
+##########################################
+# Save & load: SelectedMuon_dxy is a lazy view (not used by the flow) - it must not become an input view
+
+round_trip = {}
+with tempfile.TemporaryDirectory() as _dir:
+    for fmt in ("json", "binary"):
+        _file = os.path.join(_dir, "flow."+fmt)
+        _flow = SampleProcessing("flowLoaded", 'dictionaries/nanoAOD_nanoAOD_id_OpenData.json')
+        if fmt == "json":
+            flow.saveFlowToFile(_file)
+            _flow.loadFlowFromFile(_file)
+        else:
+            flow.saveFlowToBinaryFile(_file)
+            _flow.loadFlowFromBinaryFile(_file)
+        _flow.Define("SelectedMuon_dxy2", "SelectedMuon_dxy*2")
+        _view = _flow.AG.views["SelectedMuon_dxy"]
+        round_trip[fmt] = (not flow.AG.isNodeDefined("SelectedMuon_dxy")) and (_view.algorithm != 'NONE') and (len(_view.origins) > 0)
+
+
+
+##########################################
+# Folding of the products: the type of the result is kept (an int times 1.0f stays a float)
+
+flow_fold = SampleProcessing("flowFold", 'dictionaries/nanoAOD_nanoAOD_id_OpenData.json')
+flow_fold.DefineEventWeight("Weight_normalisation", "1.0f")
+flow_fold.Define("nMuonFloat", "nMuon * 1.0f")
+flow_fold.Define("nMuonHalf",  "nMuonFloat / 2")
+flow_fold.Define("ptScaled",   "Muon_pt * 2 * 0.5f")
+flow_fold.DefineHisto1D("nMuonHalf", [], 10, 0, 10)
+flow_fold.DefineHisto1D("ptScaled",  [], 10, 0, 10)
+flow_fold.BuildFlow()
+flow_fold.SetTargets(["HISTO_nMuonHalf", "HISTO_ptScaled"])
+
+dag_fold = flow_fold.AG.subGraphTo(flow_fold.targetList)
+fold_constants(flow_fold, dag_fold, targets=flow_fold.targetList)
+folded   = {"nMuonFloat" : "nMuon * 1.0f", "ptScaled" : "Muon_pt * 1.0f"}
+
+
+
+checks = Checks(width=50, n_values=2)
+for h, _h in histos.items():
+    checks.check(h,                             np.allclose(_h.sumw, reference[h]),                 _h.integral(),      reference[h][1:-1].sum())
+for row in processor.cutflow_table:
+    checks.check("cut-flow "+row['selection'],  row['passed'] == passed[row['selection']],          row['passed'],      passed[row['selection']])
+for row in processor.cutflow_table:
+    sumw = weights[row['selection']] * passed[row['selection']]
+    checks.check("cut-flow sumw "+row['selection'],     np.isclose(row['sumw_passed'], sumw),       row['sumw_passed'], sumw)
+checks.check("targets of the flow unchanged",   flow.targetList == targetList)
+for fmt, ok in round_trip.items():
+    checks.check("lazy view after save & load ("+fmt+")",  ok)
+for v, algorithm in folded.items():
+    checks.check("folded "+v+" = "+dag_fold.views[v].algorithm,  dag_fold.views[v].algorithm == algorithm)
+
+checks.exit()
@@ -0,0 +1,105 @@
+from eventFlow import SampleProcessing
+from analysisTrain import AnalysisTrain
+from processorNumPy import Processor_NumPy
+from synthetic_events import synthetic_events, Checks
+import numpy as np
+import sys
+
+
+##########################################
+# Analysis train on synthetic events (no ROOT, no input file needed)
+#
+# > source setup ; python tests/run_NumPy_train.py [n_events]
+#
+# - two flows with overlapping object definitions (same muon selection, different names)
+#   merged in one flow: the shared views are computed once, in one event loop
+# - the histograms of each flow (split_result) are checked against a separate run of the flow
+# - the views namespaced in the train (<view>__<flow name>) are not added to the dictionary: the view can still
+#   be used by a later definition, and the names are translated
+
+n_events = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+
+
+def make_flow_A():
+
+    flow = SampleProcessing("dimuon", 'dictionaries/nanoAOD_nanoAOD_id_OpenData.json')
+
+    flow.DefineEventWeight("Weight_normalisation", "1.0f")
+
+    flow.SubCollection("SelectedMuon", "Muon", sel="Muon_pfRelIso04_all < 0.25 && Muon_pt > 20. && abs(Muon_eta) < 2.4")
+
+    flow.Selection("twoSelectedMuons", "nSelectedMuon==2")
+
+    flow.Define("SelectedMuon_ptSum", "Sum(SelectedMuon_pt)", requires=["twoSelectedMuons"])
+
+    flow.DefineHisto1D("nSelectedMuon",      [],                    10, 0,   10)
+    flow.DefineHisto1D("SelectedMuon_ptSum", ["twoSelectedMuons"], 100, 0.0, 300.0)
+
+    flow.BuildFlow()
+    flow.SetTargets(["HISTO_nSelectedMuon", "HISTO_SelectedMuon_ptSum__twoSelectedMuons"])
+
+    return flow
+
+
+def make_flow_B():
+
+    flow = SampleProcessing("singlemuon", 'dictionaries/nanoAOD_nanoAOD_id_OpenData.json')
+
+    flow.DefineEventWeight("Weight_normalisation", "1.0f")
+
+    # Same selection of the flow A (other name): computed once in the train
+    flow.SubCollection("GoodMuon", "Muon", sel="Muon_pfRelIso04_all < 0.25 && Muon_pt > 20. && abs(Muon_eta) < 2.4")
+
+    flow.Selection("oneGoodMuon", "nGoodMuon==1")
+
+    flow.DefineEventWeight("Weight_trigger", "0.9f", requires=["oneGoodMuon"])
+
+    flow.DefineHisto1D("GoodMuon_eta", ["oneGoodMuon"], 48, -2.4, 2.4)
+
+    # Same names of a view and of an H1D of the flow A, other definitions: namespaced in the train
+    flow.Define("nSelectedMuon", "nGoodMuon - 1")
+    flow.DefineHisto1D("nSelectedMuon", [], 5, -1, 4)
+
+    flow.BuildFlow()
+    flow.SetTargets(["HISTO_GoodMuon_eta__oneGoodMuon", "HISTO_nSelectedMuon"])
+
+    return flow
+
+
+
+##########################################
+# Synthetic events
+
+arrays = synthetic_events(n_events)
+
+
+print("[run_NumPy_train] start")
+
+reference = {}
+n_columns = 0
+for f in [make_flow_A(), make_flow_B()]:
+    _processor        = Processor_NumPy("NumPy_"+f.name, f, input_arrays=arrays)
+    reference[f.name] = _processor.RunProcessor()
+    n_columns        += _processor.n_columns
+
+train     = AnalysisTrain("train", [make_flow_A(), make_flow_B()])
+processor = Processor_NumPy("NumPy_train", train.flow, input_arrays=arrays, batch_size=max(1, n_events//3))
+histos    = train.split_result(processor.RunProcessor())
+
+# nSelectedMuon__singlemuon is namespaced: nSelectedMuon must not look like an object with a feature
+train.flow.Define("nSelectedMuon3", "nSelectedMuon*3")
+defined    = train.flow.AG.isNodeDefined("nSelectedMuon3")
+translated = train.flow.TranslateGraph(train.flow.AG)
+translated = not any(train.flow.ID.CONVERSION_ERROR in v+iv.algorithm for v, iv in translated.views.items())
+
+
+
+checks = Checks(width=110)
+for f, targets in train.target_names().items():
+    for t, _t in targets.items():
+        checks.check(f"{f+' : '+t :<54}{' ('+_t+')'}",    (t in histos[f]) and np.allclose(histos[f][t].sumw, reference[f][t].sumw))
+checks.check("definition on a namespaced view",           defined)
+checks.check("translation of the namespaced views",       translated)
+print(f"\n{' columns : '}{n_columns}{' (separate runs)  ->  '}{processor.n_columns}{' (train)'}")
+
+checks.exit()
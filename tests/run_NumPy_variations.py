@@ -0,0 +1,116 @@
+from eventFlow import SampleProcessing
+from processorNumPy import Processor_NumPy
+from synthetic_events import synthetic_events, Checks
+import numpy as np
+import sys
+
+
+##########################################
+# Systematic variations on synthetic events (no ROOT, no input file needed)
+#
+# > source setup ; python tests/run_NumPy_variations.py [n_events]
+#
+# - one event loop for the nominal and the varied histograms (see SampleProcessing.Variation)
+# - the varied histograms are checked against separate nominal runs over the varied events
+# - the varied views (<view>__<variation>) are not added to the dictionary: a varied view can still be used
+#   by a definition after BuildFlow, and the varied names are translated
+# - two-step build (event weight and its variation added after the first BuildFlow): the histograms re-defined
+#   and their varied copies are the same as the ones of a single build
+
+n_events = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+
+scale    = 1.1
+eff_up   = 0.97
+
+
+def make_flow(name, variations=True, two_steps=False):
+
+    flow = SampleProcessing(name, 'dictionaries/nanoAOD_nanoAOD_id_OpenData.json')
+
+    flow.DefineEventWeight("Weight_normalisation",   "1.0f")
+
+    flow.SubCollection("SelectedMuon", "Muon", sel="Muon_pfRelIso04_all < 0.25 && Muon_pt > 20. && abs(Muon_eta) < 2.4")
+
+    flow.DefineHisto1D("nSelectedMuon", [], 10, 0, 10)
+
+    flow.Selection("twoSelectedMuons", "nSelectedMuon==2")
+
+    if not two_steps:
+        flow.DefineEventWeight("Weight_Mu_selection_eff", "0.95f", requires=["twoSelectedMuons"])
+
+    flow.Define("SelectedMuon_ptSum", "Sum(SelectedMuon_pt)", requires=["twoSelectedMuons"])
+
+    flow.Selection("highPtSum", "SelectedMuon_ptSum > 60.")
+
+    flow.DefineHisto1D("SelectedMuon_ptSum", ["twoSelectedMuons"], 100, 0.0, 300.0)
+    flow.DefineHisto1D("SelectedMuon_pt",    ["highPtSum"],         100, 0.0, 200.0)
+    flow.DefineHisto1D("SelectedMuon_eta",   ["highPtSum"],          48, -2.4,  2.4)
+
+    if variations:
+        flow.Variation("muonScaleUp", "Muon_pt",                 "Muon_pt * "+str(scale)+"f")
+
+    if two_steps:
+        flow.BuildFlow()
+        flow.DefineEventWeight("Weight_Mu_selection_eff", "0.95f", requires=["twoSelectedMuons"])
+
+    if variations:
+        flow.Variation("effUp",       "Weight_Mu_selection_eff", str(eff_up)+"f")
+
+    flow.BuildFlow()
+
+    flow.SetTargets(["HISTO_nSelectedMuon",
+                     "HISTO_SelectedMuon_ptSum__twoSelectedMuons",
+                     "HISTO_SelectedMuon_pt__highPtSum",
+                     "HISTO_SelectedMuon_eta__highPtSum"])
+
+    return flow
+
+
+
+##########################################
+# Synthetic events
+
+def make_arrays(pt_scale=1.0):    return synthetic_events(n_events, scales={"Muon_pt" : pt_scale})
+
+
+print("[run_NumPy_variations] start")
+
+flow   = make_flow("flowVariations")
+histos = Processor_NumPy("NumPy_variations", flow, input_arrays=make_arrays(), batch_size=max(1, n_events//3)).RunProcessor()
+
+# References: nominal flow on the scaled muons, and nominal histograms with the other efficiency
+scaled  = Processor_NumPy("NumPy_scaled",  make_flow("flowScaled", False),  input_arrays=make_arrays(scale)).RunProcessor()
+nominal = Processor_NumPy("NumPy_nominal", make_flow("flowNominal", False), input_arrays=make_arrays()).RunProcessor()
+
+# Same flow built in two steps
+two_steps = Processor_NumPy("NumPy_two_steps", make_flow("flowTwoSteps", two_steps=True), input_arrays=make_arrays()).RunProcessor()
+
+
+# nSelectedMuon is varied (nSelectedMuon__muonScaleUp): it must not look like an object with a feature
+flow.Define("nSelectedMuon2", "nSelectedMuon*2")
+defined    = flow.AG.isNodeDefined("nSelectedMuon2")
+translated = flow.TranslateGraph(flow.AG)
+translated = not any(flow.ID.CONVERSION_ERROR in v+iv.algorithm for v, iv in translated.views.items())
+
+
+
+checks = Checks(width=70, n_values=2)
+
+def check(h, sumw, reference):
+    checks.check(h, np.allclose(sumw, reference, rtol=1e-4), sumw[1:-1].sum(), reference[1:-1].sum())
+
+for h, _h in nominal.items():
+    check(h, histos[h].sumw, _h.sumw)
+    check(h+"__muonScaleUp", histos[h+"__muonScaleUp"].sumw, scaled[h].sumw)
+
+    # Histograms filled with the efficiency weight are scaled, the others are not varied (same histogram)
+    if h+"__effUp" in histos:
+        check(h+"__effUp", histos[h+"__effUp"].sumw, _h.sumw * eff_up / 0.95)
+
+for h, _h in histos.items():
+    check(h+" (two steps)", two_steps[h].sumw if h in two_steps else np.zeros_like(_h.sumw), _h.sumw)
+
+checks.check("definition on a varied view after BuildFlow",   defined)
+checks.check("translation of the varied views",               translated)
+
+checks.exit()
@@ -0,0 +1,91 @@
+from eventFlow import SampleProcessing
+from processorNumPy import Processor_NumPy
+from processorNumba import ProcessorNumba
+from synthetic_events import synthetic_events, Checks
+import time
+import numpy as np
+import sys
+
+
+##########################################
+# Numba backend on synthetic events (no ROOT, no input file needed)
+#
+# > source setup ; python tests/run_Numba_synthetic.py [n_events]
+#
+# - same flow/events of run_NumPy_synthetic.py: the histograms are checked against the NumPy backend
+# - the Numba processor runs twice: the second one uses the kernel cached on disk (run the script
+#   again to see the cache shared among processes)
+
+n_events = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+
+
+print("[run_Numba_synthetic] start")
+
+flow = SampleProcessing("flowNumba", 'dictionaries/nanoAOD_nanoAOD_id_OpenData.json')
+
+
+flow.DefineEventWeight("Weight_normalisation",   "1.0f")
+flow.DefineEventWeight("Weight_base_1",          "1.0f")
+
+flow.Define("Muon_iso", "Muon_pfRelIso04_all")
+
+flow.SubCollection("SelectedMuon", "Muon", sel="Muon_iso < 0.25 && Muon_tightId && Muon_pt > 20. && abs(Muon_eta) < 2.4")
+
+flow.DefineHisto1D("nSelectedMuon", [], 10, 0, 10)
+
+flow.Selection("twoSelectedMuons", "nSelectedMuon==2")
+
+flow.DefineEventWeight("Weight_Mu_selection_eff", "0.95f", requires=["twoSelectedMuons"])
+
+flow.Define("SelectedMuon_chargeSum", "Sum(SelectedMuon_charge)", requires=["twoSelectedMuons"])
+
+flow.Selection("twoOppositeSignMuons", "SelectedMuon_chargeSum == 0")
+
+flow.Define("indices_SelectedMuon_pt_sorted", "Argsort(-SelectedMuon_pt)", requires=["twoOppositeSignMuons"])
+
+flow.ObjectAt("LeadMuon", "SelectedMuon", "indices_SelectedMuon_pt_sorted[0]")
+
+flow.Selection("etaLeadMuonPos", "LeadMuon_eta > 0.0")
+flow.Selection("etaLeadMuonNeg", "LeadMuon_eta <= 0.0")
+
+flow.DefineHisto1D("SelectedMuon_pt", ["twoOppositeSignMuons"], 100, 0.0, 200.0)
+flow.DefineHisto1D("LeadMuon_pt",     ['etaLeadMuonPos'],       100, 0.0, 200.0)
+flow.DefineHisto1D("LeadMuon_pt",     ['etaLeadMuonNeg'],       100, 0.0, 200.0)
+
+flow.BuildFlow()
+
+targetList = ["HISTO_nSelectedMuon",
+              "HISTO_SelectedMuon_pt__twoOppositeSignMuons",
+              "HISTO_LeadMuon_pt__etaLeadMuonPos",
+              "HISTO_LeadMuon_pt__etaLeadMuonNeg"]
+
+flow.SetTargets(targetList)
+
+
+
+##########################################
+# Synthetic events
+
+arrays = synthetic_events(n_events, {"Muon" : ["pt", "eta", "charge", "pfRelIso04_all", "tightId"]})
+
+
+processor_NumPy = Processor_NumPy("NumPy_synthetic", flow, input_arrays=arrays)
+histos_NumPy    = processor_NumPy.RunProcessor()
+
+t_run = []
+for i in range(2):
+    _t_1      = time.time()
+    processor = ProcessorNumba("Numba_synthetic", flow, input_arrays=arrays, batch_size=max(1, n_events//3))
+    histos    = processor.RunProcessor()
+    t_run.append(time.time() - _t_1)
+
+
+
+checks = Checks(width=50, n_values=2)
+print(" t_run (1st, 2nd)  =  ", t_run)
+print("")
+for h, _h in histos.items():
+    ok = np.allclose(_h.sumw, histos_NumPy[h].sumw) and np.allclose(_h.sumw2, histos_NumPy[h].sumw2) and (_h.entries == histos_NumPy[h].entries)
+    checks.check(h, ok, _h.integral(), histos_NumPy[h].integral())
+
+checks.exit()
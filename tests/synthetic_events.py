@@ -0,0 +1,102 @@
+from processorNumPy import Jagged
+import numpy as np
+import sys
+
+
+##########################################
+# Synthetic events and checks shared by the test drivers (no ROOT, no input file needed)
+#
+#   arrays = synthetic_events(n_events, {"Muon" : ["pt", "eta"]}, ["MET_pt"], seed=12345)
+#
+# - collections: counts drawn from a Poisson distribution (mean per collection), then one jagged array per feature
+# - the branches are drawn in the order of the arguments: the same arguments give the same events
+# - scales: { branch : factor } applied after drawing (e.g. a varied muon scale on the same events)
+#
+#   reference = reference_histos(histos)           # 1D histograms filled in plain python (see fill)
+#
+#   checks = Checks(width=50, n_values=2)         # label column width, number of value columns (OK/FAILED aligned)
+#   checks.check(label, ok, value, reference)     # one row per check
+#   checks.exit()                                 # exit code 1 if any check failed
+
+
+# Distribution of each branch: (rng, n) -> values
+branches = {
+    "Muon_pt"             : lambda rng, n : rng.exponential(30.0, n).astype(np.float32),
+    "Muon_eta"            : lambda rng, n : rng.uniform(-3.0, 3.0, n).astype(np.float32),
+    "Muon_charge"         : lambda rng, n : rng.choice([-1, 1], n).astype(np.int32),
+    "Muon_pfRelIso04_all" : lambda rng, n : rng.exponential(0.2, n).astype(np.float32),
+    "Muon_tightId"        : lambda rng, n : rng.uniform(0, 1, n) < 0.8,
+    "Jet_pt"              : lambda rng, n : rng.exponential(40.0, n).astype(np.float32),
+    "PV_npvsGood"         : lambda rng, n : rng.poisson(20.0, n).astype(np.int32),
+    "MET_pt"              : lambda rng, n : rng.exponential(30.0, n).astype(np.float32),
+}
+
+mean_counts = {"Muon" : 2.0, "Jet" : 3.0}
+
+
+def draw(rng, b, n, scales={}):
+    values = branches[b](rng, n)
+    return (values * values.dtype.type(scales[b])) if b in scales else values
+
+
+def synthetic_events(n_events, collections={"Muon" : ["pt", "eta", "pfRelIso04_all"]}, variables=[], seed=12345, means={}, scales={}):
+
+    rng    = np.random.default_rng(seed)
+    arrays = {}
+
+    for c, features in collections.items():
+        counts        = rng.poisson(means.get(c, mean_counts[c]), n_events)
+        arrays["n"+c] = counts
+        for f in features:
+            arrays[c+"_"+f] = Jagged.from_counts(draw(rng, c+"_"+f, counts.sum(), scales), counts)
+
+    for b in variables:
+        arrays[b] = draw(rng, b, n_events, scales)
+
+    return arrays
+
+
+
+##########################################
+# Reference 1D histograms filled in plain python: { h : sumw per bin } (underflow and overflow bins included)
+
+def reference_histos(histos):    return {h : np.zeros(_h.nBins+2) for h, _h in histos.items()}
+
+
+def fill(reference, histos, h, x, w=1.0):
+    _h  = histos[h]
+    bin = int(np.clip(np.floor((x - _h.xMin) * _h.nBins / (_h.xMax - _h.xMin)) + 1, 0, _h.nBins+1))
+    reference[h][bin] += w
+    return
+
+
+
+##########################################
+# Checks: one row per check (label, values, OK/FAILED)
+
+class Checks:
+
+    def __init__(self, width=66, n_values=0):
+
+        self.width    = width
+        self.n_values = n_values
+        self.n_failed = 0
+
+        print("\n ================================== CHECK == \n")
+
+
+    def check(self, label, ok, *values):
+
+        self.n_failed += (not ok)
+        _values = "".join(f"{v :>14.2f}" if isinstance(v, (float, np.floating)) else f"{v :>14}" for v in values)
+        _width  = self.width + 14*max(0, self.n_values - len(values))
+        print(f"{' '+label :<{_width}}{_values}{'   OK' if ok else '   FAILED'}")
+
+        return ok
+
+
+    def exit(self, ok=True):
+
+        print("\n ============================================ \n")
+
+        sys.exit(1 if (self.n_failed or not ok) else 0)